@@ -0,0 +1,59 @@
+"""messages: (conversation_id, created_at, id) composite index for history paging
+
+Revision ID: 009_msg_conv_created_idx
+Revises: 008_widen_alembic_version
+Create Date: 2025-10-01
+
+履歴取得・keyset ページング（WHERE conversation_id = ? ORDER BY created_at, id）を
+ソートなしのインデックススキャンで返すための複合インデックス。
+一覧の射影のうち小さい列は INCLUDE で持たせる（content は大きいので含めない）。
+大きなテーブルで書き込みを止めないよう CONCURRENTLY で作成する。
+"""
+from alembic import context, op
+from sqlalchemy import text
+
+revision = "009_msg_conv_created_idx"
+down_revision = "008_widen_alembic_version"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "idx_messages_conversation_created_id"
+
+
+def _drop_if_invalid() -> None:
+    # CONCURRENTLY が途中で失敗すると INVALID なインデックスが残り、IF NOT EXISTS で素通りしてしまう
+    if context.is_offline_mode():
+        return
+    invalid = op.get_bind().execute(
+        text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :n AND NOT i.indisvalid"
+        ),
+        {"n": INDEX_NAME},
+    ).scalar()
+    if invalid:
+        op.drop_index(INDEX_NAME, table_name="messages", postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY はトランザクション外で実行する必要がある
+    with op.get_context().autocommit_block():
+        _drop_if_invalid()
+        op.create_index(
+            INDEX_NAME,
+            "messages",
+            ["conversation_id", "created_at", "id"],
+            postgresql_include=["role", "content_type", "parent_message_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            INDEX_NAME,
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
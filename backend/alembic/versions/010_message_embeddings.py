@@ -0,0 +1,85 @@
+"""message_embeddings table with pgvector ANN index
+
+Revision ID: 010_message_embeddings
+Revises: 009_msg_conv_created_idx
+Create Date: 2025-10-02
+
+埋め込みは real[] で保存し、pgvector がある場合だけ (embedding::vector(dim)) の式インデックスを作る。
+HNSW は pgvector 0.5 以降のみ対応のため、それより古い場合は IVFFlat にする。
+IVFFlat はデータ投入前に作るとクラスタが偏るので、バックフィル後に REINDEX すること。
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql as psql
+
+revision = "010_message_embeddings"
+down_revision = "009_msg_conv_created_idx"
+branch_labels = None
+depends_on = None
+
+# app.core.config.Settings.EMBEDDING_DIM と揃える
+DIM = int(os.getenv("EMBEDDING_DIM", "1024"))
+ANN_INDEX = "idx_message_embeddings_ann"
+
+
+def _table_exists(table: str) -> bool:
+    conn = op.get_bind()
+    return conn.execute(text("SELECT to_regclass(:t)"), {"t": f"public.{table}"}).scalar() is not None
+
+
+def _vector_version():
+    conn = op.get_bind()
+    return conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+
+
+def upgrade() -> None:
+    if not _table_exists("message_embeddings"):
+        op.create_table(
+            "message_embeddings",
+            sa.Column("message_id", psql.UUID(as_uuid=True), nullable=False),
+            sa.Column("conversation_id", psql.UUID(as_uuid=True), nullable=False),
+            sa.Column("model", sa.String(length=50), nullable=False),
+            sa.Column("embedding", psql.ARRAY(psql.REAL()), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["message_id"], ["messages.id"],
+                name="fk_message_embeddings_message_id_messages", ondelete="CASCADE",
+            ),
+            sa.ForeignKeyConstraint(
+                ["conversation_id"], ["conversations.id"],
+                name="fk_message_embeddings_conversation_id_conversations", ondelete="CASCADE",
+            ),
+            sa.PrimaryKeyConstraint("message_id", name="pk_message_embeddings"),
+        )
+    op.create_index(
+        "ix_message_embeddings_conversation_id",
+        "message_embeddings",
+        ["conversation_id"],
+        if_not_exists=True,
+    )
+
+    version = _vector_version()
+    if version is None:
+        # 拡張なし: 検索はアプリ側の NumPy 厳密計算にフォールバックする
+        return
+    major, minor = (int(x) for x in version.split(".")[:2])
+    expr = f"(embedding::vector({DIM})) vector_cosine_ops"
+    if (major, minor) >= (0, 5):
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {ANN_INDEX} ON message_embeddings "
+            f"USING hnsw ({expr}) WITH (m = 16, ef_construction = 64)"
+        )
+    else:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {ANN_INDEX} ON message_embeddings "
+            f"USING ivfflat ({expr}) WITH (lists = 100)"
+        )
+
+
+def downgrade() -> None:
+    op.execute(f"DROP INDEX IF EXISTS {ANN_INDEX}")
+    op.drop_index("ix_message_embeddings_conversation_id", table_name="message_embeddings", if_exists=True)
+    op.drop_table("message_embeddings")
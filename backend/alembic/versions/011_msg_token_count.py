@@ -0,0 +1,48 @@
+"""messages.token_count and personality_templates
+
+Revision ID: 011_msg_token_count
+Revises: 010_message_embeddings
+Create Date: 2025-10-03
+
+コンテキスト組み立てで履歴を毎ターン数え直さないよう、メッセージごとのトークン数を保存する。
+personality_templates は initdb（01-init.sql）にはあるが Alembic の系列に無かったため補う。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql as psql
+
+revision = "011_msg_token_count"
+down_revision = "010_message_embeddings"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table: str) -> bool:
+    conn = op.get_bind()
+    return conn.execute(text("SELECT to_regclass(:t)"), {"t": f"public.{table}"}).scalar() is not None
+
+
+def upgrade() -> None:
+    # 既存行は NULL のまま（読み出し時に数えて補う）
+    op.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS token_count INTEGER")
+
+    if not _table_exists("personality_templates"):
+        op.create_table(
+            "personality_templates",
+            sa.Column("id", psql.UUID(as_uuid=True), primary_key=True, server_default=sa.text("gen_random_uuid()")),
+            sa.Column("user_id", psql.UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE")),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("description", sa.Text()),
+            sa.Column("personality_type", sa.String(50)),
+            sa.Column("system_prompt", sa.Text()),
+            sa.Column("characteristics", psql.JSONB(astext_type=sa.Text())),
+            sa.Column("is_public", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+            sa.Column("is_active", sa.Boolean(), nullable=False, server_default=sa.text("true")),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    # personality_templates は initdb 由来の場合もあるので削除しない
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS token_count")
@@ -0,0 +1,25 @@
+"""assistant_skills.is_enabled / priority
+
+Revision ID: 012_assistant_skill_flags
+Revises: 011_msg_token_count
+Create Date: 2025-10-04
+
+スキルインデックスが有効なスキルだけを優先度順に持つための列。initdb（01-init.sql）には
+既にあるので IF NOT EXISTS で追加する。定数 DEFAULT のためテーブルの書き換えは起きない。
+"""
+from alembic import op
+
+revision = "012_assistant_skill_flags"
+down_revision = "011_msg_token_count"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE assistant_skills ADD COLUMN IF NOT EXISTS is_enabled BOOLEAN NOT NULL DEFAULT true")
+    op.execute("ALTER TABLE assistant_skills ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 1")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE assistant_skills DROP COLUMN IF EXISTS priority")
+    op.execute("ALTER TABLE assistant_skills DROP COLUMN IF EXISTS is_enabled")
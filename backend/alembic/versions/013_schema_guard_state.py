@@ -0,0 +1,31 @@
+"""schema_guard_state
+
+Revision ID: 013_schema_guard_state
+Revises: 012_assistant_skill_flags
+Create Date: 2025-10-05
+
+起動時のスキーマガード（app.core.schema_guard）が適用済みの定義の指紋を残すテーブル。
+マイグレーション前の DB ではガード自身が CREATE TABLE IF NOT EXISTS で作るので、ここも IF NOT EXISTS。
+"""
+from alembic import op
+
+revision = "013_schema_guard_state"
+down_revision = "012_assistant_skill_flags"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_guard_state (
+            name        TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            checked_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS schema_guard_state")
@@ -1,6 +1,6 @@
 # app/api/v1/api.py
 from fastapi import APIRouter
-from app.api.v1.endpoints import assistants, routing, conversations, users, chat
+from app.api.v1.endpoints import assistants, routing, conversations, users, chat, memory
 
 api_router = APIRouter()
 
@@ -9,6 +9,7 @@ api_router.include_router(assistants.router, prefix="/assistants", tags=["assist
 api_router.include_router(routing.router,     prefix="/routing",    tags=["routing"])
 api_router.include_router(conversations.router, prefix="/conversations", tags=["conversations"])
 api_router.include_router(users.router,       prefix="/users",      tags=["users"])
+api_router.include_router(memory.router,      prefix="/memory",     tags=["memory"])
 
 # WebSocket (例：/api/v1/ws/chat)
 api_router.include_router(chat.router,        prefix="/ws",         tags=["chat"])
@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, update
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 import uuid
 
-from app.core.database import get_async_db
+from app.core.database import get_async_db, get_async_read_db
 # モデルのインポート
-from app.models.models import AIAssistant, User
+from app.models.models import AIAssistant
 # 修正: 最終FIX版のスキーマをインポート
 from app.schemas.assistant import AssistantCreate, AssistantResponse, AssistantUpdateFinal
+from app.services.assistants.cache import AssistantCache, CachedBody, etag_matches, get_assistant_cache
+from app.services.users.default_user import (
+    DefaultUserResolver,
+    get_default_user_resolver,
+    is_foreign_key_violation,
+)
 
 router = APIRouter()
 
@@ -16,55 +24,72 @@ router = APIRouter()
 async def create_assistant(
     *,
     db: AsyncSession = Depends(get_async_db),
+    resolver: DefaultUserResolver = Depends(get_default_user_resolver),
     assistant_in: AssistantCreate
 ):
     """
     新しいAIアシスタント（キャラクター）を作成します。
     """
-    # TODO: 今後サービス層に分離する
-    # シングルユーザー環境を前提とし、最初のユーザーを取得して紐づけます
-    user_result = await db.execute(select(User).limit(1))
-    user = user_result.scalars().first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Default user not found")
+    # シングルユーザー環境を前提とし、既定ユーザー（ID は memoize 済み）に紐づけます
+    user_id = await resolver.resolve(db)
+    for attempt in range(2):
+        if user_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Default user not found")
+        # INSERT ... RETURNING の 1 往復で作成し、コミット前にレスポンスを作る（refresh 不要）
+        new_id = uuid.uuid4()
+        stmt = (
+            insert(AIAssistant)
+            .values(id=new_id, user_id=user_id, **assistant_in.model_dump())
+            .returning(AIAssistant)
+            .execution_options(invalidation_keys={"id": {new_id}})
+        )
+        try:
+            created = AssistantResponse.model_validate((await db.execute(stmt)).scalars().one())
+            await db.commit()
+            return created
+        except IntegrityError as e:
+            await db.rollback()
+            # memoize した既定ユーザーが消えていた（生 SQL や他プロセスでの削除）: 1 回だけ解決し直す
+            if attempt or not is_foreign_key_violation(e):
+                raise
+            resolver.invalidate()
+            user_id = await resolver.resolve(db)
 
-    # スキーマからモデルへデータを展開してインスタンス化
-    db_assistant = AIAssistant(
-        user_id=user.id,
-        **assistant_in.model_dump()
-    )
-    db.add(db_assistant)
-    await db.commit()
-    await db.refresh(db_assistant)
-    return db_assistant
+def _cached_response(cached: CachedBody, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
 @router.get("/", response_model=List[AssistantResponse])
 async def read_assistants(
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
+    cache: AssistantCache = Depends(get_assistant_cache),
+    if_none_match: Optional[str] = Header(None),
     skip: int = 0,
     limit: int = 100
 ):
     """
     AIアシスタントのリストを取得します。
     """
-    result = await db.execute(select(AIAssistant).offset(skip).limit(limit))
-    assistants = result.scalars().all()
-    return assistants
+    # 本文はキャッシュ済みの JSON をそのまま返す（If-None-Match が一致すれば 304）
+    return _cached_response(await cache.list(db, skip, limit), if_none_match)
 
 @router.get("/{assistant_id}", response_model=AssistantResponse)
 async def read_assistant(
     *,
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_read_db),
+    cache: AssistantCache = Depends(get_assistant_cache),
+    if_none_match: Optional[str] = Header(None),
     assistant_id: uuid.UUID
 ):
     """
     指定されたIDのAIアシスタントを取得します。
     """
-    result = await db.execute(select(AIAssistant).filter(AIAssistant.id == assistant_id))
-    assistant = result.scalars().first()
-    if not assistant:
+    cached = await cache.get(db, assistant_id)
+    if cached is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assistant not found")
-    return assistant
+    return _cached_response(cached, if_none_match)
 
 @router.put("/{assistant_id}", response_model=AssistantResponse)
 async def update_assistant(
@@ -76,20 +101,28 @@ async def update_assistant(
     """
     AIアシスタントの情報を部分的に更新します。
     """
-    result = await db.execute(select(AIAssistant).filter(AIAssistant.id == assistant_id))
-    assistant = result.scalars().first()
-    if not assistant:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assistant not found")
-    
     # model_dump(exclude_unset=True) を使い、リクエストで指定された項目のみを更新対象とします
     update_data = assistant_in.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(assistant, key, value)
-        
-    db.add(assistant)
-    await db.commit()
-    await db.refresh(assistant)
-    return assistant
+    if update_data:
+        # UPDATE ... RETURNING の 1 往復（対象が無ければ 0 行 = 404）
+        stmt = (
+            update(AIAssistant)
+            .where(AIAssistant.id == assistant_id)
+            .values(**update_data)
+            .returning(AIAssistant)
+            .execution_options(invalidation_keys={"id": {assistant_id}})
+        )
+    else:
+        # 更新項目が無ければ読むだけ（updated_at も変えない）
+        stmt = select(AIAssistant).where(AIAssistant.id == assistant_id)
+    assistant = (await db.execute(stmt)).scalars().first()
+    if assistant is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assistant not found")
+    # コミットで属性が期限切れになる前にレスポンスを作る
+    updated = AssistantResponse.model_validate(assistant)
+    if update_data:
+        await db.commit()
+    return updated
 
 @router.delete("/{assistant_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_assistant(
@@ -100,12 +133,15 @@ async def delete_assistant(
     """
     AIアシスタントを削除します。
     """
-    result = await db.execute(select(AIAssistant).filter(AIAssistant.id == assistant_id))
-    assistant = result.scalars().first()
-    if not assistant:
+    # DELETE ... RETURNING の 1 往復（対象が無ければ 0 行 = 404）
+    stmt = (
+        delete(AIAssistant)
+        .where(AIAssistant.id == assistant_id)
+        .returning(AIAssistant.id)
+        .execution_options(invalidation_keys={"id": {assistant_id}})
+    )
+    if (await db.execute(stmt)).scalar_one_or_none() is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assistant not found")
-    
-    await db.delete(assistant)
     await db.commit()
     # 204 No Content ステータスコードの場合、レスポンスボディは返しません
-    return None
\ No newline at end of file
+    return None
@@ -1,47 +1,177 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 import uuid
-from app.core.database import get_async_db
-from app.models.phase2_models import Conversation, Message
-from app.services.llm.mock_llm import stream_mock_reply
+from app.core import query_stats
+from app.core.config import settings
+from app.core.database import get_session_factory
+from app.models.models import AIAssistant
+from app.models.phase2_models import Conversation
+from app.services.chat.compaction import CompactionWorker, get_compaction_worker
+from app.services.chat.context import ContextBuilder, context_builder
+from app.services.chat.framing import FrameCodec, coalesce_tokens, negotiate_codec
+from app.services.chat.message_writer import MessageWriter, build_message_row, get_message_writer
+from app.services.llm.base import LLMError
+from app.services.llm.health import model_health, observe_stream
+from app.services.llm.registry import get_provider
+from app.services.routing.core.llm_router import LLMRouter
 
 router = APIRouter()
 
+
+def get_context_builder() -> ContextBuilder:
+    return context_builder
+
+
+def get_llm_router() -> LLMRouter:
+    return LLMRouter(health=model_health)
+
+
+class _Inbox:
+    """クライアントからの受信を 1 本のタスクで先読みする。
+
+    応答ストリーミング中も受信を待ち続けることで切断を即座に検知でき、
+    ストリーミング中に届いた次のメッセージは取りこぼさず次ターンで処理する。
+    """
+
+    def __init__(self, websocket: WebSocket, codec: FrameCodec):
+        self._websocket = websocket
+        self._codec = codec
+        self._task: Optional[asyncio.Future] = None
+
+    def pending(self) -> asyncio.Future:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._codec.receive(self._websocket))
+        return self._task
+
+    async def get(self):
+        task = self.pending()
+        try:
+            return await task
+        finally:
+            self._task = None
+
+    def disconnected(self) -> bool:
+        task = self._task
+        return (
+            task is not None
+            and task.done()
+            and not task.cancelled()
+            and isinstance(task.exception(), WebSocketDisconnect)
+        )
+
+    def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+async def _relay(websocket: WebSocket, codec: FrameCodec, chunks: AsyncIterator[str]) -> str:
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            await codec.send(websocket, {"type":"token", "text": chunk})
+    finally:
+        # 途中終了時もプロバイダ側のストリーム（HTTP 接続・同時実行枠）を解放する
+        await chunks.aclose()
+    return "".join(parts)
+
+
 @router.websocket("/ws/chat")
-async def chat_ws(websocket: WebSocket, conversation_id: uuid.UUID = Query(...), db: AsyncSession = Depends(get_async_db)):
-    await websocket.accept()
-    # 会話存在チェック
-    result = await db.execute(select(Conversation).where(Conversation.id == conversation_id))
-    conv = result.scalars().first()
+async def chat_ws(
+    websocket: WebSocket,
+    conversation_id: uuid.UUID = Query(...),
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+    writer: MessageWriter = Depends(get_message_writer),
+    contexts: ContextBuilder = Depends(get_context_builder),
+    compactor: CompactionWorker = Depends(get_compaction_worker),
+    llm_router: LLMRouter = Depends(get_llm_router),
+):
+    # フレーム形式は接続時のサブプロトコルで決める（未指定なら JSON）
+    codec, subprotocol = negotiate_codec(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    # セッションは DB を触る間だけ開く。受信待ち・トークン配信中は接続をプールに返すので、
+    # 開いているチャットの数がプールの大きさに縛られない
+    # 会話存在チェック（担当アシスタントとモデルも同じクエリで取得）
+    async with sessions() as db:
+        result = await db.execute(
+            select(Conversation.id, AIAssistant.id.label("assistant_id"), AIAssistant.default_llm_model)
+            .join(AIAssistant, AIAssistant.id == Conversation.assistant_id)
+            .where(Conversation.id == conversation_id)
+        )
+        conv = result.first()
     if not conv:
         await websocket.close(code=4404)
         return
+    model = conv.default_llm_model
+
+    inbox = _Inbox(websocket, codec)
     try:
         while True:
-            payload = await websocket.receive_json()
+            payload = await inbox.get()
             # { "type":"user_message", "text":"..." }
             text = (payload or {}).get("text") or ""
             if not text:
-                await websocket.send_json({"type":"error", "message":"empty text"})
+                await codec.send(websocket, {"type":"error", "message":"empty text"})
                 continue
 
-            # DB: user message
-            user_msg = Message(conversation_id=conversation_id, role="user", content=text)
-            db.add(user_msg)
-            await db.commit()
-
-            # streaming assistant reply (mock)
-            await websocket.send_json({"type":"assistant_start"})
-            collected = ""
-            async for token in stream_mock_reply(text):
-                collected += token
-                await websocket.send_json({"type":"token", "text": token})
-            # DB: assistant message
-            asst_msg = Message(conversation_id=conversation_id, role="assistant", content=collected)
-            db.add(asst_msg)
-            await db.commit()
-
-            await websocket.send_json({"type":"assistant_end", "message": collected})
+            # ターン内の SQL（コンテキスト組み立てなど）を集計してログに出す
+            with query_stats.observe("db_turn", conversation_id=str(conversation_id)):
+                # DB: user message（write-behind。トークン配信をコミット待ちにしない）
+                user_row = build_message_row(conversation_id, "user", text)
+                user_ack = await writer.persist([user_row])
+                # ブレーカーが開いていれば同系統の別モデルに切り替える（ターンごとに判定）
+                turn_model = llm_router.fallback_for(model)
+                provider = get_provider(turn_model)
+                # 履歴はキャッシュ済みの窓 + 新しい行だけを読み足して予算内に詰める
+                async with sessions() as db:
+                    messages, prompt_tokens = await contexts.build_with_usage(
+                        db, conversation_id, model=turn_model, assistant_id=conv.assistant_id, pending=[user_row]
+                    )
+
+                # streaming assistant reply
+                await codec.send(websocket, {"type":"assistant_start"})
+                chunks = coalesce_tokens(
+                    # TTFT・tokens/sec・成否・コストをモデルのヘルスに記録する
+                    observe_stream(
+                        llm_router.health, turn_model, provider.stream(turn_model, messages), prompt_tokens=prompt_tokens
+                    ),
+                    max_tokens=settings.CHAT_COALESCE_MAX_TOKENS,
+                    max_bytes=settings.CHAT_COALESCE_MAX_BYTES,
+                    max_delay=settings.CHAT_COALESCE_MAX_DELAY_MS / 1000.0,
+                )
+                relay = asyncio.ensure_future(_relay(websocket, codec, chunks))
+                await asyncio.wait((relay, inbox.pending()), return_when=asyncio.FIRST_COMPLETED)
+                if not relay.done() and inbox.disconnected():
+                    # クライアント切断: LLM 呼び出しを即座に打ち切る
+                    relay.cancel()
+                    await asyncio.wait((relay,))
+                    return
+                try:
+                    collected = await relay
+                except LLMError as e:
+                    await writer.wait_durable(user_ack)
+                    await codec.send(websocket, {"type":"error", "message": str(e)})
+                    continue
+
+                # DB: assistant message
+                asst_row = build_message_row(conversation_id, "assistant", collected)
+                asst_ack = await writer.persist([asst_row])
+                contexts.append(conversation_id, [asst_row])
+                # batched モードでは assistant_end の前に両メッセージのコミット完了を保証する
+                await writer.wait_durable(user_ack, asst_ack)
+                # 未要約の履歴が長くなったら古いターンの要約をバックグラウンドで作る
+                if (
+                    settings.CHAT_COMPACTION_ENABLED
+                    and contexts.unsummarized_tokens(conversation_id) >= settings.CHAT_COMPACTION_THRESHOLD_TOKENS
+                ):
+                    compactor.schedule(conversation_id)
+
+                await codec.send(websocket, {"type":"assistant_end", "message": collected})
     except WebSocketDisconnect:
         return
+    finally:
+        inbox.close()
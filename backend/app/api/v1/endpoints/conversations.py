@@ -1,12 +1,14 @@
 # backend/app/api/v1/endpoints/conversations.py
-from typing import List
+from typing import List, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.core.database import get_async_db
+from app.core.config import settings
+from app.core.database import get_async_db, get_async_read_db, get_read_session_factory
 from app.models.models import AIAssistant
 from app.models.phase2_models import Conversation, Message
 from app.schemas.conversation import (
@@ -15,9 +17,24 @@ from app.schemas.conversation import (
     MessageCreate,
     MessageOut,
 )
+from app.services.chat.history import (
+    Cursor,
+    decode_cursor,
+    is_descending,
+    message_page_query,
+    page_cursors,
+)
+from app.services.chat.tokens import count_tokens
 
 router = APIRouter()
 
+CONVERSATION_OUT_COLUMNS = tuple(ConversationOut.model_fields)
+
+
+def _bind(value, column):
+    # INSERT ... SELECT の SELECT 句に置く定数（列の型でバインドする）
+    return literal(value, column.type)
+
 @router.post(
     "/",
     response_model=ConversationOut,
@@ -27,30 +44,32 @@ async def create_conversation(
     payload: ConversationCreate,
     db: AsyncSession = Depends(get_async_db),
 ):
-    # assistant check + user_id fallback
-    res = await db.execute(select(AIAssistant).where(AIAssistant.id == payload.assistant_id))
-    assistant = res.scalars().first()
-    if not assistant:
-        raise HTTPException(status_code=404, detail="Assistant not found")
-
-    user_id = payload.user_id or assistant.user_id
-
-    conv = Conversation(
-        user_id=user_id,
-        assistant_id=payload.assistant_id,
-        title=payload.title,
-        conversation_type=(payload.conversation_type or "chat"),
-        status="active",
+    # アシスタントの存在確認・user_id の補完・INSERT を 1 文で行う:
+    # INSERT ... SELECT ... FROM assistants WHERE id = :assistant_id RETURNING ...（0 行なら 404）
+    values = {
+        "user_id": _bind(payload.user_id, Conversation.user_id) if payload.user_id else AIAssistant.user_id,
+        "assistant_id": AIAssistant.id,
+        "title": _bind(payload.title, Conversation.title),
+        "conversation_type": _bind(payload.conversation_type or "chat", Conversation.conversation_type),
+        "status": _bind("active", Conversation.status),
         # voice_enabled defaults to true in DB; explicit is fine too
-        voice_enabled=True if payload.voice_enabled is None else payload.voice_enabled,
-        voice_id=payload.voice_id,
-        # ORM 属性は metadata（DB のカラム名も "metadata"）
-        metadata=payload.metadata,
+        "voice_enabled": _bind(True if payload.voice_enabled is None else payload.voice_enabled, Conversation.voice_enabled),
+        "voice_id": _bind(payload.voice_id, Conversation.voice_id),
+    }
+    if payload.metadata is not None:
+        # ORM 属性は meta（DB のカラム名は "metadata"）。未指定ならサーバー既定の '{}'
+        values["metadata"] = _bind(payload.metadata, Conversation.meta)
+    stmt = (
+        insert(Conversation.__table__)
+        .from_select(list(values), select(*values.values()).where(AIAssistant.id == payload.assistant_id))
+        .returning(*(Conversation.__table__.c[name] for name in CONVERSATION_OUT_COLUMNS))
     )
-    db.add(conv)
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Assistant not found")
+    created = ConversationOut.model_validate(row)
     await db.commit()
-    await db.refresh(conv)
-    return conv
+    return created
 
 
 @router.post(
@@ -63,29 +82,49 @@ async def add_message(
     payload: MessageCreate,
     db: AsyncSession = Depends(get_async_db),
 ):
-    # conversation存在チェック
-    res = await db.execute(select(Conversation).where(Conversation.id == conversation_id))
-    conv = res.scalars().first()
-    if not conv:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-
     if not payload.content:
+        # 従来どおり、会話が無ければ 400 より 404 を優先する
+        if not await _conversation_exists(db, conversation_id):
+            raise HTTPException(status_code=404, detail="Conversation not found")
         raise HTTPException(status_code=400, detail="content is required")
 
-    msg = Message(
-        conversation_id=conversation_id,
-        role=(payload.role or "user"),
-        content=payload.content,
-        content_type=(payload.content_type or "text"),
-        # ORM 属性は metadata（DB のカラム名も "metadata"）
-        metadata=payload.metadata,
+    # 会話の存在確認と INSERT を 1 文で行う（0 行なら 404）
+    values = {
+        "conversation_id": Conversation.id,
+        "role": _bind(payload.role or "user", Message.role),
+        "content": _bind(payload.content, Message.content),
+        "content_type": _bind(payload.content_type or "text", Message.content_type),
+        "token_count": _bind(count_tokens(payload.content), Message.token_count),
         # IMPORTANT: match DB column name
-        parent_message_id=payload.parent_id,
+        "parent_message_id": _bind(payload.parent_id, Message.parent_message_id),
+    }
+    if payload.metadata is not None:
+        values["metadata"] = _bind(payload.metadata, Message.meta)
+    stmt = (
+        insert(Message.__table__)
+        .from_select(list(values), select(*values.values()).where(Conversation.id == conversation_id))
+        .returning(*(Message.__table__.c[name] for name in MessageOut.model_fields))
     )
-    db.add(msg)
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    created = MessageOut.model_validate(row)
     await db.commit()
-    await db.refresh(msg)
-    return msg
+    return created
+
+
+async def _conversation_exists(db: AsyncSession, conversation_id: uuid.UUID) -> bool:
+    res = await db.execute(select(Conversation.id).where(Conversation.id == conversation_id))
+    return res.first() is not None
+
+
+def _parse_cursor(name: str, token: Optional[str]) -> Optional[Cursor]:
+    if token is None:
+        return None
+    try:
+        return decode_cursor(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid {name} cursor")
 
 
 @router.get(
@@ -95,17 +134,69 @@ async def add_message(
 )
 async def list_messages(
     conversation_id: uuid.UUID,
-    db: AsyncSession = Depends(get_async_db),
+    response: Response,
+    before: Optional[str] = Query(None, description="このカーソルより前のメッセージ"),
+    after: Optional[str] = Query(None, description="このカーソルより後のメッセージ"),
+    limit: Optional[int] = Query(None, ge=1, description="1 ページの件数（stream 時は未指定で全件）"),
+    stream: bool = Query(False, description="true なら NDJSON でストリーミング"),
+    db: AsyncSession = Depends(get_async_read_db),
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_read_session_factory),
 ):
-    # optional: check existence
-    res = await db.execute(select(Conversation).where(Conversation.id == conversation_id))
-    if not res.scalars().first():
+    """(created_at, id) 順の keyset ページング
+
+    次ページは X-Next-Cursor を after に、前ページは X-Prev-Cursor を before に渡して取得する。
+    """
+    before_cur = _parse_cursor("before", before)
+    after_cur = _parse_cursor("after", after)
+
+    if stream:
+        return await _stream_messages(db, sessions, conversation_id, before_cur, after_cur, limit)
+
+    limit = min(limit or settings.MESSAGE_PAGE_DEFAULT_LIMIT, settings.MESSAGE_PAGE_MAX_LIMIT)
+    res = await db.execute(message_page_query(conversation_id, before=before_cur, after=after_cur, limit=limit))
+    rows = res.all()
+    # 存在チェックは空ページのときだけ（通常のページ取得は 1 クエリで済ませる）
+    if not rows and not await _conversation_exists(db, conversation_id):
         raise HTTPException(status_code=404, detail="Conversation not found")
+    if is_descending(before_cur, after_cur):
+        rows.reverse()
 
-    q = (
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.asc())
-    )
-    res = await db.execute(q)
-    return list(res.scalars().all())
+    prev_cursor, next_cursor = page_cursors(rows, limit, before_cur, after_cur)
+    if prev_cursor:
+        response.headers["X-Prev-Cursor"] = prev_cursor
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+async def _stream_messages(
+    db: AsyncSession,
+    sessions: async_sessionmaker[AsyncSession],
+    conversation_id: uuid.UUID,
+    before: Optional[Cursor],
+    after: Optional[Cursor],
+    limit: Optional[int],
+) -> StreamingResponse:
+    """サーバサイドカーソルで yield_per 件ずつ読み、1 行 1 メッセージの NDJSON で返す
+
+    本文はハンドラを抜けた後に流れるので、リクエストのセッション（db）ではなく
+    本文側で開いたセッションで読み、読み終わり・切断時に閉じる。
+    """
+    if is_descending(before, after):
+        # 降順で読むと並べ替えのため全件を保持する必要があるので、ストリームは昇順のみ
+        raise HTTPException(status_code=400, detail="stream supports 'after' paging only")
+    # 404 はレスポンス開始前に決める
+    if not await _conversation_exists(db, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    q = message_page_query(conversation_id, before=before, after=after, limit=limit)
+
+    async def body():
+        async with sessions() as session:
+            result = await session.stream(q.execution_options(yield_per=settings.MESSAGE_STREAM_YIELD_PER))
+            try:
+                async for batch in result.partitions():
+                    yield "".join(MessageOut.model_validate(row).model_dump_json() + "\n" for row in batch)
+            finally:
+                await result.close()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
@@ -0,0 +1,26 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_async_db
+from app.schemas.memory import MemorySearchRequest, MemorySearchResponse
+from app.services.memory.store import search_memory
+
+router = APIRouter()
+
+
+@router.post("/search", response_model=MemorySearchResponse)
+async def search(
+    request: MemorySearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """過去メッセージから query に意味的に近いものを返す（長期記憶）"""
+    hits = await search_memory(
+        db,
+        request.query,
+        request.k,
+        conversation_id=request.conversation_id,
+        user_id=request.user_id,
+    )
+    return {"hits": [asdict(h) for h in hits]}
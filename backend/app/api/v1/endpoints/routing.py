@@ -1,17 +1,21 @@
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_async_db
+from app.core.database import get_async_read_db
+from app.services.llm.health import model_health
+from app.services.routing.cache import routing_cache
 from app.services.routing.orchestrator import RoutingOrchestrator
 from app.services.routing.models.routing_models import RoutingDecision
-from app.schemas.routing import RoutingRequest
+from app.schemas.routing import RoutingBatchRequest, RoutingRequest
 
 router = APIRouter()
 
 @router.post("/route", response_model=RoutingDecision)
 async def get_routing_decision(
     request: RoutingRequest,
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     ユーザーのプロンプトとアシスタントIDに基づき、
@@ -26,4 +30,31 @@ async def get_routing_decision(
         return decision
     except Exception as e:
         # 実際には、もっと詳細なエラーハンドリングを入れます
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/route:batch", response_model=List[RoutingDecision])
+async def get_routing_decisions(
+    request: RoutingBatchRequest,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """複数のプロンプトをまとめてルーティングする（同じプロンプトは 1 回だけ決定し、結果は入力順）"""
+    try:
+        orchestrator = RoutingOrchestrator(db=db)
+        return await orchestrator.route_many(
+            [(r.prompt, str(r.assistant_id)) for r in request.requests]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_routing_cache_stats():
+    """ルーティングキャッシュのヒット/ミス等の統計"""
+    return routing_cache.stats()
+
+
+@router.get("/models/stats")
+async def get_model_stats():
+    """モデルごとの実測ヘルス（TTFT・tokens/sec・エラー率・コスト・ブレーカー状態）"""
+    return model_health.stats()
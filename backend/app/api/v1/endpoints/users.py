@@ -1,31 +1,16 @@
 from fastapi import APIRouter, Depends, status
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_async_db
-from app.models.models import User
+from app.services.users.default_user import DefaultUserResolver, get_default_user_resolver
 
 router = APIRouter()
 
 @router.get("/default", status_code=status.HTTP_200_OK)
-async def get_or_create_default_user(db: AsyncSession = Depends(get_async_db)):
-    # 既存があればそれを返す
-    result = await db.execute(select(User).order_by(User.created_at.asc()).limit(1))
-    user = result.scalars().first()
-    if user:
-        return {"id": str(user.id)}
-
-    # 無ければ必須列を満たして作成
-    user = User(
-        username="default_admin",
-        email="default@example.com",
-        password_hash="!",  # 使わないのでダミーでOK（NOT NULL回避）
-        first_name="Default",
-        last_name="Admin",
-        is_active=True,
-        is_verified=True,
-    )
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
-    return {"id": str(user.id)}
+async def get_or_create_default_user(
+    db: AsyncSession = Depends(get_async_db),
+    resolver: DefaultUserResolver = Depends(get_default_user_resolver),
+):
+    # 既存があればそれを返し、無ければ作成する（ID はプロセス内で memoize 済み）
+    user_id = await resolver.resolve(db, create=True)
+    return {"id": str(user_id)}
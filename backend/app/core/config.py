@@ -13,6 +13,27 @@ class Settings(BaseSettings):
     """
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_default_secret_key")
+
+    # DB 接続プール（WebSocket 接続数ではなく同時に走るクエリ数に合わせる）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    # この秒数以上アイドルだった接続だけチェックアウト時に検査する（pool_pre_ping の代わり。負で無効）
+    DB_POOL_IDLE_PING_SECONDS: float = float(os.getenv("DB_POOL_IDLE_PING_SECONDS", "30"))
+    # 接続ごとの prepared statement キャッシュ件数と、SQL コンパイル結果のキャッシュ件数
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "500"))
+    DB_QUERY_CACHE_SIZE: int = int(os.getenv("DB_QUERY_CACHE_SIZE", "1000"))
+    # PgBouncer（transaction pooling）経由なら true: prepared statement 名を一意にする
+    DB_PGBOUNCER: bool = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+    # DATABASE_READ_URL（レプリカ）設定時: 書き込んだクライアントの読み取りをプライマリに寄せる秒数
+    # （レプリカの遅延の想定上限。無効化したキャッシュをレプリカから詰め直さない期間にも使う）
+    DATABASE_READ_STICKY_SECONDS: float = float(os.getenv("DATABASE_READ_STICKY_SECONDS", "5"))
+    # リクエスト / WebSocket ターンごとの SQL 集計を structlog に出すか、同じ SQL が何回流れたら N+1 を疑うか（0 で無効）
+    DB_QUERY_LOG: bool = os.getenv("DB_QUERY_LOG", "true").lower() == "true"
+    DB_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+    # 起動時のスキーマガードがテーブルのロックを待つ上限（取れなければその列の追加は見送る）
+    SCHEMA_GUARD_LOCK_TIMEOUT_MS: int = int(os.getenv("SCHEMA_GUARD_LOCK_TIMEOUT_MS", "2000"))
     
     # CORS設定
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000")
@@ -20,6 +41,106 @@ class Settings(BaseSettings):
      # 既定ユーザーのデフォルト（任意で上書き可能）
     DEFAULT_ADMIN_EMAIL: str = os.getenv("DEFAULT_ADMIN_EMAIL", "default_admin@example.com")
     DEFAULT_ADMIN_NAME: str  = os.getenv("DEFAULT_ADMIN_NAME",  "default_admin")
+
+    # チャットメッセージ永続化（write-behind）
+    # sync: ターンごとに即時コミット / batched: まとめて INSERT し assistant_end 前に完了を待つ
+    # async: キュー投入のみでコミット完了を待たない
+    CHAT_PERSIST_MODE: str = os.getenv("CHAT_PERSIST_MODE", "batched")
+    CHAT_PERSIST_BATCH_SIZE: int = int(os.getenv("CHAT_PERSIST_BATCH_SIZE", "64"))
+    CHAT_PERSIST_FLUSH_MS: int = int(os.getenv("CHAT_PERSIST_FLUSH_MS", "20"))
+    CHAT_PERSIST_QUEUE_SIZE: int = int(os.getenv("CHAT_PERSIST_QUEUE_SIZE", "10000"))
+
+    # ストリーミング応答のフレーム集約（いずれかに達したら 1 フレームとして送信）
+    CHAT_COALESCE_MAX_TOKENS: int = int(os.getenv("CHAT_COALESCE_MAX_TOKENS", "16"))
+    CHAT_COALESCE_MAX_BYTES: int = int(os.getenv("CHAT_COALESCE_MAX_BYTES", "1024"))
+    CHAT_COALESCE_MAX_DELAY_MS: int = int(os.getenv("CHAT_COALESCE_MAX_DELAY_MS", "25"))
+
+    # LLM に渡すコンテキスト（システムプロンプト + 直近履歴）のトークン予算
+    CHAT_CONTEXT_DEFAULT_TOKENS: int = int(os.getenv("CHAT_CONTEXT_DEFAULT_TOKENS", "8192"))  # 未知のモデル
+    CHAT_CONTEXT_MAX_TOKENS: int = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "32000"))  # 長文脈モデルでも履歴はここまで
+    CHAT_CONTEXT_REPLY_RESERVE: int = int(os.getenv("CHAT_CONTEXT_REPLY_RESERVE", "1024"))
+    CHAT_CONTEXT_MAX_MESSAGES: int = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", "200"))
+    CHAT_CONTEXT_CACHE_SIZE: int = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "1024"))  # 会話数
+
+    # 長い会話の要約（未要約分がしきい値を超えたら、直近分を残して古いターンを system の要約にまとめる）
+    CHAT_COMPACTION_ENABLED: bool = os.getenv("CHAT_COMPACTION_ENABLED", "true").lower() == "true"
+    CHAT_COMPACTION_THRESHOLD_TOKENS: int = int(os.getenv("CHAT_COMPACTION_THRESHOLD_TOKENS", "6000"))
+    CHAT_COMPACTION_KEEP_RECENT_TOKENS: int = int(os.getenv("CHAT_COMPACTION_KEEP_RECENT_TOKENS", "1500"))
+    CHAT_COMPACTION_SUMMARY_TOKENS: int = int(os.getenv("CHAT_COMPACTION_SUMMARY_TOKENS", "600"))
+    CHAT_COMPACTION_MAX_MESSAGES: int = int(os.getenv("CHAT_COMPACTION_MAX_MESSAGES", "1000"))  # 1 回で読む上限
+    # extractive: 文抽出（LLM 呼び出しなし） / llm: CHAT_COMPACTION_LLM_MODEL で要約（失敗時は抽出に戻る）
+    CHAT_COMPACTION_SUMMARIZER: str = os.getenv("CHAT_COMPACTION_SUMMARIZER", "extractive")
+    CHAT_COMPACTION_LLM_MODEL: str = os.getenv("CHAT_COMPACTION_LLM_MODEL", "gemini-pro")
+
+    # 会話メッセージ一覧のページサイズ（keyset ページング）と NDJSON ストリームの取得単位
+    MESSAGE_PAGE_DEFAULT_LIMIT: int = int(os.getenv("MESSAGE_PAGE_DEFAULT_LIMIT", "100"))
+    MESSAGE_PAGE_MAX_LIMIT: int = int(os.getenv("MESSAGE_PAGE_MAX_LIMIT", "1000"))
+    MESSAGE_STREAM_YIELD_PER: int = int(os.getenv("MESSAGE_STREAM_YIELD_PER", "500"))
+
+    # ルーティング決定キャッシュ（LRU + TTL）。0 件で無効
+    ROUTING_CACHE_MAX_ENTRIES: int = int(os.getenv("ROUTING_CACHE_MAX_ENTRIES", "10000"))
+    ROUTING_CACHE_TTL_SECONDS: float = float(os.getenv("ROUTING_CACHE_TTL_SECONDS", "300"))
+    # ルーティング各ステージのタイムアウト（超えたら既定値で続行する）
+    ROUTING_ANALYZE_TIMEOUT_MS: int = int(os.getenv("ROUTING_ANALYZE_TIMEOUT_MS", "200"))
+    ROUTING_SKILLS_TIMEOUT_MS: int = int(os.getenv("ROUTING_SKILLS_TIMEOUT_MS", "300"))
+    ROUTING_LLM_TIMEOUT_MS: int = int(os.getenv("ROUTING_LLM_TIMEOUT_MS", "200"))
+    ROUTING_AGENT_TIMEOUT_MS: int = int(os.getenv("ROUTING_AGENT_TIMEOUT_MS", "200"))
+    ROUTING_DEFAULT_LLM: str = os.getenv("ROUTING_DEFAULT_LLM", "gemini-pro")
+    # POST /routing/route:batch の 1 リクエストあたりの上限件数
+    ROUTING_BATCH_MAX_ITEMS: int = int(os.getenv("ROUTING_BATCH_MAX_ITEMS", "256"))
+    # スキルインデックスの全件再読み込み間隔（同一プロセス内の変更はコミット時に反映される）
+    SKILL_INDEX_REFRESH_SECONDS: float = float(os.getenv("SKILL_INDEX_REFRESH_SECONDS", "300"))
+    SKILL_MATCH_LIMIT: int = int(os.getenv("SKILL_MATCH_LIMIT", "5"))
+
+    # アシスタント読み取りキャッシュ（プロセス内 LRU）。REDIS_URL を設定すると Redis を L2 にし、
+    # 無効化を pub/sub で他ワーカーに配る
+    ASSISTANT_CACHE_MAX_ENTRIES: int = int(os.getenv("ASSISTANT_CACHE_MAX_ENTRIES", "1000"))
+    ASSISTANT_CACHE_TTL_SECONDS: float = float(os.getenv("ASSISTANT_CACHE_TTL_SECONDS", "30"))
+    ASSISTANT_CACHE_REDIS_URL: str = os.getenv("ASSISTANT_CACHE_REDIS_URL", "")
+    ASSISTANT_CACHE_REDIS_TTL_SECONDS: float = float(os.getenv("ASSISTANT_CACHE_REDIS_TTL_SECONDS", "300"))
+
+    # ローカル埋め込み（hashing: ハッシュトリックによる TF-IDF）
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "hashing")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "1024"))
+    # 会話メッセージの埋め込み（長期記憶）をバックグラウンドで作成する
+    MEMORY_EMBEDDING_ENABLED: bool = os.getenv("MEMORY_EMBEDDING_ENABLED", "true").lower() == "true"
+    MEMORY_EMBED_BATCH_SIZE: int = int(os.getenv("MEMORY_EMBED_BATCH_SIZE", "128"))
+    MEMORY_EMBED_POLL_SECONDS: float = float(os.getenv("MEMORY_EMBED_POLL_SECONDS", "1.0"))
+    # 埋め込みの無い行をまとめて拾い直す間隔（書き込み通知の届かない行の取りこぼし対策）
+    MEMORY_EMBED_SWEEP_SECONDS: float = float(os.getenv("MEMORY_EMBED_SWEEP_SECONDS", "60"))
+    # pgvector の HNSW 探索幅（フィルタ付き検索で件数が欠けないよう k より十分大きくする）
+    MEMORY_HNSW_EF_SEARCH: int = int(os.getenv("MEMORY_HNSW_EF_SEARCH", "100"))
+    # AgentSelector が参照するエージェント定義（front matter 付き Markdown）
+    STUDIO_AGENTS_DIR: str = os.getenv(
+        "STUDIO_AGENTS_DIR",
+        os.path.join(os.path.dirname(__file__), "..", "..", "..", "tools", "studio-agents"),
+    )
+    AGENT_INDEX_RELOAD_SECONDS: float = float(os.getenv("AGENT_INDEX_RELOAD_SECONDS", "5"))
+    AGENT_MIN_SCORE: float = float(os.getenv("AGENT_MIN_SCORE", "0.05"))
+
+    # LLM プロバイダ（OpenAI 互換 API）。BASE_URL 未設定ならモックにフォールバック
+    LLM_API_BASE_URL: str = os.getenv("LLM_API_BASE_URL", "")
+    LLM_API_KEY: str = os.getenv("LLM_API_KEY", os.getenv("GEMINI_API_KEY", ""))
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+    LLM_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_CONCURRENCY_PER_MODEL: int = int(os.getenv("LLM_MAX_CONCURRENCY_PER_MODEL", "32"))
+    LLM_RATE_LIMIT_RPS: float = float(os.getenv("LLM_RATE_LIMIT_RPS", "0"))  # 0 = 無制限
+    LLM_RATE_LIMIT_BURST: float = float(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+    # モデルごとの実測ヘルス（TTFT・tokens/sec・エラー率・コスト）の集計窓
+    LLM_HEALTH_WINDOW_SECONDS: float = float(os.getenv("LLM_HEALTH_WINDOW_SECONDS", "300"))
+    LLM_HEALTH_WINDOW_SIZE: int = int(os.getenv("LLM_HEALTH_WINDOW_SIZE", "200"))
+    # サーキットブレーカー: 連続失敗数、または窓内のエラー率（最低件数以上）で開き、クールダウン後に 1 件試す
+    LLM_BREAKER_CONSECUTIVE_FAILURES: int = int(os.getenv("LLM_BREAKER_CONSECUTIVE_FAILURES", "5"))
+    LLM_BREAKER_ERROR_RATE: float = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+    LLM_BREAKER_MIN_REQUESTS: int = int(os.getenv("LLM_BREAKER_MIN_REQUESTS", "10"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+    # LLMRouter の SLO（0 で無効）。実測の TTFT p95 と 1k トークン単価で候補を絞る
+    LLM_SLO_TTFT_MS: float = float(os.getenv("LLM_SLO_TTFT_MS", "2000"))
+    LLM_SLO_MAX_COST_PER_1K: float = float(os.getenv("LLM_SLO_MAX_COST_PER_1K", "0"))
+    # モデルカタログ（JSON: [{"name", "cost_per_1k", "tags"}]）。空なら health.DEFAULT_CATALOG
+    LLM_MODEL_CATALOG: str = os.getenv("LLM_MODEL_CATALOG", "")
+    # モデル名が "mock" のみ、または API 未設定時に使うモックのプロファイル
+    MOCK_LLM_DEFAULT_PROFILE: str = os.getenv("MOCK_LLM_DEFAULT_PROFILE", "instant")
     
     @property
     def cors_origins_list(self) -> list[str]:
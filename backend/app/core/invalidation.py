@@ -0,0 +1,141 @@
+"""コミット時のキャッシュ無効化フック
+
+Session の after_flush / do_orm_execute で変更されたテーブル（と指定した列の値）を集め、
+after_commit でまとめて購読者に通知する。ロールバックされた変更は通知しない。
+
+    subscribe({"assistants": "id", "skill_definitions": None}, callback)
+
+callback(table, keys) の keys は変更行の指定列の値の集合。列を指定しない購読、
+または一括 UPDATE/DELETE などで行を特定できない場合は None（全件無効化の意味）。
+一括 UPDATE/DELETE でも対象が分かっているときは
+
+    update(AIAssistant).where(...).execution_options(invalidation_keys={"id": {assistant_id}})
+
+のように購読列の値を渡せば、その行だけの無効化になる。
+text() による生 SQL の変更は検知しない。同一プロセス内のみで、他ワーカーのキャッシュには
+届かない（TTL で鮮度を保つこと）。
+"""
+import logging
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ORMExecuteState, Session
+
+logger = logging.getLogger(__name__)
+
+InvalidationCallback = Callable[[str, Optional[Set[Any]]], None]
+
+# [(table -> key 列名 or None, callback)]
+_subscribers: List[Tuple[Dict[str, Optional[str]], InvalidationCallback]] = []
+# table -> 収集対象の列名
+_watched: Dict[str, Set[str]] = {}
+
+_PENDING = "_invalidation_pending"
+# 行を特定できない変更を表す目印
+_ALL = None
+
+
+def subscribe(tables: Mapping[str, Optional[str]], callback: InvalidationCallback) -> None:
+    _install()
+    _subscribers.append((dict(tables), callback))
+    for table, attr in tables.items():
+        attrs = _watched.setdefault(table, set())
+        if attr:
+            attrs.add(attr)
+
+
+def unsubscribe(callback: InvalidationCallback) -> None:
+    _subscribers[:] = [(t, cb) for t, cb in _subscribers if cb is not callback]
+    _watched.clear()
+    for tables, _ in _subscribers:
+        for table, attr in tables.items():
+            attrs = _watched.setdefault(table, set())
+            if attr:
+                attrs.add(attr)
+
+
+def _pending(session: Session) -> Dict[str, Optional[Dict[str, Set[Any]]]]:
+    return session.info.setdefault(_PENDING, {})
+
+
+def _mark_all(session: Session, table: str) -> None:
+    _pending(session)[table] = _ALL
+
+
+def _record_keys(session: Session, table: str, keys: Mapping[str, Any]) -> None:
+    pending = _pending(session)
+    if table in pending and pending[table] is _ALL:
+        return
+    entry = pending.setdefault(table, {})
+    for attr in _watched[table]:
+        entry.setdefault(attr, set()).update(keys[attr])
+
+
+def _record(session: Session, obj: Any) -> None:
+    table = inspect(obj).mapper.local_table.name
+    if table not in _watched:
+        return
+    pending = _pending(session)
+    if table in pending and pending[table] is _ALL:
+        return
+    entry = pending.setdefault(table, {})
+    for attr in _watched[table]:
+        entry.setdefault(attr, set()).add(getattr(obj, attr, None))
+
+
+def _after_flush(session: Session, flush_context: Any) -> None:
+    if not _watched:
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _record(session, obj)
+
+
+def _do_orm_execute(state: ORMExecuteState) -> None:
+    # ORM の一括 INSERT/UPDATE/DELETE は対象行を特定できないのでテーブル単位で無効化する
+    if not _watched or not (state.is_insert or state.is_update or state.is_delete):
+        return
+    keys = state.execution_options.get("invalidation_keys")
+    for mapper in state.all_mappers:
+        table = mapper.local_table.name
+        if table not in _watched:
+            continue
+        # 購読されている列の値がすべて渡されていれば、その行だけを無効化する
+        if keys is not None and _watched[table] <= set(keys):
+            _record_keys(state.session, table, keys)
+        else:
+            _mark_all(state.session, table)
+
+
+def _after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    for tables, callback in list(_subscribers):
+        for table, attr in tables.items():
+            if table not in pending:
+                continue
+            entry = pending[table]
+            keys = None if entry is _ALL or attr is None else entry.get(attr, set()) - {None}
+            try:
+                callback(table, keys)
+            except Exception:  # 無効化の失敗でコミット後の処理を止めない
+                logger.exception("invalidation callback failed: %s", table)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+_installed = False
+
+
+def _install() -> None:
+    global _installed
+    if _installed:
+        return
+    # AsyncSession も内部では同期 Session を使うため、Session クラスに登録すれば全セッションに効く
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "do_orm_execute", _do_orm_execute)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
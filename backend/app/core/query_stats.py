@@ -0,0 +1,171 @@
+"""リクエスト / WebSocket ターン単位の SQL 計測と N+1 の検知
+
+エンジンの before/after_cursor_execute で、いま有効な集計（contextvar）にクエリ数・DB 時間・
+行数を足す。集計は入れ子にでき、内側を閉じると外側にも足し込む（テストの予算と
+リクエストの集計を同時に取れる）。
+
+HTTP では QueryStatsMiddleware がリクエストごとに集計を開き、Server-Timing ヘッダ
+（db;dur=...;desc="N queries, M rows"）と structlog の 1 行（db_request）で出す。
+同じ SQL（パラメータ違い）が DB_N_PLUS_ONE_THRESHOLD 回以上流れたら n_plus_one_suspected を
+警告する。write-behind のメッセージ書き込みなど、別タスクで走る SQL は含まない。
+"""
+import contextvars
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+_STARTED = "query_stats_started"
+
+
+class QueryStats:
+    __slots__ = ("queries", "db_ms", "rows", "statements", "engines")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_ms = 0.0
+        self.rows = 0
+        # SQL 文（パラメータはプレースホルダのまま）-> 実行回数
+        self.statements: Counter = Counter()
+        # エンジン名（create_async_engine の logging_name。無名なら "db"）-> 実行回数
+        self.engines: Counter = Counter()
+
+    def add(self, statement: str, ms: float, rows: int, engine: str = "db") -> None:
+        self.queries += 1
+        self.db_ms += ms
+        self.rows += max(rows, 0)
+        self.statements[statement] += 1
+        self.engines[engine] += 1
+
+    def merge(self, other: "QueryStats") -> None:
+        self.queries += other.queries
+        self.db_ms += other.db_ms
+        self.rows += other.rows
+        self.statements.update(other.statements)
+        self.engines.update(other.engines)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """threshold 回以上流れた SQL（N+1 の疑い）"""
+        if threshold <= 0:
+            return []
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+    def server_timing(self, name: str = "db") -> str:
+        return f'{name};dur={self.db_ms:.3f};desc="{self.queries} queries, {self.rows} rows"'
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"queries": self.queries, "db_ms": round(self.db_ms, 3), "rows": self.rows}
+
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def collect() -> Iterator[QueryStats]:
+    """この中で流れた SQL を集計する（閉じたら外側の集計にも足す）"""
+    parent = _current.get()
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.merge(stats)
+
+
+def _engine_name(conn: Any) -> str:
+    return conn.engine.logging_name or "db"
+
+
+def _before(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+
+def _after(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    started = conn.info[_STARTED].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(
+            statement, (time.perf_counter() - started) * 1000, getattr(cursor, "rowcount", -1), _engine_name(conn)
+        )
+
+
+def _error(exception_context: Any) -> None:
+    conn = exception_context.connection
+    if conn is None:
+        return
+    started = conn.info.get(_STARTED)
+    if started:
+        started.pop()
+    stats = _current.get()
+    if stats is not None and exception_context.statement is not None:
+        stats.add(exception_context.statement, 0.0, 0, _engine_name(conn))
+
+
+def install(engine: AsyncEngine) -> None:
+    """エンジンに計測のフックを付ける（何度呼んでも 1 回だけ）"""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "after_cursor_execute", _after):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before)
+    event.listen(sync_engine, "after_cursor_execute", _after)
+    event.listen(sync_engine, "handle_error", _error)
+
+
+def report(stats: QueryStats, event_name: str, **fields: Any) -> None:
+    """structlog に集計を 1 行出し、N+1 の疑いがあれば警告する"""
+    if settings.DB_QUERY_LOG and stats.queries:
+        logger.info(event_name, **fields, **stats.as_dict())
+    for statement, count in stats.repeated(settings.DB_N_PLUS_ONE_THRESHOLD):
+        logger.warning("n_plus_one_suspected", **fields, count=count, statement=statement)
+
+
+@contextmanager
+def observe(event_name: str, **fields: Any) -> Iterator[QueryStats]:
+    """collect() して、抜けるときに report() する（途中で return / continue しても出す）"""
+    with collect() as stats:
+        try:
+            yield stats
+        finally:
+            report(stats, event_name, **fields)
+
+
+class QueryStatsMiddleware:
+    """HTTP リクエストごとに SQL を集計し、Server-Timing ヘッダとログに出す"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status: Optional[int] = None
+        with collect() as stats:
+
+            async def send_with_timing(message: Dict[str, Any]) -> None:
+                nonlocal status
+                # ヘッダを送る時点までの集計（ストリーミングの本文で読む分は含まない。ログには含む）
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    timing = (b"server-timing", stats.server_timing().encode())
+                    message = {**message, "headers": [*message.get("headers", []), timing]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                report(stats, "db_request", method=scope["method"], path=scope["path"], status=status)
@@ -1,34 +1,197 @@
 # backend/app/core/schema_guard.py
-from typing import Iterable, Tuple, Set
-from sqlalchemy.ext.asyncio import AsyncConnection
-from sqlalchemy import text
-
-async def _existing_columns(conn: AsyncConnection, table: str) -> Set[str]:
-    q = text("""
-        SELECT column_name
-        FROM information_schema.columns
-        WHERE table_schema = current_schema()
-          AND table_name   = :t
-    """)
-    res = await conn.execute(q, {"t": table})
-    return {row[0] for row in res}
-
-async def _ensure_columns(conn: AsyncConnection, table: str, cols: Iterable[Tuple[str, str]]) -> None:
-    existing = await _existing_columns(conn, table)
-    for name, ddl in cols:
-        if name not in existing:
-            # 例: ('started_at', 'TIMESTAMPTZ NULL')
-            await conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
-    # NOTE: ここにインデックス/制約の self-heal も足せる
-
-async def ensure_runtime_schema(conn: AsyncConnection) -> None:
-    """
-    起動時に既存テーブルへ不足カラムを追加してスキーマ差異を自己修復する。
-    追加は“前方互換な NULL カラム”のみに限定（安全）。
-    """
+"""起動時のスキーマ自己修復（前方互換な列の追加と、ホットパスのインデックスの確認）
+
+守る列・インデックス（GUARDED_COLUMNS / GUARDED_INDEXES）から指紋を作り、適用済みの指紋を
+schema_guard_state（マイグレーション 013）に残す。指紋が一致すれば 1 クエリで終わり、カタログは見ない。
+一致しなければアドバイザリロックで他ワーカーと直列化し、1 回のカタログクエリで不足を調べ、
+テーブルごとに 1 本の ALTER TABLE を流す。ALTER は SCHEMA_GUARD_LOCK_TIMEOUT_MS までしかロックを
+待たず、取れなければそのテーブルは見送る（ローリング再起動中の書き込みを止めない）。
+インデックスは作らない。無い・INVALID なものは報告だけして、作成はマイグレーション（CONCURRENTLY）に任せる。
+"""
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_TABLE = "schema_guard_state"
+STATE_KEY = "runtime"
+# lock_timeout に達したときの SQLSTATE
+LOCK_NOT_AVAILABLE = "55P03"
+
+# テーブル -> [(列名, 型と制約)]。追加は“前方互換な NULL カラム”か定数 DEFAULT 付きに限定（安全）
+GUARDED_COLUMNS: Dict[str, Tuple[Tuple[str, str], ...]] = {
     # conversations: initdb 側に無い可能性がある列を補完
-    await _ensure_columns(conn, "conversations", [
+    "conversations": (
         ("started_at", "TIMESTAMPTZ NULL"),
-        ("ended_at",   "TIMESTAMPTZ NULL"),
-    ])
-    # 必要に応じて他テーブルもここで補修できる
+        ("ended_at", "TIMESTAMPTZ NULL"),
+    ),
+    # messages: コンテキスト組み立て用のトークン数
+    "messages": (
+        ("token_count", "INTEGER NULL"),
+    ),
+    # assistant_skills: スキルインデックス用の有効フラグと優先度（定数 DEFAULT なので書き換えは発生しない）
+    "assistant_skills": (
+        ("is_enabled", "BOOLEAN NOT NULL DEFAULT true"),
+        ("priority", "INTEGER NOT NULL DEFAULT 1"),
+    ),
+}
+
+# (テーブル, インデックス名, 列定義)。作成は migration（CONCURRENTLY）の役目で、ここでは有無と有効性だけを見る
+GUARDED_INDEXES: Tuple[Tuple[str, str, str], ...] = (
+    # 履歴取得・keyset ページング（009_msg_conv_created_idx と同じ定義）
+    (
+        "messages",
+        "idx_messages_conversation_created_id",
+        "(conversation_id, created_at, id) INCLUDE (role, content_type, parent_message_id)",
+    ),
+)
+
+_CATALOG = text("""
+    SELECT c.relname AS table_name, 'column' AS kind, a.attname AS name, true AS valid
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND c.relname IN :tables
+    UNION ALL
+    SELECT t.relname, 'index', ic.relname, i.indisvalid
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = current_schema() AND t.relname IN :tables
+""").bindparams(bindparam("tables", expanding=True))
+
+
+@dataclass
+class SchemaGuardResult:
+    skipped: bool
+    duration_ms: float = 0.0
+    added_columns: List[str] = field(default_factory=list)
+    # 無い・INVALID なインデックス（作成は migration の役目。指紋は残さず次回も調べる）
+    missing_indexes: List[str] = field(default_factory=list)
+    # まだ存在しないテーブル（作成は migration / init.sql の役目。指紋は残さず次回も調べる）
+    missing_tables: List[str] = field(default_factory=list)
+    # ロックが取れず列の追加を見送ったテーブル（次回の起動で再試行する）
+    locked_tables: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not (self.missing_indexes or self.missing_tables or self.locked_tables)
+
+
+def guard_fingerprint() -> str:
+    spec = {
+        "columns": {t: [list(c) for c in cols] for t, cols in sorted(GUARDED_COLUMNS.items())},
+        "indexes": [list(i) for i in GUARDED_INDEXES],
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+async def _stored_fingerprint(engine: AsyncEngine) -> Optional[str]:
+    """適用済みの指紋（状態テーブルが無い・読めないなら None）"""
+    try:
+        async with engine.connect() as conn:
+            res = await conn.execute(
+                text(f"SELECT fingerprint FROM {STATE_TABLE} WHERE name = :k"), {"k": STATE_KEY}
+            )
+            return res.scalar()
+    except DBAPIError:
+        return None
+
+
+async def _heal(conn: AsyncConnection, fingerprint: str) -> SchemaGuardResult:
+    result = SchemaGuardResult(skipped=False)
+    # 同時に起動したワーカーは順番に通す（先のワーカーが直していれば指紋の再確認で抜ける）
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtextextended(:k, 0))"), {"k": STATE_TABLE})
+    # ここから先のテーブルロックは待ちすぎない（ALTER の待ちの後ろにアプリの書き込みが並ぶため）
+    await conn.execute(text(f"SET LOCAL lock_timeout = '{int(settings.SCHEMA_GUARD_LOCK_TIMEOUT_MS)}ms'"))
+    # 通常はマイグレーション 013 で作られている（migration 前の DB 向けに IF NOT EXISTS で作る）
+    await conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            name        TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            checked_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+    stored = (
+        await conn.execute(text(f"SELECT fingerprint FROM {STATE_TABLE} WHERE name = :k"), {"k": STATE_KEY})
+    ).scalar()
+    if stored == fingerprint:
+        result.skipped = True
+        return result
+
+    tables = sorted(set(GUARDED_COLUMNS) | {t for t, _, _ in GUARDED_INDEXES})
+    columns: Dict[str, Set[str]] = {}
+    indexes: Dict[str, bool] = {}
+    for row in await conn.execute(_CATALOG, {"tables": tables}):
+        if row.kind == "column":
+            columns.setdefault(row.table_name, set()).add(row.name)
+        else:
+            indexes[row.name] = row.valid
+    result.missing_tables = [t for t in tables if t not in columns]
+
+    for table, cols in GUARDED_COLUMNS.items():
+        if table not in columns:
+            continue
+        todo = [(name, ddl) for name, ddl in cols if name not in columns[table]]
+        if todo:
+            # 例: ALTER TABLE "conversations" ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ NULL, ...
+            clauses = ", ".join(f"ADD COLUMN IF NOT EXISTS {name} {ddl}" for name, ddl in todo)
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(text(f'ALTER TABLE "{table}" {clauses}'))
+            except DBAPIError as e:
+                if getattr(e.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+                    raise
+                result.locked_tables.append(table)
+                continue
+            result.added_columns.extend(f"{table}.{name}" for name, _ in todo)
+
+    # CONCURRENTLY の失敗で残った INVALID なものも、無いものと同じく報告だけする
+    result.missing_indexes = [
+        name for table, name, _ in GUARDED_INDEXES if table in columns and indexes.get(name) is not True
+    ]
+
+    if result.complete:
+        await conn.execute(
+            text(f"""
+                INSERT INTO {STATE_TABLE} (name, fingerprint) VALUES (:k, :f)
+                ON CONFLICT (name) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, checked_at = now()
+            """),
+            {"k": STATE_KEY, "f": fingerprint},
+        )
+    return result
+
+
+async def ensure_runtime_schema(engine: AsyncEngine) -> SchemaGuardResult:
+    """
+    起動時に既存テーブルへ不足カラムを追加し、不足インデックスを報告する。
+    守る定義が前回の適用から変わっていなければ、指紋の照合だけで終える。
+    """
+    started = time.perf_counter()
+    fingerprint = guard_fingerprint()
+    if await _stored_fingerprint(engine) == fingerprint:
+        result = SchemaGuardResult(skipped=True)
+    else:
+        async with engine.begin() as conn:
+            result = await _heal(conn, fingerprint)
+    result.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+    if result.added_columns:
+        logger.warning("schema guard added columns: %s", result.added_columns)
+    if result.locked_tables:
+        logger.warning("schema guard: lock not available, will retry on next startup: %s", result.locked_tables)
+    if result.missing_indexes:
+        logger.warning("schema guard: indexes missing or invalid (run the migrations): %s", result.missing_indexes)
+    if result.missing_tables:
+        logger.warning("schema guard: tables not found: %s", result.missing_tables)
+    return result
@@ -1,22 +1,75 @@
 # backend/app/main.py
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
+from app.core.config import settings
+from app.services.assistants.cache import shutdown_assistant_cache, start_assistant_cache
+from app.services.chat.compaction import shutdown_compaction_worker
+from app.services.chat.message_writer import shutdown_message_writer
+from app.services.llm.registry import close_providers
+from app.services.memory.pipeline import shutdown_embedding_pipeline, start_embedding_pipeline
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.schema_guard import ensure_runtime_schema
+from app.core.database import AsyncSessionLocal, ReadYourWritesMiddleware, async_engine, pool_stats, read_engine
+from app.services.routing.agent_index import get_agent_index
+from app.services.routing.skill_index import load_skill_index
+from app.services.users.default_user import load_default_user
 
 # Import models so metadata (tables) are registered with SQLAlchemy
 from app.models import models as _models  # noqa: F401
 from app.models import phase2_models as _phase2_models  # noqa: F401
 
-app = FastAPI(title="AI Secretary Team API", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # 不足列・インデックスの自己修復（定義が前回から変わっていなければ指紋の照合 1 回で終わる）
+    try:
+        guard = await ensure_runtime_schema(async_engine)
+        guard_summary = f"{'skipped' if guard.skipped else 'checked'} in {guard.duration_ms:.1f} ms"
+    except Exception:
+        logger.exception("schema guard failed; continuing with the current schema")
+        guard_summary = "failed"
+    # エージェント定義の埋め込み行列を最初のリクエスト前に構築しておく
+    get_agent_index()
+    # 既定ユーザーを解決（無ければ作成）して ID を memoize しておく
+    await load_default_user(AsyncSessionLocal)
+    # アシスタントごとの有効スキルを一括で読み込む（以降はコミット時に差分だけ更新）
+    await load_skill_index(AsyncSessionLocal)
+    await start_embedding_pipeline()
+    # 他ワーカーからのアシスタント無効化を購読する（Redis 設定時のみ）
+    await start_assistant_cache()
+    logger.info("startup finished in %.1f ms (schema guard %s)", (time.perf_counter() - started) * 1000, guard_summary)
+    yield
+    # write-behind キューに残ったメッセージを書き出してから終了する
+    await shutdown_message_writer()
+    await shutdown_embedding_pipeline()
+    await shutdown_compaction_worker()
+    await close_providers()
+    await shutdown_assistant_cache()
+
 
+app = FastAPI(title="AI Secretary Team API", version="1.0.0", lifespan=lifespan)
+
+# 資格情報（read-your-writes のクッキー）付きのリクエストでは "*" が使えないので、許可するオリジンを列挙する
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.cors_origins_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 書き込んだ直後のクライアントの読み取りはレプリカではなくプライマリへ
+app.add_middleware(ReadYourWritesMiddleware)
+# リクエストごとのクエリ数・DB 時間を Server-Timing ヘッダと構造化ログに出す（最も外側で計測）
+app.add_middleware(QueryStatsMiddleware)
 
 
 @app.get("/health")
@@ -24,6 +77,15 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/health/db")
+async def health_db():
+    # 接続は使わずプールの状態だけを返す（枯渇時にも応答できるように）
+    stats = {"pool": pool_stats(async_engine)}
+    if read_engine is not async_engine:
+        stats["read_pool"] = pool_stats(read_engine)
+    return stats
+
+
 # v1 routes
 app.include_router(api_router, prefix="/api/v1")
 
@@ -13,7 +13,7 @@ from sqlalchemy import (
     Text,
     func,
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -53,4 +53,19 @@ class AIAssistant(Base):
     updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", back_populates="assistants")
-    
+
+
+class PersonalityTemplate(Base):
+    """アシスタントの性格テンプレート（system_prompt をコンテキストの先頭に入れる）"""
+    __tablename__ = "personality_templates"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
+    name = Column(String(100), nullable=False)
+    description = Column(Text)
+    personality_type = Column(String(50))
+    system_prompt = Column(Text)
+    characteristics = Column(JSONB)
+    is_public = Column(Boolean, nullable=False, default=False)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -10,9 +10,10 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     CheckConstraint,
+    Index,
     text,
 )
-from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, REAL, UUID
 from sqlalchemy.orm import relationship, synonym
 from app.db.base import Base  # 統一された Base を使用
 
@@ -68,6 +69,8 @@ class Message(Base):
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
     content_type = Column(String(20), server_default=text("'text'::character varying"))
+    # 近似トークン数（書き込み時に計算し、コンテキスト組み立てで再計算しない）
+    token_count = Column(Integer)
 
     # DB は "metadata"、ORM 側も metadata に統一
     meta = Column("metadata", JSONB, server_default=JEMPTY)
@@ -79,12 +82,41 @@ class Message(Base):
     __table_args__ = (
         CheckConstraint("role in ('user','assistant','system')", name="messages_role_check"),
         CheckConstraint("content_type in ('text','image','file','audio')", name="messages_content_type_check"),
+        # 履歴取得・keyset ページング用（ソートなしで (created_at, id) 順に読める）
+        Index(
+            "idx_messages_conversation_created_id",
+            "conversation_id",
+            "created_at",
+            "id",
+            postgresql_include=["role", "content_type", "parent_message_id"],
+        ),
     )
 
     conversation = relationship("Conversation", back_populates="messages", passive_deletes=True)
     parent = relationship("Message", remote_side=[id])
 
 
+class MessageEmbedding(Base):
+    """メッセージの埋め込み（長期記憶の検索用）
+
+    ベクトルは real[] で保持し、pgvector があれば (embedding::vector(dim)) の式インデックス
+    （HNSW / IVFFlat、マイグレーション 010 で作成）で近傍検索する。拡張が無い環境でも同じスキーマで動く。
+    """
+    __tablename__ = "message_embeddings"
+
+    message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True)
+    conversation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # 埋め込み関数と次元（例: "hashing-1024"）。異なるモデルのベクトルは比較しない
+    model = Column(String(50), nullable=False)
+    embedding = Column(ARRAY(REAL), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=SERVER_DEFAULT_NOW)
+
+
 # ---- routing 用の軽量モデル ----
 class Agent(Base):
     __tablename__ = "agents"
@@ -105,3 +137,15 @@ class AssistantSkill(Base):
     assistant_id = Column(UUID(as_uuid=True), ForeignKey("assistants.id", ondelete="CASCADE"), nullable=False)
     skill_id = Column(UUID(as_uuid=True), ForeignKey("skill_definitions.id", ondelete="CASCADE"), nullable=False)
     level = Column(Integer, server_default=text("0"))
+    is_enabled = Column(Boolean, nullable=False, server_default=SERVER_DEFAULT_TRUE)
+    # 小さいほど優先（同じ一致度のスキルの並び順に使う）
+    priority = Column(Integer, nullable=False, server_default=text("1"))
+
+
+# ---- 起動時のスキーマ自己修復（app.core.schema_guard）の状態 ----
+class SchemaGuardState(Base):
+    """適用済みのスキーマガード定義の指紋（マイグレーション 013 で作成）"""
+    __tablename__ = "schema_guard_state"
+    name = Column(Text, primary_key=True)
+    fingerprint = Column(Text, nullable=False)
+    checked_at = Column(DateTime(timezone=True), nullable=False, server_default=SERVER_DEFAULT_NOW)
@@ -53,4 +53,5 @@ class MessageOut(ORMBase):
     content: str
     content_type: Optional[str] = None
     parent_message_id: Optional[UUID] = None
+    token_count: Optional[int] = None
     created_at: Optional[datetime] = None
@@ -0,0 +1,33 @@
+# backend/app/schemas/memory.py
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class MemorySearchRequest(BaseModel):
+    """会話単位（conversation_id）またはユーザー単位（user_id）のどちらか一方を指定する"""
+    query: str = Field(..., min_length=1, max_length=4000)
+    conversation_id: Optional[UUID] = None
+    user_id: Optional[UUID] = None
+    k: int = Field(5, ge=1, le=50)
+
+    @model_validator(mode="after")
+    def _one_scope(self):
+        if (self.conversation_id is None) == (self.user_id is None):
+            raise ValueError("specify exactly one of conversation_id or user_id")
+        return self
+
+
+class MemoryHitOut(BaseModel):
+    message_id: UUID
+    conversation_id: UUID
+    role: str
+    content: str
+    created_at: datetime
+    score: float
+
+
+class MemorySearchResponse(BaseModel):
+    hits: List[MemoryHitOut]
@@ -1,7 +1,15 @@
-from pydantic import BaseModel
+from typing import List
+
+from pydantic import BaseModel, Field
 from uuid import UUID
 
+from app.core.config import settings
+
 class RoutingRequest(BaseModel):
     """ルーティングリクエストのスキーマ"""
     prompt: str
-    assistant_id: UUID
\ No newline at end of file
+    assistant_id: UUID
+
+class RoutingBatchRequest(BaseModel):
+    """複数プロンプトの一括ルーティング（結果は requests の順）"""
+    requests: List[RoutingRequest] = Field(..., max_length=settings.ROUTING_BATCH_MAX_ITEMS)
@@ -0,0 +1 @@
+# Assistant services (read-through cache)
\ No newline at end of file
@@ -0,0 +1,312 @@
+"""AIAssistant の読み取りキャッシュ（プロセス内 LRU + 任意で Redis）
+
+GET /assistants/{id} と GET /assistants/ のレスポンス本文（シリアライズ済みの JSON）を ETag と
+一緒に保持する。ETag は id と updated_at から作る強い ETag で、If-None-Match が一致すれば
+本文を作らずに 304 を返せる。一覧の本文は行ごとの本文を連結して作る。
+
+無効化は app.core.invalidation（assistants の変更コミット）で行う。ASSISTANT_CACHE_REDIS_URL を
+設定すると、行ごとの本文を Redis にも置き（L2）、無効化を pub/sub で他ワーカーに配る。
+Redis に届かないときはプロセス内のキャッシュだけで動く。text() の生 SQL による変更は
+検知できないので、プロセス内のエントリは ASSISTANT_CACHE_TTL_SECONDS で期限切れにする。
+読み取りレプリカのセッションで読んだ結果は、無効化から DATABASE_READ_STICKY_SECONDS の間は
+格納しない（レプリカが変更に追いつく前の古い行をキャッシュに戻さない）。
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import invalidation
+from app.core.config import settings
+from app.core.database import replica_lag_seconds
+from app.models.models import AIAssistant
+from app.schemas.assistant import AssistantResponse
+
+try:  # Redis は任意（requirements にはあるが、未インストールでもプロセス内キャッシュで動く）
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "assistants:invalidate"
+_KEY = "assistant:{}"
+# 全件無効化を表すメッセージ
+_ALL = "*"
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    etag: str
+    body: bytes
+
+
+def make_etag(assistant_id: uuid.UUID, updated_at: datetime) -> str:
+    return f'"{assistant_id.hex}-{int(updated_at.timestamp() * 1_000_000):x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match（カンマ区切り・W/ 付き・"*"）に etag が含まれるか（弱い比較）"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def serialize(assistant: AIAssistant) -> CachedBody:
+    body = AssistantResponse.model_validate(assistant).model_dump_json().encode()
+    return CachedBody(make_etag(assistant.id, assistant.updated_at), body)
+
+
+def _list_etag(etags: Iterable[str]) -> str:
+    digest = hashlib.sha1("".join(etags).encode()).hexdigest()[:32]
+    return f'"list-{digest}"'
+
+
+class AssistantCache:
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 30.0,
+        redis: Any = None,
+        redis_ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[uuid.UUID, Tuple[float, CachedBody]]" = OrderedDict()
+        # (skip, limit) -> (期限, 本文)
+        self._lists: "OrderedDict[Tuple[int, int], Tuple[float, CachedBody]]" = OrderedDict()
+        # 無効化のたびに進める。読み込み中に無効化が挟まった結果は格納しない
+        self.generation = 0
+        self._invalidated_at = float("-inf")
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.l2_hits = 0
+
+    # ---- プロセス内 ----
+    def _get_local(self, assistant_id: uuid.UUID) -> Optional[CachedBody]:
+        item = self._entries.get(assistant_id)
+        if item is None:
+            return None
+        if item[0] <= self._clock():
+            del self._entries[assistant_id]
+            return None
+        self._entries.move_to_end(assistant_id)
+        return item[1]
+
+    def _put_local(self, assistant_id: uuid.UUID, cached: CachedBody, generation: Optional[int]) -> None:
+        if self.max_entries <= 0 or generation != self.generation:
+            return
+        self._entries[assistant_id] = (self._clock() + self.ttl_seconds, cached)
+        self._entries.move_to_end(assistant_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_local(self, assistant_ids: Optional[Set[Any]] = None) -> None:
+        self.generation += 1
+        self._invalidated_at = self._clock()
+        if assistant_ids is None:
+            self._entries.clear()
+            self._lists.clear()
+            return
+        for a in assistant_ids:
+            self._entries.pop(a, None)
+        # 一覧は追加・削除でページの中身がずれるので、どの行の変更でも全部捨てる
+        self._lists.clear()
+
+    # ---- Redis ----
+    async def _get_remote(self, assistant_id: uuid.UUID) -> Optional[CachedBody]:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(_KEY.format(assistant_id))
+        except Exception:
+            logger.warning("assistant cache: redis get failed", exc_info=True)
+            return None
+        if not raw:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return CachedBody(etag.decode(), body)
+
+    async def _put_remote(self, assistant_id: uuid.UUID, cached: CachedBody) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                _KEY.format(assistant_id), cached.etag.encode() + b"\n" + cached.body, ex=int(self.redis_ttl_seconds)
+            )
+        except Exception:
+            logger.warning("assistant cache: redis set failed", exc_info=True)
+
+    async def publish(self, assistant_ids: Optional[Set[Any]]) -> None:
+        """Redis の本文を消し、他ワーカーに無効化を配る"""
+        if self.redis is None:
+            return
+        try:
+            if assistant_ids:
+                await self.redis.delete(*(_KEY.format(a) for a in assistant_ids))
+            for message in ([str(a) for a in assistant_ids] if assistant_ids is not None else [_ALL]):
+                await self.redis.publish(CHANNEL, message)
+        except Exception:
+            logger.warning("assistant cache: redis publish failed", exc_info=True)
+
+    def on_change(self, table: str, keys: Optional[Set[Any]]) -> None:
+        self.invalidate_local(keys)
+        if self.redis is not None:
+            try:
+                asyncio.get_running_loop().create_task(self.publish(keys))
+            except RuntimeError:  # イベントループ外（スクリプトなど）では配らない
+                pass
+
+    async def start(self) -> None:
+        """他ワーカーからの無効化を購読する（Redis 未設定なら何もしない）"""
+        if self.redis is None or self._listener is not None:
+            return
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(CHANNEL)
+        self._listener = asyncio.ensure_future(self._listen(pubsub))
+
+    async def _listen(self, pubsub: Any) -> None:
+        try:
+            while True:
+                try:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                except Exception:
+                    # 取りこぼした無効化があるかもしれないので手元は全部捨てる
+                    logger.warning("assistant cache: redis subscription failed; retrying", exc_info=True)
+                    self.invalidate_local(None)
+                    await asyncio.sleep(1.0)
+                    continue
+                if message is None:
+                    continue
+                data = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+                if data == _ALL:
+                    self.invalidate_local(None)
+                else:
+                    try:
+                        self.invalidate_local({uuid.UUID(data)})
+                    except ValueError:
+                        continue
+        finally:
+            await pubsub.aclose()
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    # ---- 読み取り ----
+    def _fill_generation(self, db: AsyncSession) -> Optional[int]:
+        """DB から読んだ結果を格納するときの世代。レプリカが無効化に追いついていない間は None（格納しない）"""
+        if self._clock() - self._invalidated_at < replica_lag_seconds(db):
+            return None
+        return self.generation
+
+    async def get(self, db: AsyncSession, assistant_id: uuid.UUID) -> Optional[CachedBody]:
+        """本文と ETag。存在しなければ None"""
+        cached = self._get_local(assistant_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        generation = self.generation
+        cached = await self._get_remote(assistant_id)
+        if cached is not None:
+            self.l2_hits += 1
+            self._put_local(assistant_id, cached, generation)
+            return cached
+        self.misses += 1
+        generation = self._fill_generation(db)
+        assistant = (await db.execute(select(AIAssistant).where(AIAssistant.id == assistant_id))).scalars().first()
+        if assistant is None:
+            return None
+        cached = serialize(assistant)
+        self._put_local(assistant_id, cached, generation)
+        if generation == self.generation:
+            await self._put_remote(assistant_id, cached)
+        return cached
+
+    async def list(self, db: AsyncSession, skip: int = 0, limit: int = 100) -> CachedBody:
+        key = (skip, limit)
+        item = self._lists.get(key)
+        if item is not None and item[0] > self._clock():
+            self._lists.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        self.misses += 1
+        generation = self._fill_generation(db)
+        rows = (
+            (await db.execute(select(AIAssistant).order_by(AIAssistant.created_at, AIAssistant.id).offset(skip).limit(limit)))
+            .scalars()
+            .all()
+        )
+        parts: List[CachedBody] = []
+        for assistant in rows:
+            cached = serialize(assistant)
+            self._put_local(assistant.id, cached, generation)
+            parts.append(cached)
+        listed = CachedBody(_list_etag(p.etag for p in parts), b"[" + b",".join(p.body for p in parts) + b"]")
+        if generation == self.generation and self.max_entries > 0:
+            self._lists[key] = (self._clock() + self.ttl_seconds, listed)
+            while len(self._lists) > self.max_entries:
+                self._lists.popitem(last=False)
+        return listed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "lists": len(self._lists),
+            "hits": self.hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "redis": self.redis is not None,
+        }
+
+
+_cache: Optional[AssistantCache] = None
+
+
+def get_assistant_cache() -> AssistantCache:
+    global _cache
+    if _cache is None:
+        redis = None
+        if settings.ASSISTANT_CACHE_REDIS_URL and aioredis is not None:
+            redis = aioredis.from_url(settings.ASSISTANT_CACHE_REDIS_URL)
+        _cache = AssistantCache(
+            max_entries=settings.ASSISTANT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ASSISTANT_CACHE_TTL_SECONDS,
+            redis=redis,
+            redis_ttl_seconds=settings.ASSISTANT_CACHE_REDIS_TTL_SECONDS,
+        )
+        invalidation.subscribe({"assistants": "id"}, _cache.on_change)
+    return _cache
+
+
+async def start_assistant_cache() -> None:
+    try:
+        await get_assistant_cache().start()
+    except Exception:
+        logger.exception("assistant cache: redis subscription failed; using process-local invalidation only")
+
+
+async def shutdown_assistant_cache() -> None:
+    if _cache is not None:
+        await _cache.stop()
+        if _cache.redis is not None:
+            await _cache.redis.aclose()
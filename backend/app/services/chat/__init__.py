@@ -0,0 +1 @@
+# Chat services package
\ No newline at end of file
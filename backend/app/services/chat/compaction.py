@@ -0,0 +1,350 @@
+"""長い会話の要約（コンパクション）
+
+未要約のメッセージのトークン数が CHAT_COMPACTION_THRESHOLD_TOKENS を超えた会話について、
+直近 CHAT_COMPACTION_KEEP_RECENT_TOKENS 分を残し、それより古いターン（と前回の要約）を
+1 件の system メッセージにまとめる。要約メッセージは parent_message_id で要約範囲の
+最後のメッセージを指し、metadata に範囲・圧縮率・所要時間を記録する。
+元のメッセージは消さない（一覧 API からは引き続き読める。要約メッセージ自体は一覧に出さない）。コンテキスト組み立て側が
+要約済みの範囲を読み飛ばし、要約で置き換える。
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, Sequence, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.phase2_models import Message
+from app.services.chat.context import (
+    SUMMARY_KIND,
+    HistoryItem,
+    context_builder,
+    item_from_row,
+    summarized_until,
+    summary_query,
+    unsummarized_query,
+)
+from app.services.chat.message_writer import build_message_row
+from app.services.chat.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+from app.services.embeddings.embedder import features
+from app.services.llm.base import LLMError
+from app.services.llm.registry import get_provider
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "これまでの会話の要約:"
+ROLE_LABELS = {"user": "ユーザー", "assistant": "アシスタント", "system": "システム"}
+
+_SENTENCE = re.compile(r"[^。．.!?！？\n]+[。．.!?！？]*")
+_MAX_SENTENCE_CHARS = 200
+# 直近の要約を残しやすくする重み
+_PREVIOUS_WEIGHT = 1.5
+# 要約せずに必ず残す直近のメッセージ数
+_MIN_KEEP = 2
+
+
+class Summarizer(ABC):
+    name: str
+
+    @abstractmethod
+    async def summarize(self, previous: Optional[str], items: Sequence[HistoryItem], max_tokens: int) -> str:
+        """前回の要約と古いターンから、max_tokens 程度の要約（SUMMARY_HEADER で始まる）を作る"""
+
+
+class ExtractiveSummarizer(Summarizer):
+    """頻出語を多く含む文を選び、元の順に並べる（LLM を呼ばない）"""
+
+    name = "extractive"
+
+    async def summarize(self, previous: Optional[str], items: Sequence[HistoryItem], max_tokens: int) -> str:
+        # (行, 特徴量, 重み)
+        candidates = []
+        seen: Set[str] = set()
+        if previous:
+            for line in previous.splitlines()[1:]:
+                line = line.strip()
+                if line and line not in seen:
+                    seen.add(line)
+                    candidates.append((line, set(features(line)), _PREVIOUS_WEIGHT))
+        for item in items:
+            label = ROLE_LABELS.get(item.role, item.role)
+            for sentence in _SENTENCE.findall(item.content):
+                sentence = sentence.strip()[:_MAX_SENTENCE_CHARS]
+                line = f"- {label}: {sentence}"
+                if not sentence or line in seen:
+                    continue
+                seen.add(line)
+                candidates.append((line, set(features(sentence)), 1.0))
+
+        df = Counter(f for _, feats, _ in candidates for f in feats)
+        scored = sorted(
+            range(len(candidates)),
+            key=lambda i: -candidates[i][2]
+            * sum(df[f] for f in candidates[i][1])
+            / math.sqrt(len(candidates[i][1]) or 1),
+        )
+        used = count_tokens(SUMMARY_HEADER)
+        picked = []
+        for i in scored:
+            cost = count_tokens(candidates[i][0]) + 1
+            if used + cost > max_tokens:
+                continue
+            picked.append(i)
+            used += cost
+        return "\n".join([SUMMARY_HEADER] + [candidates[i][0] for i in sorted(picked)])
+
+
+class LLMSummarizer(Summarizer):
+    """LLM で要約する。呼び出しに失敗したら抽出要約に切り替える"""
+
+    name = "llm"
+
+    def __init__(self, model: str, fallback: Optional[Summarizer] = None):
+        self.model = model
+        self.fallback = fallback or ExtractiveSummarizer()
+
+    async def summarize(self, previous: Optional[str], items: Sequence[HistoryItem], max_tokens: int) -> str:
+        transcript = "\n".join(f"{ROLE_LABELS.get(i.role, i.role)}: {i.content}" for i in items)
+        if previous:
+            transcript = f"{previous}\n\n{transcript}"
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "次の会話を、以降の応答に必要な事実・決定事項・依頼内容を残して"
+                    f"{max_tokens} トークン以内で要約してください。"
+                ),
+            },
+            {"role": "user", "content": transcript},
+        ]
+        try:
+            text = await get_provider(self.model).complete(self.model, messages)
+        except LLMError:
+            logger.warning("LLM summarization failed; falling back to extractive", exc_info=True)
+            return await self.fallback.summarize(previous, items, max_tokens)
+        return f"{SUMMARY_HEADER}\n{text.strip()}"
+
+
+def get_summarizer(name: Optional[str] = None) -> Summarizer:
+    name = name or settings.CHAT_COMPACTION_SUMMARIZER
+    if name == "llm":
+        return LLMSummarizer(settings.CHAT_COMPACTION_LLM_MODEL)
+    if name == "extractive":
+        return ExtractiveSummarizer()
+    raise ValueError(f"unknown summarizer: {name!r}")
+
+
+@dataclass
+class CompactionResult:
+    conversation_id: uuid.UUID
+    summary_id: uuid.UUID
+    source_messages: int
+    source_tokens: int
+    summary_tokens: int
+    compaction_ratio: float
+    duration_ms: float
+    summarizer: str
+    # 読み込み上限に達した（続けてもう一度実行する）
+    more: bool = False
+
+
+async def compact_conversation(
+    sessions: Callable[[], AsyncSession],
+    conversation_id: uuid.UUID,
+    *,
+    summarizer: Optional[Summarizer] = None,
+    threshold_tokens: Optional[int] = None,
+    keep_recent_tokens: Optional[int] = None,
+    summary_tokens: Optional[int] = None,
+    max_messages: Optional[int] = None,
+) -> Optional[CompactionResult]:
+    """しきい値を超えていれば要約メッセージを追加してコミットする。不要なら None
+
+    読み込み・要約・書き込みを分け、要約（LLM 呼び出しのこともある）の間は DB 接続も
+    トランザクションもロックも持たない。書き込みは短いトランザクションでロックを取り直し、
+    その間に別のワーカーが要約を進めていたら何も書かない。
+    """
+    summarizer = summarizer or get_summarizer()
+    threshold = settings.CHAT_COMPACTION_THRESHOLD_TOKENS if threshold_tokens is None else threshold_tokens
+    keep_recent = settings.CHAT_COMPACTION_KEEP_RECENT_TOKENS if keep_recent_tokens is None else keep_recent_tokens
+    target = settings.CHAT_COMPACTION_SUMMARY_TOKENS if summary_tokens is None else summary_tokens
+    limit = settings.CHAT_COMPACTION_MAX_MESSAGES if max_messages is None else max_messages
+    started = time.perf_counter()
+
+    # 1) 前回の要約と未要約の行を読み、接続を返す
+    async with sessions() as db:
+        previous = (await db.execute(summary_query(conversation_id))).first()
+        q = (
+            unsummarized_query(conversation_id, summarized_until(previous.meta) if previous is not None else None)
+            .order_by(Message.created_at, Message.id)
+            .limit(limit)
+        )
+        items = [item_from_row(r) for r in (await db.execute(q)).all()]
+    costs = [i.tokens + MESSAGE_OVERHEAD_TOKENS for i in items]
+    if sum(costs) < threshold:
+        return None
+
+    split, kept = len(items), 0
+    while split > 0 and (len(items) - split < _MIN_KEEP or kept + costs[split - 1] <= keep_recent):
+        split -= 1
+        kept += costs[split]
+    old = items[:split]
+    if not old:
+        return None
+
+    # 2) セッションの外で要約する
+    text = await summarizer.summarize(previous.content if previous is not None else None, old, target)
+    source_tokens = sum(costs[:split]) + (
+        (previous.token_count or count_tokens(previous.content)) if previous is not None else 0
+    )
+    tokens = count_tokens(text)
+    last = old[-1]
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    ratio = round(tokens / source_tokens, 4) if source_tokens else 0.0
+    previous_id = previous.id if previous is not None else None
+    row = build_message_row(
+        conversation_id,
+        "system",
+        text,
+        parent_message_id=last.id,
+        meta={
+            "kind": SUMMARY_KIND,
+            "summarized_until": {"created_at": last.created_at.isoformat(), "id": str(last.id)},
+            "previous_summary_id": str(previous_id) if previous_id is not None else None,
+            "source_messages": len(old),
+            "source_tokens": source_tokens,
+            "summary_tokens": tokens,
+            "compaction_ratio": ratio,
+            "duration_ms": duration_ms,
+            "summarizer": summarizer.name,
+        },
+    )
+    row["token_count"] = tokens
+
+    # 3) 同じ会話の書き込みはアドバイザリロックで直列化し、要約の起点が変わっていないか確かめて書く
+    async with sessions() as db:
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(str(conversation_id), 0))))
+        current = (await db.execute(summary_query(conversation_id))).first()
+        if (current.id if current is not None else None) != previous_id:
+            logger.info("conversation %s was compacted concurrently; dropping this summary", conversation_id)
+            return None
+        db.add(Message(**row))
+        await db.commit()
+    return CompactionResult(
+        conversation_id=conversation_id,
+        summary_id=row["id"],
+        source_messages=len(old),
+        source_tokens=source_tokens,
+        summary_tokens=tokens,
+        compaction_ratio=ratio,
+        duration_ms=duration_ms,
+        summarizer=summarizer.name,
+        more=len(items) >= limit,
+    )
+
+
+class CompactionWorker:
+    """要約が必要そうな会話をキューで受け取り、1 件ずつ要約する"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        summarizer: Optional[Summarizer] = None,
+        on_compacted: Optional[Callable[[uuid.UUID], None]] = None,
+        **options: Any,
+    ):
+        self._session_factory = session_factory
+        self.summarizer = summarizer or get_summarizer()
+        self.on_compacted = on_compacted
+        self.options = options
+        self._queue: "asyncio.Queue[uuid.UUID]" = asyncio.Queue()
+        self._scheduled: Set[uuid.UUID] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.last: Optional[CompactionResult] = None
+        self.stats: Dict[str, float] = {"runs": 0, "compactions": 0, "failures": 0, "total_ms": 0.0}
+
+    def schedule(self, conversation_id: uuid.UUID) -> None:
+        """要約の候補として積む（積み済みなら何もしない）"""
+        if conversation_id in self._scheduled:
+            return
+        self._scheduled.add(conversation_id)
+        self._queue.put_nowait(conversation_id)
+        self.start()
+
+    async def run_once(self, conversation_id: uuid.UUID) -> Optional[CompactionResult]:
+        result = await compact_conversation(
+            self._session_factory, conversation_id, summarizer=self.summarizer, **self.options
+        )
+        self.stats["runs"] += 1
+        if result is not None:
+            self.stats["compactions"] += 1
+            self.stats["total_ms"] += result.duration_ms
+            self.last = result
+            logger.info(
+                "compacted conversation %s: %d messages, %d -> %d tokens (ratio %.3f) in %.1f ms",
+                conversation_id,
+                result.source_messages,
+                result.source_tokens,
+                result.summary_tokens,
+                result.compaction_ratio,
+                result.duration_ms,
+            )
+            if self.on_compacted is not None:
+                self.on_compacted(conversation_id)
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            conversation_id = await self._queue.get()
+            self._scheduled.discard(conversation_id)
+            try:
+                result = await self.run_once(conversation_id)
+            except Exception:
+                self.stats["failures"] += 1
+                logger.exception("conversation compaction failed (%s)", conversation_id)
+                continue
+            if result is not None and result.more:
+                self.schedule(conversation_id)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "queued": self._queue.qsize(), "last": asdict(self.last) if self.last else None}
+
+
+_worker: Optional[CompactionWorker] = None
+
+
+def get_compaction_worker() -> CompactionWorker:
+    """FastAPI の Depends 用: プロセス共有のワーカーを返す"""
+    global _worker
+    if _worker is None:
+        # 要約を足したら、キャッシュ済みの履歴の窓を読み直させる
+        _worker = CompactionWorker(AsyncSessionLocal, on_compacted=context_builder.forget)
+    return _worker
+
+
+async def shutdown_compaction_worker() -> None:
+    if _worker is not None:
+        await _worker.stop()
@@ -0,0 +1,297 @@
+"""LLM に渡すコンテキスト（system + 直近の履歴 + 今回の発言）の組み立て
+
+system プロンプトは性格テンプレートの system_prompt と AIAssistant.custom_system_prompt を
+連結したもので、アシスタントごとにキャッシュする（assistants / personality_templates の
+変更コミットで無効化）。履歴は会話ごとに直近 CHAT_CONTEXT_MAX_MESSAGES 件の窓を
+トークン数付きで保持し、2 ターン目以降は窓の末尾より新しい行だけを読み足す。
+トークン数は書き込み時に保存した messages.token_count を使い、無い行だけ数える。
+窓から新しい順に、モデルごとの予算（tokens.prompt_budget）に収まるところまで採用する。
+
+会話の要約（role=system, metadata.kind=summary。compaction が作る）があれば、
+要約済みの範囲（metadata.summarized_until まで）の行は読まず、要約を system に続けて入れる。
+"""
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import invalidation
+from app.core.config import settings
+from app.models.models import AIAssistant, PersonalityTemplate
+from app.models.phase2_models import Message
+from app.services.chat.history import MESSAGE_KIND, NOT_SUMMARY, SUMMARY_KIND
+from app.services.chat.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens, prompt_budget
+
+ChatMessage = Dict[str, str]
+
+
+@dataclass(frozen=True)
+class HistoryItem:
+    id: uuid.UUID
+    role: str
+    content: str
+    tokens: int
+    created_at: datetime
+
+
+@dataclass
+class _Window:
+    items: List[HistoryItem] = field(default_factory=list)
+    ids: Set[uuid.UUID] = field(default_factory=set)
+    summary: Optional[HistoryItem] = None
+    # 要約済みの最後の (created_at, id)。これ以前の行は窓に入れない
+    floor: Optional[Tuple[datetime, uuid.UUID]] = None
+
+    def merge(self, items: Iterable[HistoryItem], max_messages: int) -> None:
+        added = [i for i in items if i.id not in self.ids]
+        if not added:
+            return
+        ordered = bool(self.items) and all(i.created_at >= self.items[-1].created_at for i in added)
+        self.items.extend(added)
+        if not ordered:
+            self.items.sort(key=lambda i: (i.created_at, i.id))
+        del self.items[: max(0, len(self.items) - max_messages)]
+        self.ids = {i.id for i in self.items}
+
+
+def item_from_row(row: Any) -> HistoryItem:
+    """SELECT 結果の行を窓に入れる形に変換する（token_count が無ければ数える）"""
+    content = row.content or ""
+    tokens = row.token_count if row.token_count is not None else count_tokens(content)
+    return HistoryItem(id=row.id, role=row.role, content=content, tokens=tokens, created_at=row.created_at)
+
+
+def history_item(row: Mapping[str, Any]) -> HistoryItem:
+    """build_message_row() で作った行（未コミットでもよい）を窓に入れる形に変換する"""
+    content = row["content"]
+    tokens = row.get("token_count")
+    return HistoryItem(
+        id=row["id"],
+        role=row["role"],
+        content=content,
+        tokens=tokens if tokens is not None else count_tokens(content),
+        created_at=row["created_at"],
+    )
+
+
+def summary_query(conversation_id: uuid.UUID):
+    """会話の最新の要約メッセージ"""
+    return (
+        select(Message.id, Message.role, Message.content, Message.token_count, Message.created_at, Message.meta)
+        .where(Message.conversation_id == conversation_id, Message.role == "system", MESSAGE_KIND == SUMMARY_KIND)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+    )
+
+
+def summarized_until(meta: Optional[Mapping[str, Any]]) -> Optional[Tuple[datetime, uuid.UUID]]:
+    """要約に含まれる最後のメッセージの (created_at, id)"""
+    until = (meta or {}).get("summarized_until") or {}
+    try:
+        return datetime.fromisoformat(until["created_at"]), uuid.UUID(until["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def unsummarized_query(conversation_id: uuid.UUID, floor: Optional[Tuple[datetime, uuid.UUID]] = None):
+    """要約済みの範囲（floor まで）より後の、要約以外のテキストメッセージ"""
+    q = select(Message.id, Message.role, Message.content, Message.token_count, Message.created_at).where(
+        Message.conversation_id == conversation_id, Message.content_type == "text", NOT_SUMMARY
+    )
+    if floor is not None:
+        q = q.where(tuple_(Message.created_at, Message.id) > floor)
+    return q
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        max_conversations: int = 1024,
+        max_messages: int = 200,
+        # write-behind の created_at はクライアント側時刻のため、コミット順と多少前後する
+        lookback: timedelta = timedelta(seconds=30),
+    ):
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self.lookback = lookback
+        self._windows: "OrderedDict[uuid.UUID, _Window]" = OrderedDict()
+        # assistant_id -> (system プロンプト, トークン数)
+        self._system: Dict[uuid.UUID, Tuple[str, int]] = {}
+
+    # ---- system プロンプト ----
+    async def system_prompt(self, db: AsyncSession, assistant_id: Optional[uuid.UUID]) -> Tuple[str, int]:
+        if assistant_id is None:
+            return "", 0
+        cached = self._system.get(assistant_id)
+        if cached is not None:
+            return cached
+        res = await db.execute(
+            select(AIAssistant.custom_system_prompt, PersonalityTemplate.system_prompt)
+            .outerjoin(PersonalityTemplate, PersonalityTemplate.id == AIAssistant.personality_template_id)
+            .where(AIAssistant.id == assistant_id)
+        )
+        row = res.first()
+        # 性格テンプレートを土台にし、アシスタント固有の指示を後に置く
+        parts = [p.strip() for p in ((row[1], row[0]) if row else ()) if p and p.strip()]
+        text = "\n\n".join(parts)
+        cached = (text, count_tokens(text) + MESSAGE_OVERHEAD_TOKENS if text else 0)
+        self._system[assistant_id] = cached
+        return cached
+
+    def invalidate_assistants(self, assistant_ids: Optional[Set[Any]] = None) -> None:
+        if assistant_ids is None:
+            self._system.clear()
+        else:
+            for a in assistant_ids:
+                self._system.pop(a, None)
+
+    # ---- 履歴 ----
+    async def _load(self, db: AsyncSession, conversation_id: uuid.UUID) -> _Window:
+        window = _Window()
+        summary = (await db.execute(summary_query(conversation_id))).first()
+        if summary is not None:
+            window.summary = item_from_row(summary)
+            window.floor = summarized_until(summary.meta)
+        q = (
+            unsummarized_query(conversation_id, window.floor)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(self.max_messages)
+        )
+        rows = (await db.execute(q)).all()
+        window.merge(reversed([item_from_row(r) for r in rows]), self.max_messages)
+        self._remember(conversation_id, window)
+        return window
+
+    async def _window(self, db: AsyncSession, conversation_id: uuid.UUID) -> _Window:
+        window = self._windows.get(conversation_id)
+        if window is None:
+            return await self._load(db, conversation_id)
+        self._windows.move_to_end(conversation_id)
+        q = select(
+            Message.id,
+            Message.role,
+            Message.content,
+            Message.token_count,
+            Message.created_at,
+            MESSAGE_KIND.label("kind"),
+        ).where(Message.conversation_id == conversation_id, Message.content_type == "text")
+        if window.items:
+            q = q.where(Message.created_at >= window.items[-1].created_at - self.lookback)
+        if window.floor is not None:
+            q = q.where(tuple_(Message.created_at, Message.id) > window.floor)
+        q = q.order_by(Message.created_at, Message.id)
+        rows = (await db.execute(q)).all()
+        if window.summary is not None:
+            rows = [r for r in rows if r.id != window.summary.id]
+        if any(r.role == "system" and r.kind == SUMMARY_KIND for r in rows):
+            # 別プロセスで要約が作られた: 要約済みの範囲を落として読み直す
+            return await self._load(db, conversation_id)
+        window.merge((item_from_row(r) for r in rows if r.id not in window.ids), self.max_messages)
+        return window
+
+    async def history(self, db: AsyncSession, conversation_id: uuid.UUID) -> List[HistoryItem]:
+        """会話の直近の未要約の履歴（古い順）。キャッシュ済みなら末尾より新しい行だけを読む"""
+        return list((await self._window(db, conversation_id)).items)
+
+    def unsummarized_tokens(self, conversation_id: uuid.UUID) -> int:
+        """キャッシュ済みの窓のうち要約されていない部分のトークン数（未キャッシュなら 0）"""
+        window = self._windows.get(conversation_id)
+        return sum(i.tokens + MESSAGE_OVERHEAD_TOKENS for i in window.items) if window is not None else 0
+
+    def append(self, conversation_id: uuid.UUID, rows: Iterable[Mapping[str, Any]]) -> None:
+        """このプロセスで書いた行を窓に足す（キャッシュ済みの会話のみ。コミット前でもよい）"""
+        window = self._windows.get(conversation_id)
+        if window is not None:
+            window.merge((history_item(r) for r in rows), self.max_messages)
+
+    def forget(self, conversation_id: uuid.UUID) -> None:
+        """履歴の書き換え（削除・要約）後に窓を捨てる"""
+        self._windows.pop(conversation_id, None)
+
+    def _remember(self, conversation_id: uuid.UUID, window: _Window) -> None:
+        self._windows[conversation_id] = window
+        self._windows.move_to_end(conversation_id)
+        while len(self._windows) > self.max_conversations:
+            self._windows.popitem(last=False)
+
+    # ---- 組み立て ----
+    async def build(
+        self,
+        db: AsyncSession,
+        conversation_id: uuid.UUID,
+        *,
+        model: str,
+        assistant_id: Optional[uuid.UUID] = None,
+        pending: Iterable[Mapping[str, Any]] = (),
+        budget: Optional[int] = None,
+    ) -> List[ChatMessage]:
+        """[system, 履歴..., 今回の発言] をトークン予算内で返す
+
+        pending は今回キューに積んだ行（通常は user の発言）。まだコミットされていなくても
+        履歴の末尾に入る。最新の 1 件は予算を超えても必ず含める。
+        """
+        messages, _ = await self.build_with_usage(
+            db, conversation_id, model=model, assistant_id=assistant_id, pending=pending, budget=budget
+        )
+        return messages
+
+    async def build_with_usage(
+        self,
+        db: AsyncSession,
+        conversation_id: uuid.UUID,
+        *,
+        model: str,
+        assistant_id: Optional[uuid.UUID] = None,
+        pending: Iterable[Mapping[str, Any]] = (),
+        budget: Optional[int] = None,
+    ) -> Tuple[List[ChatMessage], int]:
+        """build と同じ。使ったプロンプトのトークン数（概算）も返す"""
+        budget = prompt_budget(model) if budget is None else budget
+        pending = list(pending)
+        system, used = await self.system_prompt(db, assistant_id)
+        window = await self._window(db, conversation_id)
+        items = list(window.items)
+        if window.summary is not None:
+            # 要約は system の後ろに連結する（system を複数受け付けないモデルがあるため）
+            system = f"{system}\n\n{window.summary.content}" if system else window.summary.content
+            used += window.summary.tokens + (0 if used else MESSAGE_OVERHEAD_TOKENS)
+        extra = [history_item(r) for r in pending]
+        known = {i.id for i in items}
+        items += [i for i in extra if i.id not in known]
+        self.append(conversation_id, pending)
+
+        picked: List[HistoryItem] = []
+        for item in reversed(items):
+            cost = item.tokens + MESSAGE_OVERHEAD_TOKENS
+            if picked and used + cost > budget:
+                break
+            picked.append(item)
+            used += cost
+        messages: List[ChatMessage] = [{"role": "system", "content": system}] if system else []
+        messages += [{"role": i.role, "content": i.content} for i in reversed(picked)]
+        return messages, used
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "conversations": len(self._windows),
+            "messages": sum(len(w.items) for w in self._windows.values()),
+            "assistants": len(self._system),
+        }
+
+
+context_builder = ContextBuilder(
+    max_conversations=settings.CHAT_CONTEXT_CACHE_SIZE,
+    max_messages=settings.CHAT_CONTEXT_MAX_MESSAGES,
+)
+
+
+def _on_change(table: str, keys: Optional[Set[Any]]) -> None:
+    # テンプレートの変更はどのアシスタントに効くか分からないので全件捨てる
+    context_builder.invalidate_assistants(keys if table == "assistants" else None)
+
+
+invalidation.subscribe({"assistants": "id", "personality_templates": None}, _on_change)
@@ -0,0 +1,128 @@
+"""ストリーミング応答のフレーム集約とワイヤフォーマット
+
+- coalesce_tokens: トークン列を N トークン / N バイト / M ミリ秒のいずれかで 1 チャンクにまとめる
+- FrameCodec: 接続時に WebSocket サブプロトコルで JSON(テキスト) / msgpack(バイナリ) を選ぶ
+  - "chat.json.v1"    : 従来どおりの JSON テキストフレーム（サブプロトコル未指定時の既定）
+  - "chat.msgpack.v1" : 同じ構造の dict を msgpack でエンコードしたバイナリフレーム
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:  # msgpack 未導入環境では JSON のみ提供する
+    msgpack = None
+
+JSON_SUBPROTOCOL = "chat.json.v1"
+MSGPACK_SUBPROTOCOL = "chat.msgpack.v1"
+
+
+async def coalesce_tokens(
+    tokens: AsyncIterator[str],
+    *,
+    max_tokens: int = 16,
+    max_bytes: int = 1024,
+    max_delay: float = 0.025,
+) -> AsyncIterator[str]:
+    """トークン列をフレーム単位のチャンクにまとめて返す。
+
+    最初のトークンを受け取った時点から max_delay 秒経過すると、
+    上流が止まっていても溜まっている分を送り出す。
+    """
+    if max_tokens <= 1:
+        async for token in tokens:
+            yield token
+        return
+
+    loop = asyncio.get_running_loop()
+    it = tokens.__aiter__()
+    buf: List[str] = []
+    n_bytes = 0
+    deadline = 0.0
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = max(0.0, deadline - loop.time()) if buf else None
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                # 締め切り到達: 次トークンの取得は継続したまま溜まった分を送る
+                yield "".join(buf)
+                buf, n_bytes = [], 0
+                continue
+            task, pending = pending, None
+            try:
+                token = task.result()
+            except StopAsyncIteration:
+                break
+            if not buf:
+                deadline = loop.time() + max_delay
+            buf.append(token)
+            n_bytes += len(token.encode("utf-8"))
+            if len(buf) >= max_tokens or n_bytes >= max_bytes:
+                yield "".join(buf)
+                buf, n_bytes = [], 0
+        if buf:
+            yield "".join(buf)
+    finally:
+        if pending is not None:
+            # 実行中の __anext__ を止め切ってから上流を閉じる
+            pending.cancel()
+            await asyncio.wait((pending,))
+        aclose = getattr(it, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class FrameCodec:
+    """JSON テキストフレーム"""
+
+    subprotocol = JSON_SUBPROTOCOL
+
+    def encode(self, frame: Dict[str, Any]) -> Any:
+        return json.dumps(frame, ensure_ascii=False, separators=(",", ":"))
+
+    async def send(self, websocket: WebSocket, frame: Dict[str, Any]) -> None:
+        await websocket.send_text(self.encode(frame))
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        """テキスト(JSON)・バイナリ(msgpack)のどちらで届いてもデコードする"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message.get("bytes")
+        if data is not None:
+            if msgpack is None:
+                raise ValueError("binary frames require msgpack")
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(message.get("text") or "null")
+
+
+class MsgpackFrameCodec(FrameCodec):
+    """msgpack バイナリフレーム"""
+
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    def encode(self, frame: Dict[str, Any]) -> Any:
+        return msgpack.packb(frame, use_bin_type=True)
+
+    async def send(self, websocket: WebSocket, frame: Dict[str, Any]) -> None:
+        await websocket.send_bytes(self.encode(frame))
+
+
+def negotiate_codec(websocket: WebSocket) -> Tuple[FrameCodec, Optional[str]]:
+    """クライアントが提示したサブプロトコルからコーデックを選ぶ。
+
+    戻り値の 2 番目は accept() に渡すサブプロトコル（未指定なら None）。
+    """
+    offered = websocket.scope.get("subprotocols") or []
+    for proto in offered:
+        if proto == MSGPACK_SUBPROTOCOL and msgpack is not None:
+            return MsgpackFrameCodec(), proto
+        if proto == JSON_SUBPROTOCOL:
+            return FrameCodec(), proto
+    return FrameCodec(), None
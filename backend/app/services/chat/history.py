@@ -0,0 +1,103 @@
+"""会話メッセージ履歴の keyset ページング
+
+並び順は (created_at, id)。カーソルはページ端のメッセージの (created_at, id) を
+URL セーフな base64 にしたもので、クライアントからは不透明な文字列として扱う。
+ORM オブジェクトを生成しないよう、応答に必要な列だけを取得する。
+compaction が作る要約メッセージ（role=system, metadata.kind=summary）はコンテキスト組み立て用の
+内部データなので一覧には含めない。
+"""
+import base64
+import binascii
+import uuid
+from datetime import datetime
+from typing import Any, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, or_, select, tuple_
+
+from app.models.phase2_models import Message
+
+SUMMARY_KIND = "summary"
+MESSAGE_KIND = Message.meta["kind"].astext
+NOT_SUMMARY = or_(Message.role != "system", MESSAGE_KIND.is_distinct_from(SUMMARY_KIND))
+
+# MessageOut のフィールドに対応する列
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.conversation_id,
+    Message.role,
+    Message.content,
+    Message.content_type,
+    Message.parent_message_id,
+    Message.token_count,
+    Message.created_at,
+)
+
+
+class Cursor(NamedTuple):
+    created_at: datetime
+    id: uuid.UUID
+
+
+def encode_cursor(created_at: datetime, message_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """不正なカーソルは ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        ts, _, mid = raw.partition("|")
+        return Cursor(datetime.fromisoformat(ts), uuid.UUID(mid))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+
+
+def cursor_of(row: Any) -> str:
+    return encode_cursor(row.created_at, row.id)
+
+
+def message_page_query(
+    conversation_id: uuid.UUID,
+    *,
+    before: Optional[Cursor] = None,
+    after: Optional[Cursor] = None,
+    limit: Optional[int] = None,
+) -> Select:
+    """after より後・before より前のメッセージを取得するクエリ
+
+    before のみ指定時は「before 直前の limit 件」を取るため降順で取得する
+    （呼び出し側で昇順に戻す。is_descending 参照）。
+    """
+    key = tuple_(Message.created_at, Message.id)
+    q = select(*MESSAGE_COLUMNS).where(Message.conversation_id == conversation_id, NOT_SUMMARY)
+    if after is not None:
+        q = q.where(key > tuple(after))
+    if before is not None:
+        q = q.where(key < tuple(before))
+    if is_descending(before, after):
+        q = q.order_by(Message.created_at.desc(), Message.id.desc())
+    else:
+        q = q.order_by(Message.created_at.asc(), Message.id.asc())
+    if limit is not None:
+        q = q.limit(limit)
+    return q
+
+
+def is_descending(before: Optional[Cursor], after: Optional[Cursor]) -> bool:
+    return before is not None and after is None
+
+
+def page_cursors(
+    rows: Sequence[Any], limit: Optional[int], before: Optional[Cursor], after: Optional[Cursor]
+) -> Tuple[Optional[str], Optional[str]]:
+    """(前ページのカーソル, 次ページのカーソル) を返す。rows は昇順に並べ替え済みであること
+
+    取得方向はページが満杯のときだけ続きがあるとみなし、反対方向はカーソル指定があれば続きがある。
+    """
+    if not rows:
+        return None, None
+    full = limit is not None and len(rows) >= limit
+    if is_descending(before, after):
+        return (cursor_of(rows[0]) if full else None), cursor_of(rows[-1])
+    return (cursor_of(rows[0]) if after is not None else None), (cursor_of(rows[-1]) if full else None)
@@ -0,0 +1,219 @@
+"""チャットメッセージを write-behind で永続化するライタ
+
+WebSocket のホットパスからターンごとのコミット往復を外すため、
+メッセージ行を有界キューに積み、ライタタスクが件数/時間トリガで
+複数行 INSERT にまとめてコミットする。
+まとめた INSERT が失敗したらターンごとに入れ直し、書けなかったターンだけを失敗にする。
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, note_conversation_writes
+from app.models.phase2_models import Message
+from app.services.chat.tokens import count_tokens
+from app.services.memory.pipeline import notify_embedding_pipeline
+
+logger = logging.getLogger(__name__)
+
+PERSIST_MODES = ("sync", "batched", "async")
+
+_STOP = object()
+
+
+def build_message_row(conversation_id: uuid.UUID, role: str, content: str, **extra: Any) -> Dict[str, Any]:
+    """INSERT 用の行を組み立てる。
+
+    id と created_at はキュー投入時点でクライアント側採番する。
+    同一バッチ内で now() が揃ってしまい発言順が崩れるのを防ぐため。
+    token_count もここで数える（複数行 INSERT は全行が同じキーを持つ必要がある）。
+    """
+    now = datetime.now(timezone.utc)
+    row: Dict[str, Any] = {
+        "id": uuid.uuid4(),
+        "conversation_id": conversation_id,
+        "role": role,
+        "content": content,
+        "token_count": count_tokens(content),
+        "created_at": now,
+        "updated_at": now,
+    }
+    row.update(extra)
+    return row
+
+
+class MessageWriter:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        *,
+        mode: str = "batched",
+        batch_size: int = 64,
+        flush_interval: float = 0.02,
+        max_queue: int = 10000,
+        on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        if mode not in PERSIST_MODES:
+            raise ValueError(f"unknown persist mode: {mode!r} (expected one of {PERSIST_MODES})")
+        self.session_factory = session_factory
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue))
+        # コミット済みの行を受け取るフック（埋め込みパイプラインへの通知など）
+        self.on_written = on_written
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "enqueued_rows": 0,
+            "written_rows": 0,
+            "commits": 0,
+            "failed_rows": 0,
+        }
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        """ライタタスクを起動する（起動済みなら何もしない）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """キューを最後まで書き出してからライタタスクを止める"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    # ---- public API ----
+    async def persist(self, rows: Sequence[Dict[str, Any]]) -> Optional[asyncio.Future]:
+        """mode に従って rows を永続化する。
+
+        - sync:    その場で INSERT + コミットし、完了済み Future を返す
+        - batched: キューに積み、コミット完了で解決される Future を返す
+        - async:   キューに積むだけで None を返す（失敗はログのみ）
+        キューが満杯の場合は空くまで待つ（バックプレッシャ）。
+        """
+        rows = list(rows)
+        if self.mode == "sync":
+            await self._write(rows)
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(None)
+            return fut
+
+        self.start()
+        fut = asyncio.get_running_loop().create_future() if self.mode == "batched" else None
+        await self._queue.put((rows, fut))
+        self.stats["enqueued_rows"] += len(rows)
+        return fut
+
+    async def wait_durable(self, *acks: Optional[asyncio.Future]) -> None:
+        """persist() の戻り値を受け取り、コミット完了まで待つ（async モードでは即時復帰）"""
+        pending = [a for a in acks if a is not None]
+        if pending:
+            await asyncio.gather(*pending)
+
+    # ---- internals ----
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        async with self.session_factory() as session:
+            await session.execute(insert(Message).values(rows))
+            await session.commit()
+        # 直後の履歴の読み取りをプライマリに寄せる（チャットはクッキーで read-your-writes できない）
+        note_conversation_writes({row["conversation_id"] for row in rows})
+        self.stats["written_rows"] += len(rows)
+        self.stats["commits"] += 1
+        if self.on_written is not None:
+            try:
+                self.on_written(rows)
+            except Exception:  # コミット済みなので書き込みの失敗にはしない
+                logger.exception("message writer on_written hook failed")
+
+    async def _flush(self, batch: List[Tuple[List[Dict[str, Any]], Optional[asyncio.Future]]]) -> None:
+        rows = [row for turn_rows, _ in batch for row in turn_rows]
+        try:
+            await self._write(rows)
+        except Exception as exc:  # 1 バッチの失敗でライタ全体を止めない
+            if len(batch) == 1:
+                self._fail(batch[0][1], len(rows), exc)
+                return
+
+            # 別ソケットのターンが混ざっている（途中で削除された会話など）: ターンごとに入れ直して失敗分だけ返す
+            logger.warning("message write-behind batch failed (%d rows), retrying per turn", len(rows))
+            for turn_rows, fut in batch:
+                try:
+                    await self._write(turn_rows)
+                except Exception as turn_exc:
+                    self._fail(fut, len(turn_rows), turn_exc)
+                    continue
+                self._resolve(fut)
+            return
+        for _, fut in batch:
+            self._resolve(fut)
+
+    def _fail(self, fut: Optional[asyncio.Future], n_rows: int, exc: BaseException) -> None:
+        self.stats["failed_rows"] += n_rows
+        logger.error("message write-behind flush failed (%d rows)", n_rows, exc_info=exc)
+        if fut is not None and not fut.done():
+            fut.set_exception(exc)
+
+    @staticmethod
+    def _resolve(fut: Optional[asyncio.Future]) -> None:
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            n_rows = len(item[0])
+            deadline = loop.time() + self.flush_interval
+            # 件数トリガ or 時間トリガのどちらか早い方で書き出す
+            while n_rows < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+            await self._flush(batch)
+
+
+_writer: Optional[MessageWriter] = None
+
+
+def get_message_writer() -> MessageWriter:
+    """FastAPI の Depends 用: プロセス共有のライタを返す"""
+    global _writer
+    if _writer is None:
+        _writer = MessageWriter(
+            AsyncSessionLocal,
+            mode=settings.CHAT_PERSIST_MODE,
+            batch_size=settings.CHAT_PERSIST_BATCH_SIZE,
+            flush_interval=settings.CHAT_PERSIST_FLUSH_MS / 1000.0,
+            max_queue=settings.CHAT_PERSIST_QUEUE_SIZE,
+            # コミットした行はすぐ埋め込む（掃き出しを待たない）
+            on_written=lambda rows: notify_embedding_pipeline(row["id"] for row in rows),
+        )
+    return _writer
+
+
+async def shutdown_message_writer() -> None:
+    """アプリ終了時にキューを書き出す"""
+    if _writer is not None:
+        await _writer.stop()
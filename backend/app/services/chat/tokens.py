@@ -0,0 +1,74 @@
+"""トークン数の見積もりとモデルごとのコンテキスト上限
+
+プロバイダのトークナイザを呼ばずに済むよう、文字種ごとの経験則で近似する
+（英数字は約 4 文字で 1 トークン、かな漢字は 1 文字 1 トークン、記号は 1 文字 1 トークン）。
+実トークナイザより多めに出るように丸めているので、予算内に収めれば上限は超えない。
+"""
+import re
+from typing import Callable, Dict, Tuple
+
+from app.core.config import settings
+
+_RUNS = re.compile(r"[A-Za-z0-9_]+|\s+|[^\x00-\x7f]|[^\sA-Za-z0-9_]")
+
+# メッセージごとの区切り（role など）に掛かる分
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# (モデル名の接頭辞, コンテキスト長)。長い接頭辞から順に照合する
+MODEL_CONTEXT_WINDOWS: Tuple[Tuple[str, int], ...] = (
+    ("gemini-1.5-pro", 1_000_000),
+    ("gemini-1.5-flash", 1_000_000),
+    ("gemini-pro", 30_720),
+    ("gpt-4o", 128_000),
+    ("gpt-4", 8_192),
+    ("gpt-3.5", 16_385),
+    ("claude", 200_000),
+    ("mock", 8_192),
+)
+
+Tokenizer = Callable[[str], int]
+
+
+def approx_token_count(text: str) -> int:
+    n = 0
+    for run in _RUNS.findall(text):
+        c = run[0]
+        if c.isspace():
+            continue
+        if c.isascii() and (c.isalnum() or c == "_"):
+            n += (len(run) + 3) // 4
+        else:
+            n += 1
+    return n
+
+
+_TOKENIZERS: Dict[str, Tokenizer] = {}
+
+
+def register_tokenizer(model_prefix: str, tokenizer: Tokenizer) -> None:
+    """実トークナイザを使いたいモデルに登録する（未登録なら近似）"""
+    _TOKENIZERS[model_prefix] = tokenizer
+
+
+def get_tokenizer(model: str = "") -> Tokenizer:
+    for prefix, tokenizer in sorted(_TOKENIZERS.items(), key=lambda kv: -len(kv[0])):
+        if (model or "").startswith(prefix):
+            return tokenizer
+    return approx_token_count
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    return get_tokenizer(model)(text)
+
+
+def context_window(model: str) -> int:
+    for prefix, window in sorted(MODEL_CONTEXT_WINDOWS, key=lambda kv: -len(kv[0])):
+        if (model or "").startswith(prefix):
+            return window
+    return settings.CHAT_CONTEXT_DEFAULT_TOKENS
+
+
+def prompt_budget(model: str) -> int:
+    """プロンプトに使えるトークン数（応答用の予約と設定上限を差し引く）"""
+    window = min(context_window(model), settings.CHAT_CONTEXT_MAX_TOKENS)
+    return max(0, window - settings.CHAT_CONTEXT_REPLY_RESERVE)
@@ -0,0 +1,4 @@
+# Local embedding functions
+from app.services.embeddings.embedder import Embedder, HashingEmbedder, get_embedder, register_embedder
+
+__all__ = ["Embedder", "HashingEmbedder", "get_embedder", "register_embedder"]
@@ -0,0 +1,119 @@
+"""ローカルで完結する埋め込み関数
+
+既定はハッシュトリックによる TF-IDF ベクトル（外部 API・モデルファイル不要）。
+英数字は（簡易ステミングした）単語と単語 bigram、かな漢字などは文字 bigram を特徴量にする。
+別の実装は register_embedder で登録し、EMBEDDING_BACKEND で切り替える。
+"""
+import math
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+_WORD = re.compile(r"[a-z0-9_]+|[^\W\da-z_]+", re.IGNORECASE)
+_ASCII = re.compile(r"[a-z0-9_]+", re.IGNORECASE)
+
+
+class Embedder(ABC):
+    """テキスト列を L2 正規化済みの float32 行列 (len(texts), dim) に変換する"""
+
+    dim: int
+    # True なら fit の結果で埋め込みが変わる（コーパスが変わったら全件を埋め込み直す）
+    corpus_dependent: bool = False
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+    def fit(self, corpus: Sequence[str]) -> "Embedder":
+        """コーパスから重み（IDF など）を学習する。不要な実装はそのまま返す"""
+        return self
+
+
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def _stem(word: str) -> str:
+    # 英語の語尾だけを落とす簡易ステミング（tests / testing → test）
+    for suf in _SUFFIXES:
+        if word.endswith(suf) and len(word) - len(suf) >= 3 and not word.endswith("ss"):
+            return word[: -len(suf)]
+    return word
+
+
+def features(text: str) -> List[str]:
+    feats: List[str] = []
+    words: List[str] = []
+    for run in _WORD.findall(text.lower()):
+        if _ASCII.fullmatch(run):
+            word = _stem(run)
+            words.append(word)
+            feats.append(word)
+        elif len(run) == 1:
+            feats.append(run)
+        else:
+            feats.extend(run[i:i + 2] for i in range(len(run) - 1))
+    feats.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return feats
+
+
+def _bucket(feature: str, dim: int) -> "tuple[int, float]":
+    h = zlib.crc32(feature.encode("utf-8"))
+    # 上位ビットで符号を決め、衝突による偏りを打ち消す
+    return h % dim, (1.0 if h & 0x80000000 else -1.0)
+
+
+class HashingEmbedder(Embedder):
+    corpus_dependent = True
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self._idf: Optional[np.ndarray] = None
+
+    def _tf(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            acc: Dict[int, float] = {}
+            for feat in features(text):
+                idx, sign = _bucket(feat, self.dim)
+                acc[idx] = acc.get(idx, 0.0) + sign
+            for idx, v in acc.items():
+                if v:
+                    # 出現回数は対数で抑える（sublinear tf）
+                    out[row, idx] = math.copysign(1.0 + math.log(abs(v)), v)
+        return out
+
+    def fit(self, corpus: Sequence[str]) -> "HashingEmbedder":
+        if not corpus:
+            self._idf = None
+            return self
+        df = np.count_nonzero(self._tf(corpus), axis=0).astype(np.float32)
+        self._idf = np.log((1.0 + len(corpus)) / (1.0 + df)) + 1.0
+        return self
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vecs = self._tf(texts)
+        if self._idf is not None:
+            vecs *= self._idf
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        np.divide(vecs, norms, out=vecs, where=norms > 0)
+        return vecs
+
+
+_REGISTRY: Dict[str, Callable[[int], Embedder]] = {"hashing": HashingEmbedder}
+
+
+def register_embedder(name: str, factory: Callable[[int], Embedder]) -> None:
+    _REGISTRY[name] = factory
+
+
+def get_embedder(name: Optional[str] = None, dim: Optional[int] = None) -> Embedder:
+    """新しいインスタンスを返す（fit の状態を共有しないため）"""
+    name = name or settings.EMBEDDING_BACKEND
+    if name not in _REGISTRY:
+        raise ValueError(f"unknown embedding backend: {name!r}")
+    return _REGISTRY[name](dim or settings.EMBEDDING_DIM)
@@ -0,0 +1,39 @@
+"""LLM プロバイダの共通インターフェース"""
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Sequence
+
+# {"role": "system"|"user"|"assistant", "content": "..."}
+ChatMessage = Dict[str, str]
+
+
+class LLMError(Exception):
+    """プロバイダ呼び出しの失敗（HTTP エラー・不正な応答など）"""
+
+
+class LLMProvider(ABC):
+    name: str = "base"
+
+    @abstractmethod
+    def stream(self, model: str, messages: Sequence[ChatMessage], **params: Any) -> AsyncIterator[str]:
+        """応答をトークン（テキスト断片）単位で返す非同期イテレータ。
+
+        呼び出し側が途中で aclose() した場合、実装は上流リクエストと
+        同時実行枠を解放しなければならない。
+        """
+
+    async def complete(self, model: str, messages: Sequence[ChatMessage], **params: Any) -> str:
+        """非ストリーミング呼び出し（既定実装は stream を連結する）"""
+        parts: List[str] = []
+        async for token in self.stream(model, messages, **params):
+            parts.append(token)
+        return "".join(parts)
+
+    async def aclose(self) -> None:
+        """プールしている接続などを解放する"""
+
+
+def last_user_text(messages: Sequence[ChatMessage]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
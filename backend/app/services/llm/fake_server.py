@@ -0,0 +1,78 @@
+"""ローカル検証用の OpenAI 互換フェイク LLM サーバ
+
+テストでは httpx.ASGITransport 経由でプロセス内から叩き、
+手元では `uvicorn app.services.llm.fake_server:app --port 9001` で起動して
+LLM_API_BASE_URL=http://localhost:9001 を指定すれば実 API の代わりに使える。
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _reply_tokens(body: Dict[str, Any]) -> list:
+    text = ""
+    for message in reversed(body.get("messages") or []):
+        if message.get("role") == "user":
+            text = message.get("content") or ""
+            break
+    return [w + " " for w in f"echo: {text}".split(" ")]
+
+
+def create_fake_llm_app(token_delay: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake LLM Provider")
+    app.state.token_delay = token_delay
+    app.state.active = 0
+    app.state.max_active = 0
+    app.state.requests = 0
+    app.state.fail_next = 0
+
+    def _enter() -> None:
+        app.state.requests += 1
+        app.state.active += 1
+        app.state.max_active = max(app.state.max_active, app.state.active)
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if app.state.fail_next > 0:
+            app.state.fail_next -= 1
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+
+        model = body.get("model", "fake")
+        tokens = _reply_tokens(body)
+        _enter()
+
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(app.state.token_delay * len(tokens))
+            finally:
+                app.state.active -= 1
+            return {
+                "id": "fake-1",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            }
+
+        async def events():
+            try:
+                for token in tokens:
+                    if app.state.token_delay:
+                        await asyncio.sleep(app.state.token_delay)
+                    chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": token}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                app.state.active -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+app = create_fake_llm_app()
@@ -0,0 +1,299 @@
+"""モデルごとの実測ヘルス（TTFT・tokens/sec・エラー率・コスト）とサーキットブレーカー
+
+チャットのストリーミング経路（observe_stream）で 1 応答ごとに観測を記録し、直近
+LLM_HEALTH_WINDOW_SECONDS / LLM_HEALTH_WINDOW_SIZE 件の窓で集計する。集計は記録があった
+モデルだけ次に参照されたときに作り直すので、ルーティングのたびに並べ替えは走らない。
+
+ブレーカーは closed → open（連続失敗、または窓内のエラー率超過）→ クールダウン後 half_open
+（試行 1 件だけ通す）→ 成功で closed / 失敗で再び open と遷移する。状態が変わると
+リスナー（ルーティングキャッシュの破棄など）を呼ぶ。
+
+モデルのカタログ（1k トークンあたりのコストと得意分野のタグ）は LLM_MODEL_CATALOG（JSON）で
+差し替えられる。未設定なら DEFAULT_CATALOG を使う。
+"""
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    name: str
+    # USD / 1k トークン（入出力込みの概算。契約に合わせて LLM_MODEL_CATALOG で上書きする）
+    cost_per_1k: float
+    tags: FrozenSet[str] = frozenset()
+
+
+DEFAULT_CATALOG: Tuple[ModelProfile, ...] = (
+    ModelProfile("gemini-pro", 0.0005, frozenset({"general", "japanese", "writing", "summarize"})),
+    ModelProfile("gemini-1.5-flash", 0.00035, frozenset({"general", "fast", "summarize", "translate", "search"})),
+    ModelProfile("gemini-1.5-pro", 0.0035, frozenset({"reasoning", "code", "long_context", "japanese", "writing"})),
+)
+
+
+def load_catalog(raw: str = "") -> Tuple[ModelProfile, ...]:
+    """[{"name": ..., "cost_per_1k": ..., "tags": [...]}, ...] を読む。空なら既定"""
+    if not raw.strip():
+        return DEFAULT_CATALOG
+    return tuple(
+        ModelProfile(item["name"], float(item.get("cost_per_1k", 0.0)), frozenset(item.get("tags", ())))
+        for item in json.loads(raw)
+    )
+
+
+@dataclass(frozen=True)
+class Observation:
+    at: float
+    ok: bool
+    ttft_ms: Optional[float] = None
+    tokens_per_sec: Optional[float] = None
+    cost: float = 0.0
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    requests: int
+    errors: int
+    error_rate: float
+    ttft_p50_ms: Optional[float]
+    ttft_p95_ms: Optional[float]
+    tokens_per_sec: Optional[float]
+    avg_cost: Optional[float]
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class _ModelState:
+    __slots__ = ("window", "snapshot", "state", "opened_at", "consecutive_failures", "probing", "trips")
+
+    def __init__(self, size: int):
+        self.window: Deque[Observation] = deque(maxlen=size)
+        self.snapshot: Optional[ModelSnapshot] = None
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        # half_open で試行を通した時刻（結果が返らないまま cooldown を過ぎたら次を通す）
+        self.probing: Optional[float] = None
+        self.trips = 0
+
+
+class ModelHealth:
+    def __init__(
+        self,
+        catalog: Sequence[ModelProfile] = DEFAULT_CATALOG,
+        *,
+        window_seconds: float = 300.0,
+        window_size: int = 200,
+        error_rate_threshold: float = 0.5,
+        min_requests: int = 10,
+        consecutive_failures: int = 5,
+        cooldown_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.catalog: Dict[str, ModelProfile] = {p.name: p for p in catalog}
+        self.window_seconds = window_seconds
+        self.window_size = window_size
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.consecutive_failures = consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._models: Dict[str, _ModelState] = {}
+        self._listeners: List[Callable[[str, str], None]] = []
+
+    def add_listener(self, callback: Callable[[str, str], None]) -> None:
+        """ブレーカーの状態が変わったら callback(model, state) を呼ぶ"""
+        self._listeners.append(callback)
+
+    def _model(self, model: str) -> _ModelState:
+        m = self._models.get(model)
+        if m is None:
+            m = self._models[model] = _ModelState(self.window_size)
+        return m
+
+    def _set_state(self, model: str, m: _ModelState, state: str) -> None:
+        if m.state == state:
+            return
+        m.state = state
+        m.probing = None
+        if state == OPEN:
+            m.opened_at = self._clock()
+            m.trips += 1
+            logger.warning("circuit for model %s opened", model)
+        for callback in self._listeners:
+            try:
+                callback(model, state)
+            except Exception:
+                logger.exception("model health listener failed")
+
+    def cost(self, model: str, tokens: int) -> float:
+        profile = self.catalog.get(model)
+        return profile.cost_per_1k * tokens / 1000.0 if profile else 0.0
+
+    # ---- 記録 ----
+    def record(
+        self,
+        model: str,
+        *,
+        ok: bool,
+        ttft_ms: Optional[float] = None,
+        tokens_per_sec: Optional[float] = None,
+        tokens: int = 0,
+    ) -> None:
+        m = self._model(model)
+        m.window.append(Observation(self._clock(), ok, ttft_ms, tokens_per_sec, self.cost(model, tokens)))
+        m.snapshot = None
+        if ok:
+            m.consecutive_failures = 0
+            if m.state != CLOSED:
+                self._set_state(model, m, CLOSED)
+            return
+        m.consecutive_failures += 1
+        if m.state == HALF_OPEN:
+            self._set_state(model, m, OPEN)
+            return
+        if m.state == CLOSED:
+            snap = self.snapshot(model)
+            if m.consecutive_failures >= self.consecutive_failures or (
+                snap.requests >= self.min_requests and snap.error_rate >= self.error_rate_threshold
+            ):
+                self._set_state(model, m, OPEN)
+
+    # ---- 参照 ----
+    def _prune(self, m: _ModelState) -> None:
+        horizon = self._clock() - self.window_seconds
+        while m.window and m.window[0].at < horizon:
+            m.window.popleft()
+            m.snapshot = None
+
+    def snapshot(self, model: str) -> ModelSnapshot:
+        m = self._model(model)
+        self._prune(m)
+        if m.snapshot is not None:
+            return m.snapshot
+        window = m.window
+        errors = sum(1 for o in window if not o.ok)
+        ttfts = sorted(o.ttft_ms for o in window if o.ttft_ms is not None)
+        rates = [o.tokens_per_sec for o in window if o.tokens_per_sec is not None]
+        costs = [o.cost for o in window if o.ok]
+        m.snapshot = ModelSnapshot(
+            requests=len(window),
+            errors=errors,
+            error_rate=errors / len(window) if window else 0.0,
+            ttft_p50_ms=_percentile(ttfts, 0.5),
+            ttft_p95_ms=_percentile(ttfts, 0.95),
+            tokens_per_sec=sum(rates) / len(rates) if rates else None,
+            avg_cost=sum(costs) / len(costs) if costs else None,
+        )
+        return m.snapshot
+
+    def state(self, model: str) -> str:
+        m = self._models.get(model)
+        if m is None:
+            return CLOSED
+        if m.state == OPEN and self._clock() - m.opened_at >= self.cooldown_seconds:
+            return HALF_OPEN
+        return m.state
+
+    def available(self, model: str) -> bool:
+        """ルーティング用の判定（half_open の試行枠は消費しない）"""
+        return self.state(model) != OPEN
+
+    def allow(self, model: str) -> bool:
+        """実際に呼び出す直前の判定。half_open では 1 件だけ通す"""
+        state = self.state(model)
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        m = self._model(model)
+        if m.state == OPEN:
+            self._set_state(model, m, HALF_OPEN)
+        now = self._clock()
+        if m.probing is not None and now - m.probing < self.cooldown_seconds:
+            return False
+        m.probing = now
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for model in sorted(set(self.catalog) | set(self._models)):
+            snap = self.snapshot(model)
+            m = self._models[model]
+            profile = self.catalog.get(model)
+            out[model] = {
+                "state": self.state(model),
+                "trips": m.trips,
+                "requests": snap.requests,
+                "errors": snap.errors,
+                "error_rate": round(snap.error_rate, 4),
+                "ttft_p50_ms": snap.ttft_p50_ms,
+                "ttft_p95_ms": snap.ttft_p95_ms,
+                "tokens_per_sec": round(snap.tokens_per_sec, 2) if snap.tokens_per_sec is not None else None,
+                "avg_cost": snap.avg_cost,
+                "cost_per_1k": profile.cost_per_1k if profile else None,
+                "tags": sorted(profile.tags) if profile else [],
+            }
+        return out
+
+
+async def observe_stream(
+    health: ModelHealth, model: str, chunks: AsyncIterator[str], *, prompt_tokens: int = 0
+) -> AsyncIterator[str]:
+    """プロバイダのストリームを包み、TTFT・tokens/sec・成否・コストを記録する
+
+    クライアント切断などで途中で閉じられた場合は、モデルの良し悪しと無関係なので記録しない。
+    """
+    started = time.perf_counter()
+    first: Optional[float] = None
+    n = 0
+    try:
+        async for chunk in chunks:
+            if first is None:
+                first = time.perf_counter()
+            n += 1
+            yield chunk
+    except Exception:
+        ttft = (first - started) * 1000 if first is not None else None
+        health.record(model, ok=False, ttft_ms=ttft)
+        raise
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    ended = time.perf_counter()
+    ttft_ms = ((first or ended) - started) * 1000
+    elapsed = ended - first if first is not None else 0.0
+    health.record(
+        model,
+        ok=True,
+        ttft_ms=round(ttft_ms, 3),
+        tokens_per_sec=n / elapsed if elapsed > 0 else None,
+        tokens=prompt_tokens + n,
+    )
+
+
+model_health = ModelHealth(
+    load_catalog(settings.LLM_MODEL_CATALOG),
+    window_seconds=settings.LLM_HEALTH_WINDOW_SECONDS,
+    window_size=settings.LLM_HEALTH_WINDOW_SIZE,
+    error_rate_threshold=settings.LLM_BREAKER_ERROR_RATE,
+    min_requests=settings.LLM_BREAKER_MIN_REQUESTS,
+    consecutive_failures=settings.LLM_BREAKER_CONSECUTIVE_FAILURES,
+    cooldown_seconds=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+)
@@ -0,0 +1,87 @@
+"""OpenAI 互換 Chat Completions API を話す HTTP プロバイダ
+
+Gemini も OpenAI 互換エンドポイントを提供しているため、
+LLM_API_BASE_URL を切り替えるだけで同じ実装を使える。
+1 プロバイダにつき 1 つの httpx.AsyncClient を共有し、接続をプールする。
+"""
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+import httpx
+
+from app.services.llm.base import ChatMessage, LLMError, LLMProvider
+from app.services.llm.limits import AdmissionControl
+
+
+class HTTPLLMProvider(LLMProvider):
+    name = "http"
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        api_key: str = "",
+        max_connections: int = 100,
+        max_concurrency_per_model: int = 32,
+        rate_per_sec: float = 0.0,
+        burst: float = 1.0,
+        timeout: float = 60.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = client or httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self.admission = AdmissionControl(max_concurrency_per_model, rate_per_sec, burst)
+
+    def _body(self, model: str, messages: Sequence[ChatMessage], stream: bool, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"model": model, "messages": list(messages), "stream": stream, **params}
+
+    async def stream(self, model: str, messages: Sequence[ChatMessage], **params: Any) -> AsyncIterator[str]:
+        async with self.admission.admit(model):
+            try:
+                # aclose() されると async with を抜けて上流の HTTP ストリームも閉じる
+                async with self.client.stream(
+                    "POST", "/chat/completions", json=self._body(model, messages, True, params)
+                ) as resp:
+                    if resp.status_code >= 400:
+                        await resp.aread()
+                        raise LLMError(f"{model}: HTTP {resp.status_code} {resp.text[:200]}")
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        try:
+                            delta = json.loads(data)["choices"][0].get("delta") or {}
+                        except (ValueError, KeyError, IndexError) as e:
+                            raise LLMError(f"{model}: malformed stream chunk: {data[:200]}") from e
+                        content = delta.get("content")
+                        if content:
+                            yield content
+            except httpx.HTTPError as e:
+                # 接続失敗・タイムアウト（接続 / 読み取り / プール待ち）も呼び出し側には LLMError で返す
+                raise LLMError(f"{model}: {e!r}") from e
+
+    async def complete(self, model: str, messages: Sequence[ChatMessage], **params: Any) -> str:
+        async with self.admission.admit(model):
+            try:
+                resp = await self.client.post("/chat/completions", json=self._body(model, messages, False, params))
+            except httpx.HTTPError as e:
+                raise LLMError(f"{model}: {e!r}") from e
+        if resp.status_code >= 400:
+            raise LLMError(f"{model}: HTTP {resp.status_code} {resp.text[:200]}")
+        try:
+            return resp.json()["choices"][0]["message"]["content"] or ""
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"{model}: malformed response") from e
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,69 @@
+"""プロバイダ呼び出しのアドミッション制御（モデル別の同時実行数とレート制限）"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+
+class TokenBucket:
+    """トークンバケット方式のレートリミッタ（rate <= 0 なら無制限）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        # 待機者を直列化して、起床時の取り合いで順序が崩れないようにする
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class AdmissionControl:
+    """モデルごとのセマフォとトークンバケットをまとめて管理する"""
+
+    def __init__(self, max_concurrency: int, rate: float, burst: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = rate
+        self.burst = burst
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def semaphore(self, model: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(model)
+        if sem is None:
+            sem = self._semaphores[model] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    def bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = self._buckets[model] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    @asynccontextmanager
+    async def admit(self, model: str) -> AsyncIterator[None]:
+        """同時実行枠を確保し、レート制限を通過してから本体を実行する"""
+        async with self.semaphore(model):
+            await self.bucket(model).acquire()
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            try:
+                yield
+            finally:
+                self._in_flight[model] -= 1
+
+    def in_flight(self, model: str) -> int:
+        return self._in_flight.get(model, 0)
@@ -1,7 +1,194 @@
-from typing import AsyncIterator
+"""レイテンシを再現するモック LLM
 
-async def stream_mock_reply(user_text: str) -> AsyncIterator[str]:
-    # すぐ使えるモック: "You said: {text}" をトークン分割で返す
-    reply = f"You said: {user_text}"
-    for chunk in reply.split(" "):
-        yield chunk + " "
+AIAssistant.default_llm_model に "mock:<profile>" を指定するとアシスタント単位で選択できる。
+クエリ形式でプロファイルの値を上書きできる（例: "mock:slow-tail?seed=42&ttft_ms=50"）。
+
+- ttft_ms:            最初のトークンまでの待ち時間
+- inter_token:        トークン間隔の分布（fixed / uniform / exponential / lognormal / pareto）
+- inter_token_ms:     トークン間隔の平均
+- inter_token_spread: 分布の広がり（uniform: ±幅 ms, lognormal: sigma, pareto: alpha）
+- reply_tokens:       応答トークン数（None なら "You said: ..." のエコーのみ）
+- error_rate:         途中でエラーを発生させる確率
+- timeout_rate:       途中で timeout_ms 停止した後にタイムアウトさせる確率
+- seed:               指定すると同じプロンプトに対して毎回同じ応答・同じ待ち時間になる
+"""
+import asyncio
+import math
+import random
+import zlib
+from dataclasses import dataclass, field, fields, replace
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Optional, Sequence, Union
+from urllib.parse import parse_qsl
+
+from app.core.config import settings
+from app.services.llm.base import ChatMessage, LLMError, LLMProvider, last_user_text
+
+_FILLER = (
+    "the", "schedule", "meeting", "is", "confirmed", "and", "I", "will", "prepare", "the",
+    "agenda", "for", "you", "tomorrow", "morning", "please", "let", "me", "know", "if",
+    "anything", "changes", "in", "the", "plan", "so", "that", "we", "can", "adjust",
+)
+
+
+class MockLLMError(LLMError):
+    """エラー注入による失敗"""
+
+
+class MockLLMTimeout(LLMError):
+    """タイムアウト注入による失敗"""
+
+
+@dataclass(frozen=True)
+class MockProfile:
+    ttft_ms: float = 0.0
+    inter_token: str = "fixed"
+    inter_token_ms: float = 0.0
+    inter_token_spread: float = 0.0
+    reply_tokens: Optional[int] = None
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_ms: float = 30000.0
+    seed: Optional[int] = None
+
+
+PROFILES = {
+    # 従来どおり待ち時間なしでエコーを返す
+    "instant": MockProfile(),
+    "fast": MockProfile(ttft_ms=80, inter_token="uniform", inter_token_ms=8, inter_token_spread=4, reply_tokens=60),
+    "realistic": MockProfile(ttft_ms=300, inter_token="lognormal", inter_token_ms=25, inter_token_spread=0.5, reply_tokens=200),
+    # 大半は速いが、ときどき極端に遅いトークンが混ざる
+    "slow-tail": MockProfile(ttft_ms=400, inter_token="pareto", inter_token_ms=30, inter_token_spread=1.5, reply_tokens=120),
+    "flaky": MockProfile(ttft_ms=100, inter_token_ms=10, reply_tokens=40, error_rate=0.1, timeout_rate=0.05, timeout_ms=2000),
+}
+
+
+@dataclass
+class MockPlan:
+    """1 回の応答で返すトークンと待ち時間（秒）の計画"""
+    tokens: List[str]
+    ttft: float
+    delays: List[float] = field(default_factory=list)
+    # 何トークン送った後に失敗させるか（None なら最後まで成功）
+    fail_after: Optional[int] = None
+    failure: Optional[str] = None  # "error" | "timeout"
+    timeout: float = 0.0
+
+
+_FIELD_NAMES = frozenset(f.name for f in fields(MockProfile))
+# _sample_delay が扱うトークン間隔の分布
+INTER_TOKEN_KINDS = ("fixed", "uniform", "exponential", "lognormal", "pareto")
+
+
+def _coerce(name: str, raw: str) -> Any:
+    if name == "inter_token":
+        if raw not in INTER_TOKEN_KINDS:
+            raise ValueError(f"unknown mock inter_token: {raw!r} (expected one of {INTER_TOKEN_KINDS})")
+        return raw
+    if name in ("reply_tokens", "seed"):
+        return None if raw.lower() in ("", "none") else int(raw)
+    return float(raw)
+
+
+@lru_cache(maxsize=256)
+def parse_mock_model(model: Optional[str]) -> MockProfile:
+    """"mock:<profile>?key=value" 形式のモデル名をプロファイルに変換する"""
+    name, _, query = (model or "").partition("?")
+    _, _, profile_name = name.partition(":")
+    profile_name = profile_name or settings.MOCK_LLM_DEFAULT_PROFILE
+    if profile_name not in PROFILES:
+        raise ValueError(f"unknown mock profile: {profile_name!r}")
+    profile = PROFILES[profile_name]
+    overrides = {}
+    for key, raw in parse_qsl(query):
+        if key not in _FIELD_NAMES:
+            raise ValueError(f"unknown mock option: {key!r}")
+        overrides[key] = _coerce(key, raw)
+    return replace(profile, **overrides) if overrides else profile
+
+
+def _sample_delay(rng: random.Random, profile: MockProfile) -> float:
+    mean = profile.inter_token_ms
+    if mean <= 0:
+        return 0.0
+    kind = profile.inter_token
+    if kind == "uniform":
+        ms = rng.uniform(mean - profile.inter_token_spread, mean + profile.inter_token_spread)
+    elif kind == "exponential":
+        ms = rng.expovariate(1.0 / mean)
+    elif kind == "lognormal":
+        sigma = profile.inter_token_spread or 0.5
+        ms = rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+    elif kind == "pareto":
+        alpha = max(profile.inter_token_spread, 1.01)
+        ms = rng.paretovariate(alpha) * mean * (alpha - 1) / alpha
+    else:
+        ms = mean
+    return max(0.0, ms) / 1000.0
+
+
+def plan_reply(user_text: str, profile: MockProfile) -> MockPlan:
+    """応答計画を作る。seed 指定時は (seed, user_text) が同じなら結果も同じ"""
+    if profile.seed is None:
+        rng = random.Random()
+    else:
+        rng = random.Random((profile.seed << 32) ^ zlib.crc32(user_text.encode("utf-8")))
+
+    tokens = [chunk + " " for chunk in f"You said: {user_text}".split(" ")]
+    if profile.reply_tokens is not None:
+        tokens = tokens[: profile.reply_tokens]
+        while len(tokens) < profile.reply_tokens:
+            tokens.append(rng.choice(_FILLER) + " ")
+
+    plan = MockPlan(
+        tokens=tokens,
+        ttft=max(0.0, profile.ttft_ms) / 1000.0,
+        delays=[_sample_delay(rng, profile) for _ in range(max(0, len(tokens) - 1))],
+    )
+    roll = rng.random()
+    if roll < profile.error_rate:
+        plan.failure = "error"
+    elif roll < profile.error_rate + profile.timeout_rate:
+        plan.failure = "timeout"
+        plan.timeout = max(0.0, profile.timeout_ms) / 1000.0
+    if plan.failure:
+        plan.fail_after = rng.randrange(len(tokens) + 1)
+    return plan
+
+
+async def stream_mock_reply(
+    user_text: str, profile: Union[MockProfile, str, None] = None
+) -> AsyncIterator[str]:
+    # 既定（instant）は従来どおり "You said: {text}" を待ち時間なしでトークン分割して返す
+    if not isinstance(profile, MockProfile):
+        profile = PROFILES[profile or "instant"]
+    plan = plan_reply(user_text, profile)
+
+    for i, token in enumerate(plan.tokens):
+        if plan.fail_after == i:
+            break
+        delay = plan.ttft if i == 0 else plan.delays[i - 1]
+        if delay:
+            await asyncio.sleep(delay)
+        yield token
+
+    if plan.failure == "error":
+        raise MockLLMError("mock: injected error")
+    if plan.failure == "timeout":
+        await asyncio.sleep(plan.timeout)
+        raise MockLLMTimeout("mock: injected timeout")
+
+
+class MockLLMProvider(LLMProvider):
+    """stream_mock_reply をプロバイダとして公開する（外部 API 未設定時の既定）"""
+
+    name = "mock"
+
+    async def stream(self, model: str, messages: Sequence[ChatMessage], **params: Any) -> AsyncIterator[str]:
+        try:
+            # "mock" 以外のモデル名（API 未設定時のフォールバック）は既定プロファイル
+            profile = parse_mock_model(model if (model or "").startswith("mock") else None)
+        except ValueError as e:
+            raise LLMError(str(e)) from e
+        async for token in stream_mock_reply(last_user_text(messages), profile):
+            yield token
@@ -0,0 +1,55 @@
+"""モデル名から LLM プロバイダを解決するレジストリ
+
+プロバイダはプロセス内で 1 インスタンスずつ共有し、
+HTTP 接続プールと同時実行枠をリクエスト間で使い回す。
+"""
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.services.llm.base import LLMProvider
+from app.services.llm.http_provider import HTTPLLMProvider
+from app.services.llm.mock_llm import MockLLMProvider
+
+_providers: Dict[str, LLMProvider] = {}
+
+
+def _build(kind: str) -> LLMProvider:
+    if kind == "http":
+        return HTTPLLMProvider(
+            settings.LLM_API_BASE_URL,
+            api_key=settings.LLM_API_KEY,
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_concurrency_per_model=settings.LLM_MAX_CONCURRENCY_PER_MODEL,
+            rate_per_sec=settings.LLM_RATE_LIMIT_RPS,
+            burst=settings.LLM_RATE_LIMIT_BURST,
+            timeout=settings.LLM_HTTP_TIMEOUT_SECONDS,
+        )
+    return MockLLMProvider()
+
+
+def provider_kind(model: Optional[str]) -> str:
+    if not model or model.startswith("mock") or not settings.LLM_API_BASE_URL:
+        return "mock"
+    return "http"
+
+
+def get_provider(model: Optional[str]) -> LLMProvider:
+    """モデル名に対応するプロバイダ（共有インスタンス）を返す"""
+    kind = provider_kind(model)
+    provider = _providers.get(kind)
+    if provider is None:
+        provider = _providers[kind] = _build(kind)
+    return provider
+
+
+def register_provider(kind: str, provider: LLMProvider) -> None:
+    """テストや拡張用にプロバイダを差し替える"""
+    _providers[kind] = provider
+
+
+async def close_providers() -> None:
+    """アプリ終了時にプールしている接続を閉じる"""
+    providers = list(_providers.values())
+    _providers.clear()
+    for provider in providers:
+        await provider.aclose()
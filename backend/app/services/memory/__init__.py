@@ -0,0 +1 @@
+# Long-term memory (message embeddings)
@@ -0,0 +1,181 @@
+"""メッセージ埋め込みのバックグラウンド作成
+
+未埋め込みのメッセージ（user / assistant のテキスト）をバッチで読み、埋め込みを計算して
+message_embeddings に保存する。対象の見つけ方は 2 通り:
+
+- 通知: MessageWriter がコミットした行の id を notify() で受け取り、その行だけを読む
+  （コミット後に届くので、created_at とコミット順の前後に左右されない）
+- 掃き出し: 起動直後と MEMORY_EMBED_SWEEP_SECONDS ごとに、埋め込みの無い行をすべて拾う
+  （REST で書かれた行、別プロセスの行、通知の取りこぼしを拾う）
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.phase2_models import Message, MessageEmbedding
+from app.services.embeddings import Embedder
+from app.services.memory.store import (
+    MAX_CONTENT_CHARS,
+    embedding_model_name,
+    embedding_rows,
+    get_memory_embedder,
+    store_embeddings,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        batch_size: int = 128,
+        poll_interval: float = 1.0,
+        embedder: Optional[Embedder] = None,
+        sweep_interval: float = 60.0,
+    ):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.embedder = embedder or get_memory_embedder()
+        self.model = embedding_model_name(self.embedder)
+        self.sweep_interval = sweep_interval
+        # 通知されたがまだ埋め込んでいないメッセージ
+        self._pending: Set[uuid.UUID] = set()
+        # 掃き出し中か / 最後に掃き出しを終えた時刻（None なら次の run_once で掃き出す）
+        self._sweeping = True
+        self._swept_at: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.embedded = 0
+
+    def notify(self, message_ids: Iterable[uuid.UUID] = ()) -> None:
+        """新しいメッセージがコミットされたことを知らせる（ポーリング待ちを打ち切る）"""
+        self._pending.update(message_ids)
+        self._wakeup.set()
+
+    def _sweep_due(self) -> bool:
+        if self._sweeping or self._swept_at is None:
+            return True
+        return asyncio.get_running_loop().time() - self._swept_at >= self.sweep_interval
+
+    async def run_once(self) -> int:
+        """1 バッチ処理して埋め込んだ件数を返す（通知された行を優先し、無ければ掃き出す）"""
+        q = (
+            select(Message.id, Message.conversation_id, Message.content, Message.created_at)
+            .where(Message.content_type == "text", Message.role.in_(("user", "assistant")))
+            .where(~exists().where(MessageEmbedding.message_id == Message.id))
+        )
+        if self._pending:
+            ids = [self._pending.pop() for _ in range(min(self.batch_size, len(self._pending)))]
+            q = q.where(Message.id.in_(ids))
+        elif self._sweep_due():
+            ids = None
+            self._sweeping = True
+            q = q.limit(self.batch_size)
+        else:
+            return 0
+
+        async with self._session_factory() as db:
+            messages = (await db.execute(q)).all()
+        if ids is None and len(messages) < self.batch_size:
+            # 埋め込みの無い行を拾い切った
+            self._sweeping = False
+            self._swept_at = asyncio.get_running_loop().time()
+        if not messages:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        vectors = await loop.run_in_executor(
+            None, self.embedder.embed, [m.content[:MAX_CONTENT_CHARS] for m in messages]
+        )
+        rows = embedding_rows(messages, vectors, self.model)
+        await self._store(rows)
+        self.embedded += len(rows)
+        return len(rows)
+
+    async def _store(self, rows: List[Any]) -> None:
+        async with self._session_factory() as db:
+            try:
+                await store_embeddings(db, rows)
+                await db.commit()
+                return
+            except IntegrityError:
+                # 読み出し後に削除されたメッセージが混ざっていた: 1 件ずつ入れ直して該当分だけ捨てる
+                await db.rollback()
+            for row in rows:
+                try:
+                    await store_embeddings(db, [row])
+                    await db.commit()
+                except IntegrityError:
+                    await db.rollback()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                n = await self.run_once()
+            except Exception:
+                logger.exception("message embedding batch failed")
+                n = 0
+            if n < self.batch_size and not self._pending:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+_pipeline: Optional[EmbeddingPipeline] = None
+
+
+def get_embedding_pipeline() -> EmbeddingPipeline:
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = EmbeddingPipeline(
+            AsyncSessionLocal,
+            batch_size=settings.MEMORY_EMBED_BATCH_SIZE,
+            poll_interval=settings.MEMORY_EMBED_POLL_SECONDS,
+            sweep_interval=settings.MEMORY_EMBED_SWEEP_SECONDS,
+        )
+    return _pipeline
+
+
+def notify_embedding_pipeline(message_ids: Iterable[uuid.UUID]) -> None:
+    """コミット済みのメッセージを埋め込み待ちに積む（パイプラインが動いていなければ何もしない）"""
+    if _pipeline is not None and _pipeline._task is not None:
+        _pipeline.notify(message_ids)
+
+
+async def start_embedding_pipeline() -> None:
+    if settings.MEMORY_EMBEDDING_ENABLED:
+        get_embedding_pipeline().start()
+
+
+async def shutdown_embedding_pipeline() -> None:
+    if _pipeline is not None:
+        await _pipeline.stop()
@@ -0,0 +1,198 @@
+"""会話メッセージの意味検索（長期記憶）
+
+pgvector が使えれば (embedding::vector(dim)) <=> query のコサイン距離で検索し、使えなければ
+対象範囲の埋め込みを読み出して NumPy で厳密に計算する。埋め込みは L2 正規化済みなので
+コサイン類似度は内積と同じ。
+
+HNSW / IVFFlat の式インデックスは全会話をまたいで探索し、範囲の絞り込みは後段になる。
+会話単位の検索は会話 ID のインデックスで絞ってから厳密に並べ、ユーザー単位の検索だけ
+近傍インデックスを使う（pgvector 0.8 以降は iterative scan で k 件に届くまで探索を続ける）。
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.phase2_models import Conversation, Message, MessageEmbedding
+from app.services.embeddings import Embedder, get_embedder
+
+# 埋め込み対象の本文の上限（長文は先頭だけで十分）
+MAX_CONTENT_CHARS = 4000
+
+_embedder: Optional[Embedder] = None
+# pgvector のバージョン（未確認なら None、拡張が無ければ ()）
+_vector_version: Optional[Tuple[int, ...]] = None
+# iterative scan（絞り込みで候補が欠けたら探索を続ける）が使えるバージョン
+ITERATIVE_SCAN_VERSION = (0, 8)
+
+
+@dataclass
+class MemoryHit:
+    message_id: uuid.UUID
+    conversation_id: uuid.UUID
+    role: str
+    content: str
+    created_at: datetime
+    score: float
+
+
+def get_memory_embedder() -> Embedder:
+    """保存済みベクトルと比較できるよう、コーパスで fit しない埋め込み関数を共有する"""
+    global _embedder
+    if _embedder is None:
+        _embedder = get_embedder()
+    return _embedder
+
+
+def embedding_model_name(embedder: Optional[Embedder] = None) -> str:
+    embedder = embedder or get_memory_embedder()
+    return f"{settings.EMBEDDING_BACKEND}-{embedder.dim}"
+
+
+async def vector_version(db: AsyncSession) -> Tuple[int, ...]:
+    """pgvector 拡張のバージョン（無ければ ()。プロセス内でキャッシュ）"""
+    global _vector_version
+    if _vector_version is None:
+        res = await db.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+        version = res.scalar()
+        _vector_version = tuple(int(p) for p in version.split(".") if p.isdigit()) if version else ()
+    return _vector_version
+
+
+async def vector_available(db: AsyncSession) -> bool:
+    """pgvector 拡張の有無"""
+    return bool(await vector_version(db))
+
+
+def embedding_rows(messages: Sequence[Any], vectors: np.ndarray, model: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "message_id": m.id,
+            "conversation_id": m.conversation_id,
+            "model": model,
+            "embedding": vec.tolist(),
+        }
+        for m, vec in zip(messages, vectors)
+    ]
+
+
+async def store_embeddings(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    if rows:
+        stmt = pg_insert(MessageEmbedding).values(rows).on_conflict_do_nothing(index_elements=["message_id"])
+        await db.execute(stmt)
+
+
+async def _search_vector(
+    db: AsyncSession, qvec: np.ndarray, k: int, model: str, conversation_id, user_id
+) -> List[MemoryHit]:
+    dim = int(qvec.shape[0])
+    dist = f"(e.embedding::vector({dim})) <=> CAST(:q AS vector({dim}))"
+    if conversation_id is not None:
+        # 会話内の埋め込みだけを ix_message_embeddings_conversation_id で読み、全件の距離で並べる
+        # （近傍インデックスで探すと ef_search 件の候補がほかの会話で埋まり、k 件に届かない）
+        candidates = f"""
+            SELECT e.message_id, {dist} AS distance
+            FROM message_embeddings e
+            WHERE e.model = :model AND e.conversation_id = :scope
+        """
+    else:
+        # 絞り込み付きの近傍探索で候補が欠けないよう探索幅を広げる
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(settings.MEMORY_HNSW_EF_SEARCH), k)}"))
+        if await vector_version(db) >= ITERATIVE_SCAN_VERSION:
+            # 絞り込みで k 件に満たなければ探索を続ける（順序は外側で並べ直す）
+            await db.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+            await db.execute(text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+        candidates = f"""
+            SELECT e.message_id, {dist} AS distance
+            FROM message_embeddings e
+            WHERE e.model = :model
+              AND e.conversation_id IN (SELECT id FROM conversations WHERE user_id = :scope)
+            ORDER BY {dist}
+            LIMIT :k
+        """
+    sql = text(
+        f"""
+        WITH hits AS MATERIALIZED ({candidates})
+        SELECT m.id AS message_id, m.conversation_id, m.role, m.content, m.created_at,
+               1 - h.distance AS score
+        FROM hits h
+        JOIN messages m ON m.id = h.message_id
+        ORDER BY h.distance
+        LIMIT :k
+        """
+    )
+    params = {
+        "q": "[" + ",".join(f"{x:.7g}" for x in qvec.tolist()) + "]",
+        "model": model,
+        "scope": conversation_id if conversation_id is not None else user_id,
+        "k": k,
+    }
+    res = await db.execute(sql, params)
+    return [MemoryHit(**row._mapping) for row in res]
+
+
+async def _search_exact(
+    db: AsyncSession, qvec: np.ndarray, k: int, model: str, conversation_id, user_id
+) -> List[MemoryHit]:
+    q = select(MessageEmbedding.message_id, MessageEmbedding.embedding).where(MessageEmbedding.model == model)
+    if conversation_id is not None:
+        q = q.where(MessageEmbedding.conversation_id == conversation_id)
+    else:
+        q = q.where(
+            MessageEmbedding.conversation_id.in_(select(Conversation.id).where(Conversation.user_id == user_id))
+        )
+    rows = (await db.execute(q)).all()
+    if not rows:
+        return []
+    matrix = np.asarray([r.embedding for r in rows], dtype=np.float32)
+    scores = matrix @ qvec
+    k = min(k, len(rows))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    ids = [rows[i].message_id for i in top]
+    res = await db.execute(
+        select(Message.id, Message.conversation_id, Message.role, Message.content, Message.created_at).where(
+            Message.id.in_(ids)
+        )
+    )
+    by_id = {r.id: r for r in res}
+    return [
+        MemoryHit(
+            message_id=m.id,
+            conversation_id=m.conversation_id,
+            role=m.role,
+            content=m.content,
+            created_at=m.created_at,
+            score=float(scores[i]),
+        )
+        for i, m in ((i, by_id.get(rows[i].message_id)) for i in top)
+        if m is not None
+    ]
+
+
+async def search_memory(
+    db: AsyncSession,
+    query: str,
+    k: int = 5,
+    *,
+    conversation_id: Optional[uuid.UUID] = None,
+    user_id: Optional[uuid.UUID] = None,
+    use_vector: Optional[bool] = None,
+) -> List[MemoryHit]:
+    """会話単位またはユーザー単位で、query に近い過去メッセージを類似度の降順で返す"""
+    if (conversation_id is None) == (user_id is None):
+        raise ValueError("specify exactly one of conversation_id or user_id")
+    embedder = get_memory_embedder()
+    qvec = embedder.embed([query[:MAX_CONTENT_CHARS]])[0]
+    if not qvec.any():
+        return []
+    if use_vector is None:
+        use_vector = await vector_available(db)
+    search = _search_vector if use_vector else _search_exact
+    return await search(db, qvec, k, embedding_model_name(embedder), conversation_id, user_id)
@@ -0,0 +1,209 @@
+"""エージェント定義のインメモリベクトルインデックス
+
+STUDIO_AGENTS_DIR 配下の Markdown（front matter の name / description）を起動時に読み込み、
+説明文の埋め込みを NumPy 行列で保持する。検索は 1 回の行列積でコサイン類似度の上位 k 件を返す。
+ファイルの変更は mtime で検知し、変わったファイルだけを再埋め込みする（確認は
+AGENT_INDEX_RELOAD_SECONDS 間隔に間引く）。
+"""
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import Embedder, get_embedder
+from app.services.routing.cache import routing_cache
+
+_FRONT_KEYS = re.compile(r"^(name|description|color|tools|model):\s?(.*)$")
+_TAGS = re.compile(r"</?[a-z]+>")
+_REPO_ROOT = Path(__file__).resolve().parents[4]
+
+
+@dataclass(frozen=True)
+class AgentDoc:
+    name: str
+    description: str
+    file_path: str
+    category: str
+    mtime: float
+
+
+def parse_agent_file(path: Path, root: Path) -> Optional[AgentDoc]:
+    """front matter から name / description を取り出す。front matter が無ければ None
+
+    description は複数行にわたり "user: ..." のような行も含むため YAML としては読まず、
+    既知のキーの行だけを区切りとして扱う。
+    """
+    try:
+        text = path.read_text(encoding="utf-8")
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    lines = text.splitlines()
+    if not lines or lines[0].strip() != "---":
+        return None
+    fields: Dict[str, List[str]] = {}
+    current = None
+    for line in lines[1:]:
+        if line.strip() == "---":
+            break
+        m = _FRONT_KEYS.match(line)
+        if m:
+            current = m.group(1)
+            fields[current] = [m.group(2)]
+        elif current:
+            fields[current].append(line)
+    name = " ".join(fields.get("name", [])).strip() or path.stem
+    description = "\n".join(fields.get("description", [])).replace("\\n", "\n")
+    description = " ".join(_TAGS.sub(" ", description).split())
+    if not description:
+        return None
+    rel = path.relative_to(root)
+    try:
+        file_path = str(path.resolve().relative_to(_REPO_ROOT))
+    except ValueError:
+        file_path = str(path)
+    category = rel.parts[0] if len(rel.parts) > 1 else ""
+    return AgentDoc(name=name, description=description, file_path=file_path, category=category, mtime=mtime)
+
+
+def _agent_text(doc: AgentDoc) -> str:
+    # 説明文のうち "Examples:" 以降の会話例はノイズが多いので要約部分だけを使い、
+    # 名前（"ui-designer" → "ui designer"）は重みを上げるため 2 回含める
+    summary = doc.description.split(" Examples:")[0]
+    name = doc.name.replace("-", " ")
+    return f"{name} {name} {doc.category.replace('-', ' ')} {summary}"
+
+
+class AgentIndex:
+    def __init__(
+        self,
+        root: str,
+        embedder: Optional[Embedder] = None,
+        reload_interval: float = 5.0,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.root = Path(root).resolve()
+        self.embedder = embedder or get_embedder()
+        self.reload_interval = reload_interval
+        self.on_change = on_change
+        self.docs: List[AgentDoc] = []
+        self.matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._by_path: Dict[Path, AgentDoc] = {}
+        self._rows: Dict[Path, np.ndarray] = {}
+        # 読めなかったファイル（説明が無いなど）の mtime。変わらない限り読み直さない
+        self._skipped: Dict[Path, float] = {}
+        self._checked_at = 0.0
+        self.version = 0
+
+    def _scan(self) -> Dict[Path, float]:
+        found: Dict[Path, float] = {}
+        if not self.root.is_dir():
+            return found
+        for path in self.root.rglob("*.md"):
+            if path.name.lower() == "readme.md":
+                continue
+            try:
+                found[path] = path.stat().st_mtime
+            except OSError:
+                continue
+        return found
+
+    def refresh(self, force: bool = False) -> bool:
+        """変更があれば差分だけ再埋め込みして行列を作り直す。変更の有無を返す"""
+        now = time.monotonic()
+        if not force and self.version and now - self._checked_at < self.reload_interval:
+            return False
+        self._checked_at = now
+
+        found = self._scan()
+        removed = [p for p in self._by_path if p not in found]
+        changed = [
+            p
+            for p, mtime in found.items()
+            if (p not in self._by_path or self._by_path[p].mtime != mtime) and self._skipped.get(p) != mtime
+        ]
+        for p in [p for p in self._skipped if p not in found]:
+            del self._skipped[p]
+        if not removed and not changed and self.version:
+            return False
+
+        for p in removed:
+            self._by_path.pop(p, None)
+            self._rows.pop(p, None)
+        for p in changed:
+            doc = parse_agent_file(p, self.root)
+            if doc is None:
+                self._by_path.pop(p, None)
+                self._rows.pop(p, None)
+                self._skipped[p] = found[p]
+            else:
+                self._skipped.pop(p, None)
+                self._by_path[p] = doc
+
+        paths = sorted(self._by_path)
+        docs = [self._by_path[p] for p in paths]
+        texts = [_agent_text(d) for d in docs]
+        if self.embedder.corpus_dependent:
+            # IDF などコーパス全体に依存する重みは、文書集合が変わったら学習し直して全行を再計算する
+            self.embedder.fit(texts)
+            vecs = self.embedder.embed(texts)
+            self._rows = {p: vecs[i] for i, p in enumerate(paths)}
+        else:
+            todo = [p for p in paths if p not in self._rows or p in changed]
+            if todo:
+                vecs = self.embedder.embed([_agent_text(self._by_path[p]) for p in todo])
+                self._rows.update(zip(todo, vecs))
+        self.docs = docs
+        self.matrix = (
+            np.vstack([self._rows[p] for p in paths]).astype(np.float32, copy=False)
+            if paths
+            else np.zeros((0, self.embedder.dim), dtype=np.float32)
+        )
+        self.version += 1
+        if self.on_change is not None and self.version > 1:
+            self.on_change()
+        return True
+
+    def search_many(self, queries: Sequence[str], k: int = 3) -> List[List[Tuple[AgentDoc, float]]]:
+        """クエリごとに (AgentDoc, cosine) の上位 k 件を類似度の降順で返す"""
+        self.refresh()
+        if not queries:
+            return []
+        if not self.docs:
+            return [[] for _ in queries]
+        k = min(k, len(self.docs))
+        scores = self.embedder.embed(queries) @ self.matrix.T
+        if k < len(self.docs):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(self.docs)), (len(queries), 1))
+        results = []
+        for qi, cand in enumerate(top):
+            order = cand[np.argsort(-scores[qi, cand], kind="stable")]
+            results.append([(self.docs[j], float(scores[qi, j])) for j in order])
+        return results
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[AgentDoc, float]]:
+        return self.search_many([query], k)[0]
+
+
+_index: Optional[AgentIndex] = None
+
+
+def get_agent_index() -> AgentIndex:
+    """プロセス共有のインデックス（初回呼び出しで構築）"""
+    global _index
+    if _index is None:
+        _index = AgentIndex(
+            os.path.normpath(settings.STUDIO_AGENTS_DIR),
+            reload_interval=settings.AGENT_INDEX_RELOAD_SECONDS,
+            # エージェント定義が変わったらキャッシュ済みのルーティング決定も無効にする
+            on_change=routing_cache.clear,
+        )
+        _index.refresh(force=True)
+    return _index
@@ -0,0 +1,136 @@
+"""ルーティング決定のキャッシュ
+
+キーは (assistant_id, 正規化したプロンプト)。LRU + TTL で追い出し、AIAssistant / AssistantSkill /
+SkillDefinition の変更コミット時に app.core.invalidation 経由で無効化する。
+"""
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from app.core import invalidation
+from app.core.config import settings
+from app.services.routing.models.routing_models import RoutingDecision
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+RoutingKey = Tuple[str, str]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """ルーティングに影響しない差異を落とす
+
+    全角/半角・大文字小文字・記号・空白の揺れを吸収し、数字は 0 に潰す
+    （"3時に会議" と "4時に会議" は同じルーティングになる）。
+    """
+    s = unicodedata.normalize("NFKC", prompt).casefold()
+    s = _PUNCT.sub(" ", s)
+    s = _DIGITS.sub("0", s)
+    return _SPACES.sub(" ", s).strip()
+
+
+def routing_key(assistant_id: str, prompt: str) -> RoutingKey:
+    return str(assistant_id), normalize_prompt(prompt)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class RoutingCache:
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._clock = clock
+        # key -> (expires_at, decision)
+        self._entries: "OrderedDict[RoutingKey, Tuple[float, RoutingDecision]]" = OrderedDict()
+        # 無効化のたびに進める。計算中に無効化が挟まった結果は格納しない
+        self.generation = 0
+        self._stats = CacheStats()
+
+    def get(self, key: RoutingKey) -> Optional[RoutingDecision]:
+        item = self._entries.get(key)
+        if item is None:
+            self._stats.misses += 1
+            return None
+        expires_at, decision = item
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._stats.expirations += 1
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        # 呼び出し側での変更がキャッシュに波及しないようコピーを返す
+        return decision.model_copy(deep=True)
+
+    def put(self, key: RoutingKey, decision: RoutingDecision, generation: Optional[int] = None) -> None:
+        if self.max_entries <= 0 or (generation is not None and generation != self.generation):
+            return
+        self._entries[key] = (self._clock() + self.ttl, decision.model_copy(deep=True))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate(self, assistant_ids: Optional[Set[Hashable]] = None) -> int:
+        """指定アシスタントのエントリを削除する。None なら全削除"""
+        self.generation += 1
+        if assistant_ids is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            targets = {str(a) for a in assistant_ids}
+            stale = [k for k in self._entries if k[0] in targets]
+            for k in stale:
+                del self._entries[k]
+            removed = len(stale)
+        self._stats.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self.invalidate(None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self._stats.hits + self._stats.misses
+        return {
+            **asdict(self._stats),
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hit_rate": round(self._stats.hits / total, 4) if total else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = CacheStats()
+
+
+routing_cache = RoutingCache(
+    max_entries=settings.ROUTING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ROUTING_CACHE_TTL_SECONDS,
+)
+
+
+def _on_change(table: str, keys: Optional[Set[Any]]) -> None:
+    # スキル定義の変更は全アシスタントに影響するので keys=None（全削除）で届く
+    routing_cache.invalidate(keys)
+
+
+invalidation.subscribe(
+    {"assistants": "id", "assistant_skills": "assistant_id", "skill_definitions": None},
+    _on_change,
+)
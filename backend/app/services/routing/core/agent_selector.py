@@ -1,17 +1,38 @@
 """解析されたタスクに最適なエージェント（プロンプト）を選択するクラス"""
+from typing import List
+
 from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.routing.agent_index import AgentDoc, get_agent_index
 from app.services.routing.models.routing_models import AnalyzedTask
-from app.models.phase2_models import Agent
+
+# 該当するエージェントが無いときのフォールバック
+DEFAULT_AGENT = AgentDoc(
+    name="default",
+    description="",
+    file_path="backend/app/agents/system/default.md",
+    category="system",
+    mtime=0.0,
+)
+
+
+def _query(task: AnalyzedTask) -> str:
+    return task.text or " ".join(task.keywords)
+
 
 class AgentSelector:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def select_agent(self, task: AnalyzedTask) -> Agent:
+    async def select_agent(self, task: AnalyzedTask) -> AgentDoc:
         """タスクに最も関連性の高いエージェントをベクトル検索で選択する"""
-        print("AgentSelector: Selecting best agent...")
-        # TODO: Implement vector search logic for agents
-        # For now, return a dummy agent object
-        class DummyAgent:
-            file_path = "backend/app/agents/system/default.md"
-        return DummyAgent()
\ No newline at end of file
+        return (await self.select_agents([task]))[0]
+
+    async def select_agents(self, tasks: List[AnalyzedTask]) -> List[AgentDoc]:
+        """複数タスクをまとめて 1 回の行列積で検索する（インメモリのため DB は使わない）"""
+        results = get_agent_index().search_many([_query(t) for t in tasks], k=1)
+        return [
+            hits[0][0] if hits and hits[0][1] >= settings.AGENT_MIN_SCORE else DEFAULT_AGENT
+            for hits in results
+        ]
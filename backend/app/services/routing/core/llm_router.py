@@ -1,14 +1,100 @@
-"""スキル定義に基づき、最適なLLMを選択するクラス"""
+"""スキル定義に基づき、最適なLLMを選択するクラス
+
+候補はモデルカタログ（app.services.llm.health）のうちブレーカーが開いていないもの。
+スキル名・説明と解析した意図から必要なタグを集め、一致タグ数の多いモデルを選ぶ。
+同点なら既定モデル（ROUTING_DEFAULT_LLM）→ 実測 TTFT の短い順 → 単価の安い順。
+実測 TTFT p95 が LLM_SLO_TTFT_MS を超える・単価が LLM_SLO_MAX_COST_PER_1K を超えるモデルは
+SLO 内の候補があれば外す。DB は使わない。
+"""
+from typing import Iterable, List, Optional, Sequence, Set
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.phase2_models import SkillDefinition
-from typing import List
+
+from app.core.config import settings
+from app.services.llm.health import ModelHealth, ModelProfile, model_health
+from app.services.routing.cache import routing_cache
+from app.services.routing.models.routing_models import AnalyzedTask
+from app.services.routing.skill_index import SkillMatch
+
+# 意図 -> 必要なタグ
+INTENT_TAGS = {
+    "code": {"code", "reasoning"},
+    "question": {"reasoning"},
+    "summarize": {"summarize"},
+    "translate": {"translate"},
+    "writing": {"writing"},
+    "search": {"search"},
+    "email": {"writing"},
+}
+
+
+def required_tags(skills: Iterable[SkillMatch], task: Optional[AnalyzedTask] = None) -> Set[str]:
+    tags: Set[str] = set()
+    for m in skills:
+        text = f"{m.skill.name} {m.skill.description or ''}".lower().replace("-", " ").replace("_", " ")
+        tags.update(text.split())
+    if task is not None:
+        tags.update(INTENT_TAGS.get(task.intent, ()))
+    return tags
+
 
 class LLMRouter:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: Optional[AsyncSession] = None, health: ModelHealth = model_health):
         self.db = db
+        self.health = health
+
+    def _within_slo(self, profile: ModelProfile) -> bool:
+        max_cost = settings.LLM_SLO_MAX_COST_PER_1K
+        if max_cost > 0 and profile.cost_per_1k > max_cost:
+            return False
+        p95 = self.health.snapshot(profile.name).ttft_p95_ms
+        return not (settings.LLM_SLO_TTFT_MS > 0 and p95 is not None and p95 > settings.LLM_SLO_TTFT_MS)
+
+    def choose(self, tags: Set[str], exclude: Iterable[str] = ()) -> Optional[str]:
+        """タグを満たす利用可能なモデル名。候補が無ければ None"""
+        excluded = set(exclude)
+        candidates = [
+            p for p in self.health.catalog.values() if p.name not in excluded and self.health.available(p.name)
+        ]
+        if not candidates:
+            return None
+        within = [p for p in candidates if self._within_slo(p)]
+
+        def rank(p: ModelProfile):
+            p50 = self.health.snapshot(p.name).ttft_p50_ms
+            return (
+                -len(tags & p.tags),
+                p.name != settings.ROUTING_DEFAULT_LLM,
+                p50 if p50 is not None else settings.LLM_SLO_TTFT_MS,
+                p.cost_per_1k,
+                p.name,
+            )
+
+        return min(within or candidates, key=rank).name
+
+    async def select_llm(self, skills: List[SkillMatch], task: Optional[AnalyzedTask] = None) -> str:
+        return self.choose(required_tags(skills, task)) or settings.ROUTING_DEFAULT_LLM
+
+    async def select_llms(
+        self, skills: Sequence[List[SkillMatch]], tasks: Sequence[Optional[AnalyzedTask]]
+    ) -> List[str]:
+        return [await self.select_llm(s, t) for s, t in zip(skills, tasks)]
+
+    def fallback_for(self, model: str) -> str:
+        """呼び出し直前の確認。ブレーカーが開いていれば同系統のタグを持つ別モデルに切り替える
+
+        代わりが無ければ元のモデルのまま返す（呼び出して失敗させる方が無応答より分かりやすい）。
+        """
+        if self.health.allow(model):
+            return model
+        profile = self.health.catalog.get(model)
+        alternative = self.choose(set(profile.tags) if profile else set(), exclude=(model,))
+        return alternative or model
+
+
+def _on_breaker_change(model: str, state: str) -> None:
+    # キャッシュ済みの決定が開いたモデルを指し続けないよう、状態が変わったら作り直させる
+    routing_cache.clear()
+
 
-    async def select_llm(self, skills: List[SkillDefinition]) -> str:
-        """スキルリストに基づき、最適なLLMモデル名を選択する"""
-        print("LLMRouter: Selecting best LLM...")
-        # TODO: Implement LLM selection logic based on skill configuration
-        return "gemini-pro"
\ No newline at end of file
+model_health.add_listener(_on_breaker_change)
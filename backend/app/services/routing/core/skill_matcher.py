@@ -1,15 +1,40 @@
 """解析されたタスクに必要なスキルを特定するクラス"""
-from typing import List
+import uuid
+from typing import List, Optional, Sequence
+
 from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
 from app.services.routing.models.routing_models import AnalyzedTask
-from app.models.phase2_models import SkillDefinition
+from app.services.routing.skill_index import SkillMatch, get_skill_index
+
 
 class SkillMatcher:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def find_required_skills(self, task: AnalyzedTask, assistant_id: str) -> List[SkillDefinition]:
-        """タスクとアシスタントの保有スキルから、必要なスキルを特定する"""
-        print(f"SkillMatcher: Finding skills for task '{task.intent}'")
-        # TODO: Implement DB lookup and matching logic
-        return []
\ No newline at end of file
+    async def find_required_skills(self, task: AnalyzedTask, assistant_id: str) -> List[SkillMatch]:
+        """タスクのキーワードとアシスタントの有効スキルを転置インデックスで照合する
+
+        インデックスに未反映の変更があるときだけ DB を読む（通常のターンでは DB 往復なし）。
+        """
+        return (await self.find_required_skills_many([task], [assistant_id]))[0]
+
+    async def find_required_skills_many(
+        self, tasks: Sequence[AnalyzedTask], assistant_ids: Sequence[str]
+    ) -> List[List[SkillMatch]]:
+        """複数の (タスク, アシスタント) をまとめて照合する。インデックスの読み直しは全体で 1 回"""
+        index = get_skill_index()
+        await index.refresh(self.db)
+        out: List[List[SkillMatch]] = []
+        for task, assistant_id in zip(tasks, assistant_ids):
+            aid = _parse_uuid(assistant_id)
+            out.append(index.match(aid, task.keywords, limit=settings.SKILL_MATCH_LIMIT) if aid else [])
+        return out
+
+
+def _parse_uuid(value: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
@@ -1,13 +1,300 @@
-"""ユーザーのプロンプトを解析するクラス"""
+"""ユーザーのプロンプトを解析するクラス
+
+LLM を呼ばずに、日本語/英語のトークン化・キーワード抽出・意図分類を行う。
+
+- トークン化: NFKC + casefold の後、文字種（英数字 / ひらがな / カタカナ / 漢字）の連続で区切る。
+  英単語は簡易ステミング、かな漢字は文字 bigram を特徴量にする。
+- 意図分類: INTENT_EXAMPLES の例文から作った意図ごとの重心ベクトル（ハッシュ特徴量、
+  L2 正規化）との内積で採点する線形分類器。重み行列は import 時に 1 回だけ作り、
+  語ごとの特徴量バケットはプロセス内でキャッシュする。
+  INTENT_PATTERNS の正規表現（1 本にまとめてコンパイル済み）に当たった意図には加点する。
+- analyze_many: 同じプロンプトのトークン化は 1 回にまとめ、採点は 1 回の行列演算で行う。
+"""
+import math
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.services.routing.models.routing_models import AnalyzedTask
 
+_DIM = 2048
+_RUNS = re.compile(r"[a-z0-9][a-z0-9+#]*|[ぁ-ゖー]+|[ァ-ヺー]+|[一-龯々〆ヶ]+")
+_SUFFIXES = ("ing", "ed", "es", "s")
+_MAX_KEYWORDS = 8
+# これ未満の確信度は "unknown" とする
+MIN_CONFIDENCE = 0.3
+# 正規表現に当たった意図への加点（重心との内積は 0〜1）
+_PATTERN_BONUS = 0.35
+# 確信度（softmax）の鋭さ
+_TEMPERATURE = 12.0
+
+STOPWORDS = frozenset(
+    """a an the and or but if of to in on at for from by with about into over after before is are was were be
+    been am do does did have has had i me my we our you your he she it they them this that these those what which
+    who whom how when where why can could would should will shall may might must please let lets just some any
+    all not no yes so than then there here up out as also very much more most get make want need like""".split()
+)
+
+# 意図ごとの例文（重心の元）。追加・修正したら import し直すだけでよい
+INTENT_EXAMPLES: Dict[str, Tuple[str, ...]] = {
+    "schedule": (
+        "schedule a meeting tomorrow at 3pm",
+        "add an event to my calendar",
+        "reschedule the appointment to next week",
+        "明日の15時に会議を予定に入れて",
+        "来週の打ち合わせの日程を調整して",
+        "カレンダーに予定を追加して",
+    ),
+    "email": (
+        "draft an email to the client",
+        "reply to this mail politely",
+        "write a follow up email to the team",
+        "取引先へのメールを下書きして",
+        "このメールに返信して",
+        "お礼のメール文面を作って",
+    ),
+    "search": (
+        "search the web for the latest news",
+        "find information about this company",
+        "look up the opening hours",
+        "最新のニュースを検索して",
+        "この会社について調べて",
+        "営業時間を調べてください",
+    ),
+    "summarize": (
+        "summarize this document",
+        "give me a short summary of the meeting notes",
+        "tl dr of this article",
+        "この資料を要約して",
+        "議事録を短くまとめて",
+        "記事の要点を三行でまとめて",
+    ),
+    "translate": (
+        "translate this into english",
+        "translate the paragraph to japanese",
+        "how do you say this in french",
+        "この文章を英語に翻訳して",
+        "日本語に訳してください",
+        "英訳をお願いします",
+    ),
+    "code": (
+        "fix this python bug",
+        "write a function that parses json",
+        "review my pull request code",
+        "このコードのバグを直して",
+        "関数を実装してください",
+        "エラーの原因をデバッグして",
+    ),
+    "writing": (
+        "write a blog post about remote work",
+        "draft a proposal for the new project",
+        "create a presentation outline",
+        "ブログ記事を書いて",
+        "企画書の草案を作成して",
+        "プレゼン資料の構成を考えて",
+    ),
+    "travel": (
+        "book a flight to osaka",
+        "find a hotel near the station",
+        "plan a trip itinerary for kyoto",
+        "大阪行きの新幹線を予約して",
+        "駅の近くのホテルを探して",
+        "京都旅行の行程を計画して",
+    ),
+    "task": (
+        "remind me to call the bank",
+        "add buy milk to my todo list",
+        "create a task for the report deadline",
+        "銀行に電話するのをリマインドして",
+        "買い物をタスクに追加して",
+        "締め切りのToDoを登録して",
+    ),
+    "question": (
+        "what is the difference between tcp and udp",
+        "explain how photosynthesis works",
+        "why is the sky blue",
+        "光合成の仕組みを説明して",
+        "TCPとUDPの違いは何ですか",
+        "なぜ空は青いのですか",
+    ),
+    "greeting": (
+        "hello",
+        "good morning",
+        "thanks a lot",
+        "こんにちは",
+        "おはようございます",
+        "ありがとう",
+    ),
+}
+
+INTENT_PATTERNS: Dict[str, str] = {
+    "schedule": r"schedul|calendar|appointment|予定|日程|会議|打ち合わせ|カレンダー",
+    "email": r"e-?mail|\bmail\b|メール|返信",
+    "search": r"\bsearch|look up|検索|調べ",
+    "summarize": r"summar|tl;?dr|要約|まとめ|要点",
+    "translate": r"translat|翻訳|[英和]訳|訳して",
+    "code": r"\bcode\b|\bbug|debug|python|javascript|typescript|function|コード|バグ|デバッグ|実装",
+    "writing": r"blog|essay|proposal|outline|記事|草案|企画書|文章を書",
+    "travel": r"flight|hotel|itinerar|\btrip\b|travel|新幹線|ホテル|旅行|航空券",
+    "task": r"remind|todo|to-do|\btask|リマインド|タスク|todo|やること",
+    "greeting": r"^(hi|hello|hey|thanks?|thank you|good (morning|evening))\b|^(こんにちは|こんばんは|おはよう|ありがとう)",
+}
+
+_PATTERN = re.compile("|".join(f"(?P<{name}>{p})" for name, p in INTENT_PATTERNS.items()))
+
+
+def _stem(word: str) -> str:
+    for suf in _SUFFIXES:
+        if word.endswith(suf) and len(word) - len(suf) >= 3 and not word.endswith("ss"):
+            return word[: -len(suf)]
+    return word
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    """正規化済みテキストを文字種の連続（英単語・かな・カナ・漢字）に区切る"""
+    return _RUNS.findall(text)
+
+
+def _is_ascii(run: str) -> bool:
+    return run[0] < "\x80"
+
+
+def keywords(runs: Sequence[str], limit: int = _MAX_KEYWORDS) -> List[str]:
+    """内容語らしいもの（英単語・カタカナ語・漢字語）を出現順に重複なく返す。ひらがなは捨てる"""
+    out: List[str] = []
+    seen = set()
+    for run in runs:
+        if _is_ascii(run):
+            if len(run) < 2 or run in STOPWORDS or run.isdigit():
+                continue
+        elif "ぁ" <= run[0] <= "ゖ" or len(run) < 2:
+            continue
+        if run not in seen:
+            seen.add(run)
+            out.append(run)
+            if len(out) >= limit:
+                break
+    return out
+
+
+def _features(runs: Sequence[str]) -> List[str]:
+    feats: List[str] = []
+    for run in runs:
+        if _is_ascii(run):
+            if run not in STOPWORDS:
+                feats.append(_stem(run))
+        elif len(run) == 1:
+            feats.append(run)
+        else:
+            feats.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return feats
+
+
+# 語（文字種の連続 1 つ）-> 特徴量のバケット番号。語彙は有限なのでプロセス内で使い回す
+_RUN_BUCKETS: Dict[str, Tuple[int, ...]] = {}
+_RUN_CACHE_SIZE = 200_000
+
+
+def _run_buckets(run: str) -> Tuple[int, ...]:
+    b = _RUN_BUCKETS.get(run)
+    if b is None:
+        b = tuple(zlib.crc32(f.encode("utf-8")) % _DIM for f in _features((run,)))
+        if len(_RUN_BUCKETS) < _RUN_CACHE_SIZE:
+            _RUN_BUCKETS[run] = b
+    return b
+
+
+def _indices(runs: Sequence[str]) -> List[int]:
+    out: List[int] = []
+    for run in runs:
+        out.extend(_run_buckets(run))
+    return out
+
+
+def _build_weights() -> Tuple[Tuple[str, ...], np.ndarray]:
+    labels = tuple(INTENT_EXAMPLES)
+    weights = np.zeros((_DIM, len(labels)), dtype=np.float32)
+    for col, label in enumerate(labels):
+        for example in INTENT_EXAMPLES[label]:
+            idx = _indices(tokenize(normalize(example)))
+            if idx:
+                vec = np.bincount(idx, minlength=_DIM).astype(np.float32)
+                weights[:, col] += vec / np.linalg.norm(vec)
+        norm = np.linalg.norm(weights[:, col])
+        if norm:
+            weights[:, col] /= norm
+    return labels, weights
+
+
+# (特徴量バケット, 意図) の重み。行を集めて足すだけで全意図の点数が出る
+INTENT_LABELS, _WEIGHTS = _build_weights()
+_LABEL_INDEX = {label: i for i, label in enumerate(INTENT_LABELS)}
+
+
+def _analyze_batch(prompts: Sequence[str]) -> List[AnalyzedTask]:
+    # 同じプロンプトは 1 回だけ正規化・トークン化する
+    unique: Dict[str, int] = {}
+    order = [unique.setdefault(p, len(unique)) for p in prompts]
+    texts = list(unique)
+    norms = [normalize(t) for t in texts]
+    runs = [tokenize(n) for n in norms]
+
+    # 疎な特徴量をまとめて採点する: 全プロンプトの行を 1 回で集め、reduceat でプロンプトごとに合計
+    flat: List[int] = []
+    starts: List[int] = []
+    rows: List[int] = []
+    for row, r in enumerate(runs):
+        idx = _indices(r)
+        if idx:
+            rows.append(row)
+            starts.append(len(flat))
+            flat.extend(idx)
+    scores = [[0.0] * len(INTENT_LABELS) for _ in texts]
+    if flat:
+        gathered = _WEIGHTS[flat]
+        summed = gathered.sum(axis=0, keepdims=True) if len(starts) == 1 else np.add.reduceat(gathered, starts, axis=0)
+        ends = starts[1:] + [len(flat)]
+        for row, values, a, b in zip(rows, summed.tolist(), starts, ends):
+            scale = 1.0 / math.sqrt(b - a)
+            scores[row] = [v * scale for v in values]
+
+    results = []
+    for row, text in enumerate(texts):
+        row_scores = scores[row]
+        for m in _PATTERN.finditer(norms[row]):
+            row_scores[_LABEL_INDEX[m.lastgroup]] += _PATTERN_BONUS
+        # 意図は十数個なので softmax は Python のままの方が速い
+        best = max(range(len(row_scores)), key=row_scores.__getitem__)
+        top = row_scores[best]
+        confidence = 0.0
+        if top > 0:
+            confidence = 1.0 / sum(math.exp((v - top) * _TEMPERATURE) for v in row_scores)
+        intent = INTENT_LABELS[best] if confidence >= MIN_CONFIDENCE else "unknown"
+        results.append(
+            AnalyzedTask(keywords=keywords(runs[row]), intent=intent, confidence=round(confidence, 4), text=text)
+        )
+    if len(texts) == len(prompts):
+        return results
+    # 重複したプロンプトには別インスタンスを返す（呼び出し側での変更が波及しないように）
+    return [results[i].model_copy(deep=True) for i in order]
+
+
 class TaskAnalyzer:
-    def __init__(self, db: AsyncSession = None):
+    def __init__(self, db: Optional[AsyncSession] = None):
         self.db = db
 
     async def analyze(self, user_prompt: str) -> AnalyzedTask:
         """ユーザープロンプトを解析し、構造化されたタスク情報に変換する"""
-        print(f"TaskAnalyzer: Analyzing prompt: '{user_prompt}'")
-        # TODO: Implement actual analysis logic
-        return AnalyzedTask(keywords=["sample", "task"], intent="unknown", confidence=0.5)
\ No newline at end of file
+        return _analyze_batch([user_prompt])[0]
+
+    async def analyze_many(self, prompts: Sequence[str]) -> List[AnalyzedTask]:
+        """複数プロンプトをまとめて解析する（結果は入力順）"""
+        return _analyze_batch(prompts) if prompts else []
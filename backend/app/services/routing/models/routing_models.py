@@ -1,5 +1,5 @@
 """ルーティングサービス内で使用するデータモデルを定義します。"""
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 import uuid
 
@@ -8,10 +8,14 @@ class AnalyzedTask(BaseModel):
     keywords: List[str]
     intent: str
     confidence: float = 0.0
+    # 元のプロンプト（エージェント検索などに使う）
+    text: Optional[str] = None
 
 class RoutingDecision(BaseModel):
     """指揮者による最終的なルーティング決定"""
     llm_model: str
     agent_path: str
     skills: List[str]
-    reasoning: Optional[str] = None
\ No newline at end of file
+    reasoning: Optional[str] = None
+    # ステージごとの所要時間（ms）。"total" は全体、キャッシュヒット時は "cache" のみ
+    timings: Dict[str, float] = {}
\ No newline at end of file
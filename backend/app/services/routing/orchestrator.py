@@ -1,37 +1,132 @@
 """ルーティングプロセス全体を統括する指揮者クラス"""
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.services.routing.models.routing_models import RoutingDecision
+from app.core.config import settings
+from app.services.routing.cache import RoutingCache, RoutingKey, routing_cache, routing_key
+from app.services.routing.models.routing_models import AnalyzedTask, RoutingDecision
+from app.services.routing.pipeline import Stage, StagePipeline
 from app.services.routing.core.task_analyzer import TaskAnalyzer
 from app.services.routing.core.skill_matcher import SkillMatcher
 from app.services.routing.core.llm_router import LLMRouter
-from app.services.routing.core.agent_selector import AgentSelector
+from app.services.routing.core.agent_selector import DEFAULT_AGENT, AgentSelector
+
+
+def _ms(value: int) -> Optional[float]:
+    return value / 1000.0 if value > 0 else None
+
 
 class RoutingOrchestrator:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, cache: Optional[RoutingCache] = routing_cache):
         self.db = db
-        self.task_analyzer = TaskAnalyzer(db=self.db)
-        self.skill_matcher = SkillMatcher(db=self.db)
-        self.llm_router = LLMRouter(db=self.db)
-        self.agent_selector = AgentSelector(db=self.db)
+        self.cache = cache
 
     async def route(self, user_prompt: str, assistant_id: str) -> RoutingDecision:
-        """ユーザープロンプトから最適なルーティングを決定する一連の流れ"""
-        # 1. タスク分析
-        analyzed_task = await self.task_analyzer.analyze(user_prompt)
+        """キャッシュを引き、外れたときだけパイプラインを実行する"""
+        return (await self.route_many([(user_prompt, assistant_id)]))[0]
+
+    async def route_many(self, requests: Sequence[Tuple[str, str]]) -> List[RoutingDecision]:
+        """複数の (プロンプト, アシスタント ID) の決定を入力順に返す
+
+        同じキー（アシスタント + 正規化したプロンプト）は 1 回だけ決める。キャッシュに無いものは
+        まとめて 1 回のパイプラインに通す（解析は一括、スキル照合のインデックス読み直しも 1 回）。
+        """
+        started = time.perf_counter()
+        keys = [routing_key(a, p) for p, a in requests]
+        decided: Dict[RoutingKey, RoutingDecision] = {}
+        todo: Dict[RoutingKey, Tuple[str, str]] = {}
+        for key, request in zip(keys, requests):
+            if key in decided or key in todo:
+                continue
+            hit = self.cache.get(key) if self.cache is not None else None
+            if hit is None:
+                todo[key] = request
+            else:
+                decided[key] = hit
+        if decided:
+            elapsed = round((time.perf_counter() - started) * 1000, 3)
+            for decision in decided.values():
+                decision.timings = {"cache": elapsed}
+
+        if todo:
+            generation = self.cache.generation if self.cache is not None else None
+            decisions, degraded = await self._route_uncached(list(todo.values()))
+            for key, decision in zip(todo, decisions):
+                decided[key] = decision
+                # 既定値で埋めた（一時的な失敗を含む）決定はキャッシュしない
+                if self.cache is not None and not degraded:
+                    self.cache.put(key, decision, generation)
+
+        # 重複したリクエストには別インスタンスを返す（呼び出し側での変更が波及しないように）
+        out: List[RoutingDecision] = []
+        seen = set()
+        for key in keys:
+            out.append(decided[key].model_copy(deep=True) if key in seen else decided[key])
+            seen.add(key)
+        return out
 
-        # 2. スキルマッチング
-        required_skills = await self.skill_matcher.find_required_skills(analyzed_task, assistant_id)
+    def stages(self, requests: Sequence[Tuple[str, str]]) -> List[Stage]:
+        """analyze → (skills → llm) と analyze → agent の依存グラフ（各ステージはリクエスト数分の一括処理）
 
-        # 3. LLM選択
-        selected_llm = await self.llm_router.select_llm(required_skills)
+        エージェント選択は分析結果だけに依存するので、スキル照合・LLM 選択と並行に走る。
+        """
+        db = self.db
+        prompts = [p for p, _ in requests]
+        assistant_ids = [a for _, a in requests]
+        n = len(requests)
+        return [
+            Stage(
+                "analyze",
+                lambda ctx: TaskAnalyzer(db=db).analyze_many(prompts),
+                fallback=lambda ctx: [
+                    AnalyzedTask(keywords=[], intent="unknown", confidence=0.0, text=p) for p in prompts
+                ],
+                timeout=_ms(settings.ROUTING_ANALYZE_TIMEOUT_MS),
+            ),
+            Stage(
+                "skills",
+                lambda ctx: SkillMatcher(db=db).find_required_skills_many(ctx["analyze"], assistant_ids),
+                fallback=lambda ctx: [[] for _ in range(n)],
+                deps=("analyze",),
+                timeout=_ms(settings.ROUTING_SKILLS_TIMEOUT_MS),
+                uses_db=True,
+            ),
+            Stage(
+                "llm",
+                lambda ctx: LLMRouter(db=db).select_llms(ctx["skills"], ctx["analyze"]),
+                fallback=lambda ctx: [settings.ROUTING_DEFAULT_LLM] * n,
+                deps=("analyze", "skills"),
+                timeout=_ms(settings.ROUTING_LLM_TIMEOUT_MS),
+            ),
+            Stage(
+                "agent",
+                lambda ctx: AgentSelector(db=db).select_agents(ctx["analyze"]),
+                fallback=lambda ctx: [DEFAULT_AGENT] * n,
+                deps=("analyze",),
+                timeout=_ms(settings.ROUTING_AGENT_TIMEOUT_MS),
+            ),
+        ]
 
-        # 4. エージェント選択
-        selected_agent = await self.agent_selector.select_agent(analyzed_task)
+    async def _route_uncached(self, requests: Sequence[Tuple[str, str]]) -> Tuple[List[RoutingDecision], bool]:
+        """プロンプトから最適なルーティングを決定する一連の流れ。(決定のリスト, 既定値を使ったか) を返す"""
+        result = await StagePipeline(self.stages(requests), db=self.db).run()
+        values = result.values
 
-        return RoutingDecision(
-            llm_model=selected_llm,
-            agent_path=selected_agent.file_path,
-            skills=[skill.name for skill in required_skills],
-            reasoning="A decision was made based on the analysis." #仮
-        )
\ No newline at end of file
+        reasoning = "A decision was made based on the analysis."  # 仮
+        if result.fallbacks:
+            reasoning += " Defaults used for: " + ", ".join(
+                f"{name} ({why})" for name, why in sorted(result.fallbacks.items())
+            )
+        decisions = [
+            RoutingDecision(
+                llm_model=llm,
+                agent_path=agent.file_path,
+                skills=[skill.name for skill in skills],
+                reasoning=reasoning,
+                timings=dict(result.timings),
+            )
+            for llm, agent, skills in zip(values["llm"], values["agent"], values["skills"])
+        ]
+        return decisions, bool(result.fallbacks)
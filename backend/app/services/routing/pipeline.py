@@ -0,0 +1,107 @@
+"""依存関係に沿ってステージを並行実行する小さな実行器
+
+各ステージは依存先の結果（ctx）を受け取る coroutine 関数。依存が揃ったステージから
+順に起動し、互いに独立なステージは並行に走る。ステージごとにタイムアウトを持ち、
+時間切れや例外のときは fallback の値で後続を続ける。所要時間は ms で記録する。
+
+AsyncSession は同時に複数の操作を受け付けないため、uses_db=True のステージは
+共有のロックで直列化する（DB を使わないステージとは重なる）。実行中のクエリを
+タイムアウトで打ち切ると接続が無効になるので、db を渡された場合はロックを持ったまま
+ロールバックしてから後続の DB ステージに渡す（読み取り専用の用途を想定）。
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+Context = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    run: Callable[[Context], Awaitable[Any]]
+    fallback: Callable[[Context], Any]
+    deps: Tuple[str, ...] = ()
+    # None ならタイムアウトなし
+    timeout: Optional[float] = None
+    uses_db: bool = False
+
+
+@dataclass
+class PipelineResult:
+    values: Context
+    timings: Dict[str, float] = field(default_factory=dict)
+    # タイムアウト/例外で fallback を使ったステージ名 -> "timeout" | "error"
+    fallbacks: Dict[str, str] = field(default_factory=dict)
+
+
+class StagePipeline:
+    def __init__(self, stages: Sequence[Stage], db: Optional[AsyncSession] = None):
+        self.db = db
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate stage name")
+        self.stages = list(stages)
+        known = set()
+        for stage in self.stages:
+            missing = [d for d in stage.deps if d not in known]
+            if missing:
+                # 並びをそのままトポロジカル順として扱う（循環も防げる）
+                raise ValueError(f"stage {stage.name!r} depends on undefined or later stages: {missing}")
+            known.add(stage.name)
+
+    async def run(self, initial: Optional[Context] = None) -> PipelineResult:
+        result = PipelineResult(values=dict(initial or {}))
+        db_lock = asyncio.Lock()
+        pending = list(self.stages)
+        running: Dict[asyncio.Task, Stage] = {}
+        started = time.perf_counter()
+        try:
+            while pending or running:
+                for stage in [s for s in pending if all(d in result.values for d in s.deps)]:
+                    pending.remove(stage)
+                    task = asyncio.ensure_future(self._run_stage(stage, result, db_lock))
+                    running[task] = stage
+                if not running:
+                    # 依存先が fallback もできずに欠けた（通常は起きない）
+                    raise RuntimeError(f"unresolvable stages: {[s.name for s in pending]}")
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    result.values[stage.name] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
+        result.timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    async def _run_stage(self, stage: Stage, result: PipelineResult, db_lock: asyncio.Lock) -> Any:
+        started = time.perf_counter()
+        try:
+            if not stage.uses_db:
+                return await self._attempt(stage, result)
+            async with db_lock:
+                value = await self._attempt(stage, result)
+                if stage.name in result.fallbacks and self.db is not None:
+                    await self.db.rollback()
+                return value
+        finally:
+            result.timings[stage.name] = round((time.perf_counter() - started) * 1000, 3)
+
+    async def _attempt(self, stage: Stage, result: PipelineResult) -> Any:
+        ctx = result.values
+        try:
+            return await asyncio.wait_for(stage.run(ctx), stage.timeout)
+        except asyncio.TimeoutError:
+            result.fallbacks[stage.name] = "timeout"
+            logger.warning("routing stage %s timed out after %.0f ms", stage.name, (stage.timeout or 0) * 1000)
+        except Exception:
+            result.fallbacks[stage.name] = "error"
+            logger.exception("routing stage %s failed; using fallback", stage.name)
+        return stage.fallback(ctx)
@@ -0,0 +1,233 @@
+"""アシスタントごとの有効スキルのインメモリインデックス
+
+起動時（または初回利用時）に assistant_skills × skill_definitions を 1 回の一括クエリで読み、
+スキル名・説明の語から転置インデックス（語 -> スキル ID）を作る。照合はキーワードごとに
+posting を引くだけなので、スキル数によらずキーワード数に比例し、ターンごとの DB 往復は無い。
+
+assistants / assistant_skills / skill_definitions の変更コミットは app.core.invalidation で
+受け取り、該当アシスタント・スキルだけを次回の照合時に読み直す。他プロセスでの変更は
+SKILL_INDEX_REFRESH_SECONDS ごとの全件再読み込みで追いつく。読み取りレプリカのセッションで
+読み直した場合は、変更から DATABASE_READ_STICKY_SECONDS の間は読み直しの対象に残しておく。
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import invalidation
+from app.core.config import settings
+from app.core.database import replica_lag_seconds
+from app.models.phase2_models import AssistantSkill, SkillDefinition
+from app.services.embeddings.embedder import features
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexedSkill:
+    id: uuid.UUID
+    name: str
+    description: Optional[str]
+    terms: FrozenSet[str]
+
+
+@dataclass(frozen=True)
+class SkillMatch:
+    skill: IndexedSkill
+    priority: int
+    level: int
+    score: int
+
+    @property
+    def name(self) -> str:
+        return self.skill.name
+
+
+def skill_terms(name: str, description: Optional[str]) -> FrozenSet[str]:
+    # "schedule-management" → schedule / management
+    return frozenset(features(f"{name.replace('-', ' ').replace('_', ' ')} {description or ''}"))
+
+
+def keyword_terms(keywords: Iterable[str]) -> Set[str]:
+    terms: Set[str] = set()
+    for keyword in keywords:
+        terms.update(features(keyword))
+    return terms
+
+
+class SkillIndex:
+    def __init__(self, refresh_interval: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self.skills: Dict[uuid.UUID, IndexedSkill] = {}
+        # 語 -> スキル ID
+        self.postings: Dict[str, Set[uuid.UUID]] = defaultdict(set)
+        # assistant_id -> {skill_id: (priority, level)}（有効なものだけ）
+        self.assistants: Dict[uuid.UUID, Dict[uuid.UUID, tuple]] = {}
+        self.loaded_at: Optional[float] = None
+        self._dirty_assistants: Set[uuid.UUID] = set()
+        self._dirty_skills: Set[uuid.UUID] = set()
+        self._marked_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self.loads = 0
+
+    # ---- 無効化 ----
+    def mark_dirty(self, table: str, keys: Optional[Set[Any]]) -> None:
+        self._marked_at = self._clock()
+        if keys is None:
+            self.loaded_at = None
+        elif table == "skill_definitions":
+            self._dirty_skills.update(keys)
+        else:
+            self._dirty_assistants.update(keys)
+
+    def _stale(self) -> bool:
+        return self.loaded_at is None or self._clock() - self.loaded_at >= self.refresh_interval
+
+    @property
+    def dirty(self) -> bool:
+        return self._stale() or bool(self._dirty_assistants or self._dirty_skills)
+
+    def _lagging(self, db: AsyncSession) -> bool:
+        return self._clock() - self._marked_at < replica_lag_seconds(db)
+
+    # ---- 構築 ----
+    def _put_skill(self, skill_id: uuid.UUID, name: str, description: Optional[str]) -> None:
+        self._drop_skill(skill_id)
+        skill = IndexedSkill(skill_id, name, description, skill_terms(name, description))
+        self.skills[skill_id] = skill
+        for term in skill.terms:
+            self.postings[term].add(skill_id)
+
+    def _drop_skill(self, skill_id: uuid.UUID) -> None:
+        old = self.skills.pop(skill_id, None)
+        if old is None:
+            return
+        for term in old.terms:
+            ids = self.postings.get(term)
+            if ids is not None:
+                ids.discard(skill_id)
+                if not ids:
+                    del self.postings[term]
+
+    def _links_query(self):
+        return (
+            select(
+                AssistantSkill.assistant_id,
+                AssistantSkill.priority,
+                AssistantSkill.level,
+                SkillDefinition.id,
+                SkillDefinition.name,
+                SkillDefinition.description,
+            )
+            .join(SkillDefinition, SkillDefinition.id == AssistantSkill.skill_id)
+            .where(AssistantSkill.is_enabled.is_(True))
+        )
+
+    def _apply_links(self, rows: Sequence[Any], assistant_ids: Iterable[uuid.UUID]) -> None:
+        for a in assistant_ids:
+            self.assistants.pop(a, None)
+        for r in rows:
+            if r.id not in self.skills:
+                self._put_skill(r.id, r.name, r.description)
+            self.assistants.setdefault(r.assistant_id, {})[r.id] = (r.priority, r.level or 0)
+
+    async def load(self, db: AsyncSession) -> None:
+        """全件を 1 クエリで読み直す"""
+        self._dirty_assistants.clear()
+        self._dirty_skills.clear()
+        loaded_at = self._clock()
+        rows = (await db.execute(self._links_query())).all()
+        self.skills.clear()
+        self.postings.clear()
+        self.assistants.clear()
+        self._apply_links(rows, ())
+        # レプリカがまだ変更に追いついていないかもしれないので、次回も読み直させる
+        self.loaded_at = None if self._lagging(db) else loaded_at
+        self.loads += 1
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """変更のあったアシスタント・スキルだけを読み直す（期限切れなら全件）"""
+        if not self.dirty:
+            return
+        async with self._lock:
+            if self._stale():
+                await self.load(db)
+                return
+            skill_ids, self._dirty_skills = self._dirty_skills, set()
+            assistant_ids, self._dirty_assistants = self._dirty_assistants, set()
+            if skill_ids:
+                rows = (
+                    await db.execute(
+                        select(SkillDefinition.id, SkillDefinition.name, SkillDefinition.description).where(
+                            SkillDefinition.id.in_(skill_ids)
+                        )
+                    )
+                ).all()
+                found = {r.id for r in rows}
+                for r in rows:
+                    self._put_skill(r.id, r.name, r.description)
+                for skill_id in skill_ids - found:
+                    self._drop_skill(skill_id)
+                    for links in self.assistants.values():
+                        links.pop(skill_id, None)
+            if assistant_ids:
+                rows = (await db.execute(self._links_query().where(AssistantSkill.assistant_id.in_(assistant_ids)))).all()
+                self._apply_links(rows, assistant_ids)
+            if self._lagging(db):
+                self._dirty_skills |= skill_ids
+                self._dirty_assistants |= assistant_ids
+
+    # ---- 照合 ----
+    def match(self, assistant_id: uuid.UUID, keywords: Sequence[str], limit: Optional[int] = None) -> List[SkillMatch]:
+        """キーワードに一致するアシスタントの有効スキルを、一致語数の多い順 → 優先度順に返す"""
+        links = self.assistants.get(assistant_id)
+        if not links:
+            return []
+        scores: Dict[uuid.UUID, int] = defaultdict(int)
+        for term in keyword_terms(keywords):
+            for skill_id in self.postings.get(term, ()):
+                if skill_id in links:
+                    scores[skill_id] += 1
+        matches = [
+            SkillMatch(self.skills[s], priority=links[s][0], level=links[s][1], score=n) for s, n in scores.items()
+        ]
+        matches.sort(key=lambda m: (-m.score, m.priority, -m.level, m.name))
+        return matches[:limit] if limit else matches
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "skills": len(self.skills),
+            "terms": len(self.postings),
+            "assistants": len(self.assistants),
+            "loads": self.loads,
+        }
+
+
+_index: Optional[SkillIndex] = None
+
+
+def get_skill_index() -> SkillIndex:
+    global _index
+    if _index is None:
+        _index = SkillIndex(refresh_interval=settings.SKILL_INDEX_REFRESH_SECONDS)
+        invalidation.subscribe(
+            {"assistants": "id", "assistant_skills": "assistant_id", "skill_definitions": "id"},
+            _index.mark_dirty,
+        )
+    return _index
+
+
+async def load_skill_index(session_factory: Callable[[], AsyncSession]) -> None:
+    """起動時の一括読み込み（失敗しても初回の照合時に読み直す）"""
+    try:
+        async with session_factory() as db:
+            await get_skill_index().load(db)
+    except Exception:
+        logger.exception("skill index preload failed; will load on first use")
@@ -0,0 +1 @@
+# User services (default user resolution)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""シングルユーザー環境の既定ユーザーの解決
+
+既定ユーザーは最も古いユーザー（created_at, id 順）。ID はプロセス内で memoize し、users への
+変更コミット（app.core.invalidation）で捨てる。text() の生 SQL や他プロセスでの削除は検知できない
+ので、呼び出し側は外部キー違反を受けたら invalidate() して 1 回だけ解決し直す。
+
+作成は INSERT ... ON CONFLICT DO NOTHING で行い、同時に走った最初のリクエスト同士
+（別プロセスを含む）が既定ユーザーを重複作成しないようにする。
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Callable, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import invalidation
+from app.core.config import settings
+from app.models.models import User
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL の foreign_key_violation
+_FK_VIOLATION = "23503"
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, "sqlstate", None) == _FK_VIOLATION
+
+
+class DefaultUserResolver:
+    def __init__(self):
+        self._user_id: Optional[uuid.UUID] = None
+        # 無効化のたびに進める。解決中に無効化が挟まった結果は memoize しない
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.lookups = 0
+
+    def invalidate(self, table: str = "users", keys: Optional[Set[Any]] = None) -> None:
+        self._generation += 1
+        self._user_id = None
+
+    @property
+    def cached(self) -> Optional[uuid.UUID]:
+        return self._user_id
+
+    async def _lookup(self, db: AsyncSession) -> Optional[uuid.UUID]:
+        self.lookups += 1
+        return await db.scalar(select(User.id).order_by(User.created_at.asc(), User.id.asc()).limit(1))
+
+    async def _create(self, db: AsyncSession) -> None:
+        await db.execute(
+            insert(User)
+            .values(
+                id=uuid.uuid4(),
+                username=settings.DEFAULT_ADMIN_NAME,
+                email=settings.DEFAULT_ADMIN_EMAIL,
+                password_hash="!",  # 使わないのでダミーでOK（NOT NULL回避）
+                first_name="Default",
+                last_name="Admin",
+                is_active=True,
+                is_verified=True,
+            )
+            .on_conflict_do_nothing()
+        )
+        await db.commit()
+
+    async def resolve(self, db: AsyncSession, *, create: bool = False) -> Optional[uuid.UUID]:
+        """既定ユーザーの ID。いなければ create=True のときだけ作成し、それ以外は None"""
+        if self._user_id is not None:
+            return self._user_id
+        async with self._lock:
+            if self._user_id is not None:
+                return self._user_id
+            generation = self._generation
+            user_id = await self._lookup(db)
+            if user_id is None and create:
+                await self._create(db)
+                generation = self._generation
+                user_id = await self._lookup(db)
+            if generation == self._generation:
+                self._user_id = user_id
+            return user_id
+
+
+_resolver: Optional[DefaultUserResolver] = None
+
+
+def get_default_user_resolver() -> DefaultUserResolver:
+    global _resolver
+    if _resolver is None:
+        _resolver = DefaultUserResolver()
+        # 既定は「最も古いユーザー」なので、追加・削除のどちらでも捨てる（users の変更は稀）
+        invalidation.subscribe({"users": None}, _resolver.invalidate)
+    return _resolver
+
+
+async def load_default_user(session_factory: Callable[[], AsyncSession]) -> None:
+    """起動時に既定ユーザーを解決（いなければ作成）しておく。失敗しても初回のリクエストで解決し直す"""
+    try:
+        async with session_factory() as db:
+            await get_default_user_resolver().resolve(db, create=True)
+    except Exception:
+        logger.exception("default user resolution failed; will resolve on first use")
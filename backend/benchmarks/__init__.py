@@ -0,0 +1 @@
+"""負荷試験ハーネス"""
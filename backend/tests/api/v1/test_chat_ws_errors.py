@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.api.v1.endpoints.chat import get_compaction_worker, get_llm_router
+from app.main import app
+from app.services.chat.compaction import CompactionWorker
+from app.services.chat.message_writer import MessageWriter, get_message_writer
+from app.services.llm import registry
+from app.services.llm.health import ModelHealth
+from app.services.llm.http_provider import HTTPLLMProvider
+from app.services.routing.core.llm_router import LLMRouter
+from tests.api.v1.test_chat_ws_sessions import _conversation, _Socket
+from tests.conftest import TestingSessionLocal
+
+MODEL = "mock:fast?ttft_ms=0&inter_token_ms=0&reply_tokens=3"
+
+
+@pytest.fixture
+def http_llm(client, monkeypatch):
+    """会話のモデルを MockTransport 越しの HTTP プロバイダに向ける（handler を差し替えて使う）"""
+    handlers = {}
+
+    async def dispatch(request: httpx.Request) -> httpx.Response:
+        return await handlers["handler"](request)
+
+    provider = HTTPLLMProvider(
+        "http://llm", client=httpx.AsyncClient(transport=httpx.MockTransport(dispatch), base_url="http://llm")
+    )
+    # "mock:" で始まるモデルも http プロバイダに解決させる
+    monkeypatch.setattr(registry, "provider_kind", lambda model: "http")
+    monkeypatch.setitem(registry._providers, "http", provider)
+    app.dependency_overrides[get_message_writer] = lambda: MessageWriter(TestingSessionLocal, mode="sync")
+    app.dependency_overrides[get_compaction_worker] = lambda: CompactionWorker(TestingSessionLocal)
+    app.dependency_overrides[get_llm_router] = lambda: LLMRouter(health=ModelHealth())
+    yield provider, handlers
+
+
+@pytest.mark.asyncio
+async def test_network_error_is_sent_as_error_frame(db, http_llm):
+    provider, handlers = http_llm
+
+    async def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    handlers["handler"] = refuse
+    conversation_id = await _conversation(db)
+    sock = _Socket("/api/v1/ws/ws/chat", f"conversation_id={conversation_id}")
+    try:
+        assert (await sock.event())["type"] == "websocket.accept"
+        sock.send({"type": "user_message", "text": "hello"})
+        assert json.loads((await sock.event())["text"])["type"] == "assistant_start"
+        frame = json.loads((await sock.event())["text"])
+        assert frame["type"] == "error" and "ConnectError" in frame["message"]
+
+        # 接続は閉じず、次のターンも受け付ける
+        sock.send({"type": "user_message", "text": "again"})
+        assert json.loads((await sock.event())["text"])["type"] == "assistant_start"
+        assert json.loads((await sock.event())["text"])["type"] == "error"
+        assert not sock.task.done()
+    finally:
+        await sock.close()
+    assert provider.admission.in_flight(MODEL) == 0
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_llm_call(db, http_llm):
+    provider, handlers = http_llm
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def hang(request: httpx.Request) -> httpx.Response:
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    handlers["handler"] = hang
+    conversation_id = await _conversation(db)
+    sock = _Socket("/api/v1/ws/ws/chat", f"conversation_id={conversation_id}")
+    assert (await sock.event())["type"] == "websocket.accept"
+    sock.send({"type": "user_message", "text": "hello"})
+    await asyncio.wait_for(started.wait(), timeout=10)
+    assert provider.admission.in_flight(MODEL) == 1
+
+    await sock.close()
+    assert cancelled.is_set()
+    assert provider.admission.in_flight(MODEL) == 0
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1.endpoints.chat import get_compaction_worker
+from app.core.database import build_engine, get_session_factory
+from app.main import app
+from app.models.models import AIAssistant, User
+from app.models.phase2_models import Conversation
+from app.services.chat.compaction import CompactionWorker
+from app.services.chat.message_writer import MessageWriter, get_message_writer
+from tests.conftest import TEST_DATABASE_URL
+
+IDLE_SOCKETS = 1000
+POOL_SIZE = 2
+
+
+class _Socket:
+    """ASGI の websocket スコープを直接叩く最小のクライアント（接続ごとにスレッドを作らない）"""
+
+    def __init__(self, path: str, query: str):
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.outbound: asyncio.Queue = asyncio.Queue()
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [],
+            "subprotocols": [],
+            "server": ("test", 80),
+            "client": ("test", 50000),
+        }
+        self.inbound.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.ensure_future(app(scope, self.inbound.get, self.outbound.put))
+
+    async def event(self) -> dict:
+        return await asyncio.wait_for(self.outbound.get(), timeout=30)
+
+    def send(self, payload: dict) -> None:
+        self.inbound.put_nowait({"type": "websocket.receive", "text": json.dumps(payload)})
+
+    async def close(self) -> None:
+        self.inbound.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, timeout=30)
+
+
+async def _conversation(db: AsyncSession) -> uuid.UUID:
+    user = (await db.execute(select(User))).scalars().first()
+    assistant = AIAssistant(
+        user_id=user.id,
+        name="ws",
+        default_llm_model="mock:fast?ttft_ms=0&inter_token_ms=0&reply_tokens=3",
+    )
+    db.add(assistant)
+    await db.flush()
+    conversation_id = uuid.uuid4()
+    db.add(Conversation(id=conversation_id, assistant_id=assistant.id, user_id=user.id))
+    await db.commit()
+    return conversation_id
+
+
+@pytest.mark.asyncio
+async def test_idle_sockets_do_not_hold_connections(db):
+    conversation_id = await _conversation(db)
+    # max_overflow=0: 接続を握ったまま待つ実装なら 3 本目以降がプール待ちでタイムアウトする
+    engine = build_engine(TEST_DATABASE_URL, pool_size=POOL_SIZE, max_overflow=0, pool_timeout=5)
+    sessions = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    writer = MessageWriter(sessions, mode="sync")
+    app.dependency_overrides[get_session_factory] = lambda: sessions
+    app.dependency_overrides[get_message_writer] = lambda: writer
+    app.dependency_overrides[get_compaction_worker] = lambda: CompactionWorker(sessions)
+    lookups = []
+    event.listen(engine.sync_engine, "after_cursor_execute", lambda *args: lookups.append(1))
+    sockets = []
+    try:
+        sockets = [_Socket("/api/v1/ws/ws/chat", f"conversation_id={conversation_id}") for _ in range(IDLE_SOCKETS)]
+        accepted = await asyncio.gather(*(s.event() for s in sockets))
+        assert all(e["type"] == "websocket.accept" for e in accepted)
+        # accept の後に会話を引くので、全接続のクエリが終わって受信待ちに入るまで待つ
+        for _ in range(1000):
+            if len(lookups) >= IDLE_SOCKETS:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        assert len(lookups) == IDLE_SOCKETS
+        pool = engine.sync_engine.pool
+        assert all(not s.task.done() for s in sockets)
+        assert pool.checkedout() == 0
+        assert pool.checkedin() <= POOL_SIZE
+        assert pool.stats()["timeouts"] == 0
+
+        # 待機中の接続の 1 本でそのまま 1 ターン進められる
+        sock = sockets[0]
+        sock.send({"type": "user_message", "text": "hello"})
+        frames = []
+        while not frames or frames[-1]["type"] not in ("assistant_end", "error"):
+            frames.append(json.loads((await sock.event())["text"]))
+        assert frames[0]["type"] == "assistant_start"
+        assert frames[-1]["type"] == "assistant_end" and frames[-1]["message"]
+        assert pool.checkedout() == 0
+        assert pool.checkedin() <= POOL_SIZE
+    finally:
+        await asyncio.gather(*(s.close() for s in sockets), return_exceptions=True)
+        app.dependency_overrides.clear()
+        await engine.dispose()
@@ -0,0 +1,112 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import Response
+from httpx import AsyncClient
+from sqlalchemy import insert
+
+from app.api.v1.endpoints.conversations import list_messages
+from app.core.config import settings
+from app.models.phase2_models import Message
+from tests.conftest import TestingSessionLocal, engine
+
+
+async def _conversation_with_messages(client: AsyncClient, n: int) -> str:
+    a = await client.post("/api/v1/assistants/", json={"name": "PageBot"})
+    c = await client.post("/api/v1/conversations/", json={"assistant_id": a.json()["id"]})
+    conv_id = c.json()["id"]
+    # 同一時刻のメッセージを混ぜて (created_at, id) の id 側の順序も検証する
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "conversation_id": uuid.UUID(conv_id),
+            "role": "user",
+            "content": f"m{i}",
+            "created_at": base + timedelta(seconds=i // 2),
+            "updated_at": base,
+        }
+        for i in range(n)
+    ]
+    async with TestingSessionLocal() as s:
+        await s.execute(insert(Message).values(rows))
+        await s.commit()
+    return conv_id
+
+
+def _ids(resp):
+    return [m["id"] for m in resp.json()]
+
+
+@pytest.mark.asyncio
+async def test_forward_and_backward_keyset_paging(client: AsyncClient):
+    conv_id = await _conversation_with_messages(client, 7)
+    url = f"/api/v1/conversations/{conv_id}/messages"
+    everything = await client.get(url)
+    assert everything.status_code == 200
+    all_ids = _ids(everything)
+    assert len(all_ids) == 7
+    assert "x-next-cursor" not in everything.headers
+
+    # after で先頭から 3 件ずつ
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"after": cursor} if cursor else {})}
+        r = await client.get(url, params=params)
+        assert r.status_code == 200
+        pages.append(_ids(r))
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert sum(pages, []) == all_ids
+
+    # before で末尾側から遡る
+    first4 = await client.get(url, params={"limit": 4})
+    last_page = await client.get(url, params={"limit": 3, "after": first4.headers["x-next-cursor"]})
+    assert _ids(last_page) == all_ids[4:]
+    prev = await client.get(url, params={"limit": 3, "before": last_page.headers["x-prev-cursor"]})
+    assert _ids(prev) == all_ids[1:4]
+    assert "x-next-cursor" in prev.headers
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson_and_errors(client: AsyncClient):
+    conv_id = await _conversation_with_messages(client, 5)
+    url = f"/api/v1/conversations/{conv_id}/messages"
+    all_ids = _ids(await client.get(url))
+
+    r = await client.get(url, params={"stream": "true"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [m["id"] for m in lines] == all_ids
+
+    first2 = await client.get(url, params={"limit": 2})
+    rest = await client.get(url, params={"stream": "true", "after": first2.headers["x-next-cursor"]})
+    assert [json.loads(line)["id"] for line in rest.text.splitlines()] == all_ids[2:]
+
+    assert (await client.get(url, params={"after": "not-a-cursor"})).status_code == 400
+    missing = f"/api/v1/conversations/{uuid.uuid4()}/messages"
+    assert (await client.get(missing)).status_code == 404
+    assert (await client.get(missing, params={"stream": "true"})).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_body_does_not_use_the_request_session(client: AsyncClient, monkeypatch):
+    conv_id = await _conversation_with_messages(client, 5)
+    # 複数回に分けて読ませる（本文の途中でも DB を読む）
+    monkeypatch.setattr(settings, "MESSAGE_STREAM_YIELD_PER", 2)
+    # FastAPI 0.106 以降と同じく、本文を流す前にリクエストのセッションを閉じる
+    async with TestingSessionLocal() as db:
+        response = await list_messages(
+            uuid.UUID(conv_id), Response(), before=None, after=None, limit=None, stream=True,
+            db=db, sessions=TestingSessionLocal,
+        )
+    checked_out = engine.sync_engine.pool.checkedout()
+    lines = [json.loads(line) async for chunk in response.body_iterator for line in chunk.splitlines()]
+    assert sorted(m["content"] for m in lines) == [f"m{i}" for i in range(5)]
+    # 本文が開いたセッションは読み終わりで返している
+    assert engine.sync_engine.pool.checkedout() == checked_out
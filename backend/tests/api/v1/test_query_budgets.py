@@ -0,0 +1,69 @@
+import pytest
+from httpx import AsyncClient
+from structlog.testing import capture_logs
+
+from app.core import query_stats
+from app.core.config import settings
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_endpoint_query_budgets(client: AsyncClient, query_budget):
+    # 既定ユーザーの解決（初回だけ）+ INSERT ... RETURNING
+    with query_budget(2, "create_assistant"):
+        created = await client.post("/api/v1/assistants/", json={"name": "Budget"})
+    assert created.status_code == 201
+    aid = created.json()["id"]
+
+    with query_budget(1, "read_assistant"):
+        assert (await client.get(f"/api/v1/assistants/{aid}")).status_code == 200
+    # 2 回目はキャッシュから
+    with query_budget(0, "read_assistant (cached)"):
+        assert (await client.get(f"/api/v1/assistants/{aid}")).status_code == 200
+
+    with query_budget(1, "create_conversation"):
+        conv = await client.post("/api/v1/conversations/", json={"assistant_id": aid})
+    assert conv.status_code == 201
+    cid = conv.json()["id"]
+
+    with query_budget(1, "add_message"):
+        added = await client.post(f"/api/v1/conversations/{cid}/messages", json={"role": "user", "content": "hi"})
+    assert added.status_code == 201
+
+    with query_budget(1, "list_messages"):
+        listed = await client.get(f"/api/v1/conversations/{cid}/messages")
+    assert listed.status_code == 200 and len(listed.json()) == 1
+
+    with query_budget(1, "update_assistant"):
+        assert (await client.put(f"/api/v1/assistants/{aid}", json={"description": "d"})).status_code == 200
+    with query_budget(1, "delete_assistant"):
+        assert (await client.delete(f"/api/v1/assistants/{aid}")).status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(client: AsyncClient):
+    created = await client.post("/api/v1/assistants/", json={"name": "Timing"})
+    timing = created.headers["server-timing"]
+    assert timing.startswith("db;dur=") and "queries" in timing
+    # SQL を流さないエンドポイントは 0 件
+    health = await client.get("/health")
+    assert '"0 queries, 0 rows"' in health.headers["server-timing"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_statement_is_reported_as_n_plus_one(db, monkeypatch):
+    from sqlalchemy import select
+
+    from app.models.models import User
+
+    monkeypatch.setattr(settings, "DB_N_PLUS_ONE_THRESHOLD", 3)
+    with capture_logs() as logs:
+        with query_stats.observe("db_test", case="n+1") as stats:
+            async with TestingSessionLocal() as session:
+                for _ in range(3):
+                    await session.execute(select(User.id).where(User.email == "admin@example.com"))
+    assert stats.queries == 3 and stats.rows == 3
+    events = {e["event"]: e for e in logs}
+    assert events["db_test"]["queries"] == 3
+    assert events["n_plus_one_suspected"]["count"] == 3
+    assert events["n_plus_one_suspected"]["case"] == "n+1"
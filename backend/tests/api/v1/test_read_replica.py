@@ -0,0 +1,106 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import database, query_stats
+from app.core.config import settings
+from app.core.database import STICKY_COOKIE, get_async_read_db, get_read_session_factory
+from app.main import app
+from app.services.assistants.cache import get_assistant_cache
+from app.services.chat.message_writer import MessageWriter, build_message_row
+from tests.conftest import TEST_DATABASE_URL, TestingSessionLocal
+
+
+@pytest.fixture
+async def replica(client, monkeypatch):
+    """同じ DSN の別エンジンをレプリカに見立てる（query_stats の engines["replica"] で数える）"""
+    engine = create_async_engine(TEST_DATABASE_URL, logging_name="replica")
+    query_stats.install(engine)
+    monkeypatch.setattr(
+        database,
+        "AsyncReadSessionLocal",
+        async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, info={"replica": True}),
+    )
+    monkeypatch.setattr(database, "AsyncSessionLocal", TestingSessionLocal)
+    app.dependency_overrides.pop(get_async_read_db, None)
+    app.dependency_overrides.pop(get_read_session_factory, None)
+    yield
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_until_the_client_writes(client: AsyncClient, replica):
+    async with AsyncClient(app=app, base_url="http://test") as other:
+        # 書き込みの無いクライアントはレプリカで読む（ルーティングの POST も書き込みではない）
+        with query_stats.collect() as stats:
+            routed = await other.post(
+                "/api/v1/routing/route",
+                json={"prompt": "hello", "assistant_id": "00000000-0000-0000-0000-000000000000"},
+            )
+            assert routed.status_code == 200
+            assert STICKY_COOKIE not in routed.headers.get("set-cookie", "")
+            listed = await other.get("/api/v1/assistants/")
+            assert listed.status_code == 200 and listed.json() == []
+        assert stats.engines["replica"] > 0
+
+    created = await client.post("/api/v1/assistants/", json={"name": "R"})
+    assert created.status_code == 201
+    assert STICKY_COOKIE in created.headers["set-cookie"]
+    aid = created.json()["id"]
+
+    # 書き込んだクライアントはしばらくプライマリで読む（自分の書き込みが必ず見える）
+    with query_stats.collect() as stats:
+        fetched = await client.get(f"/api/v1/assistants/{aid}")
+    assert fetched.status_code == 200 and fetched.json()["name"] == "R"
+    assert stats.queries > 0 and stats.engines["replica"] == 0
+
+    async with AsyncClient(app=app, base_url="http://test") as other:
+        cache = get_assistant_cache()
+        cache.invalidate_local()
+        with query_stats.collect() as stats:
+            listed = await other.get("/api/v1/assistants/")
+        assert listed.status_code == 200
+        assert stats.engines["replica"] == stats.queries > 0
+        # 無効化直後にレプリカから読んだ一覧はキャッシュに戻さない（遅延で古いかもしれない）
+        assert cache.stats()["lists"] == 0
+
+        conv = await client.post("/api/v1/conversations/", json={"assistant_id": aid})
+        with query_stats.collect() as stats:
+            messages = await other.get(f"/api/v1/conversations/{conv.json()['id']}/messages")
+        assert messages.status_code == 200
+        assert stats.engines["replica"] == stats.queries > 0
+
+
+@pytest.mark.asyncio
+async def test_cross_origin_writes_can_carry_the_sticky_cookie(client: AsyncClient, replica):
+    # フロントエンド（別オリジン）が credentials 付きで受け取れるよう、"*" ではなくオリジンを返す
+    origin = settings.cors_origins_list[0]
+    created = await client.post("/api/v1/assistants/", json={"name": "C"}, headers={"Origin": origin})
+    assert created.status_code == 201
+    assert created.headers["access-control-allow-origin"] == origin
+    assert created.headers["access-control-allow-credentials"] == "true"
+    assert STICKY_COOKIE in created.headers["set-cookie"]
+
+
+@pytest.mark.asyncio
+async def test_chat_writes_make_the_conversation_read_from_primary(client: AsyncClient, replica, monkeypatch):
+    aid = (await client.post("/api/v1/assistants/", json={"name": "W"})).json()["id"]
+    conv_id = (await client.post("/api/v1/conversations/", json={"assistant_id": aid})).json()["id"]
+    # WebSocket のチャットと同じ経路（ライタ）で書く。クッキーは付かない
+    writer = MessageWriter(TestingSessionLocal, mode="sync")
+    await writer.persist([build_message_row(uuid.UUID(conv_id), "user", "hi")])
+
+    async with AsyncClient(app=app, base_url="http://test") as other:
+        with query_stats.collect() as stats:
+            messages = await other.get(f"/api/v1/conversations/{conv_id}/messages")
+        assert [m["content"] for m in messages.json()] == ["hi"]
+        assert stats.queries > 0 and stats.engines["replica"] == 0
+
+        # 期限が過ぎればレプリカに戻る
+        monkeypatch.setattr(settings, "DATABASE_READ_STICKY_SECONDS", 0.0)
+        with query_stats.collect() as stats:
+            messages = await other.get(f"/api/v1/conversations/{conv_id}/messages")
+        assert messages.status_code == 200
+        assert stats.engines["replica"] == stats.queries > 0
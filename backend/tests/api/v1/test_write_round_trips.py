@@ -0,0 +1,87 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.models.phase2_models import Conversation, Message
+from tests.conftest import TestingSessionLocal
+
+
+def _only(stats) -> str:
+    """ちょうど 1 本だけ流れた SQL"""
+    assert stats.queries == 1, list(stats.statements)
+    return next(iter(stats.statements))
+
+
+@pytest.mark.asyncio
+async def test_writes_take_one_statement(client: AsyncClient, query_budget):
+    # 既定ユーザーの解決（プロセスで 1 回だけ）を済ませておく
+    await client.get("/api/v1/users/default")
+    with query_budget(1, "create_assistant") as q:
+        created = await client.post("/api/v1/assistants/", json={"name": "RT"})
+    assert created.status_code == 201
+    assert "RETURNING" in _only(q)
+    aid = created.json()["id"]
+
+    with query_budget(1, "update_assistant") as q:
+        updated = await client.put(f"/api/v1/assistants/{aid}", json={"description": "d"})
+    assert updated.status_code == 200 and updated.json()["description"] == "d"
+    assert _only(q).startswith("UPDATE")
+
+    with query_budget(1, "create_conversation") as q:
+        conv = await client.post(
+            "/api/v1/conversations/", json={"assistant_id": aid, "title": "t", "metadata": {"k": 1}}
+        )
+    assert conv.status_code == 201
+    assert conv.json()["user_id"] == created.json()["user_id"]
+    assert _only(q).startswith("INSERT")
+    cid = conv.json()["id"]
+
+    with query_budget(1, "add_message") as q:
+        msg = await client.post(f"/api/v1/conversations/{cid}/messages", json={"role": "user", "content": "hi"})
+    assert msg.status_code == 201 and msg.json()["token_count"] > 0
+    assert q.queries == 1
+
+    with query_budget(1, "delete_assistant") as q:
+        assert (await client.delete(f"/api/v1/assistants/{aid}")).status_code == 204
+    assert _only(q).startswith("DELETE")
+
+    async with TestingSessionLocal() as s:
+        # 会話・メッセージは DB の ON DELETE CASCADE で消える
+        assert (await s.execute(select(Conversation.id))).first() is None
+        assert (await s.execute(select(Message.id))).first() is None
+
+
+@pytest.mark.asyncio
+async def test_missing_targets_still_404(client: AsyncClient):
+    missing = uuid.uuid4()
+    assert (await client.put(f"/api/v1/assistants/{missing}", json={"name": "x"})).status_code == 404
+    assert (await client.put(f"/api/v1/assistants/{missing}", json={})).status_code == 404
+    assert (await client.delete(f"/api/v1/assistants/{missing}")).status_code == 404
+    resp = await client.post("/api/v1/conversations/", json={"assistant_id": str(missing)})
+    assert resp.status_code == 404 and resp.json() == {"detail": "Assistant not found"}
+    resp = await client.post(f"/api/v1/conversations/{missing}/messages", json={"role": "user", "content": "hi"})
+    assert resp.status_code == 404 and resp.json() == {"detail": "Conversation not found"}
+    resp = await client.post(f"/api/v1/conversations/{missing}/messages", json={"role": "user", "content": ""})
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_empty_update_reads_without_touching_updated_at(client: AsyncClient, query_budget):
+    aid = (await client.post("/api/v1/assistants/", json={"name": "Same"})).json()["id"]
+    before = (await client.get(f"/api/v1/assistants/{aid}")).json()
+    with query_budget(1, "empty_update") as q:
+        resp = await client.put(f"/api/v1/assistants/{aid}", json={})
+    assert resp.status_code == 200 and resp.json() == before
+    assert _only(q).startswith("SELECT")
+
+
+@pytest.mark.asyncio
+async def test_conversation_metadata_is_stored(client: AsyncClient):
+    aid = (await client.post("/api/v1/assistants/", json={"name": "Meta"})).json()["id"]
+    cid = (await client.post("/api/v1/conversations/", json={"assistant_id": aid, "metadata": {"k": 1}})).json()["id"]
+    plain = (await client.post("/api/v1/conversations/", json={"assistant_id": aid})).json()["id"]
+    async with TestingSessionLocal() as s:
+        assert (await s.get(Conversation, uuid.UUID(cid))).meta == {"k": 1}
+        assert (await s.get(Conversation, uuid.UUID(plain))).meta == {}
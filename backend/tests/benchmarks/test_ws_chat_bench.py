@@ -0,0 +1,46 @@
+from benchmarks.ws_chat_bench import compare_results, parse_args, percentiles
+
+
+def test_percentiles_nearest_rank():
+    stats = percentiles([float(i) for i in range(1, 101)])
+    assert stats["count"] == 100
+    assert (stats["p50"], stats["p95"], stats["p99"], stats["max"]) == (50.0, 95.0, 99.0, 100.0)
+    assert stats["mean"] == 50.5
+    assert percentiles([])["p50"] is None
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {"summary": {
+        "ttft_ms": {"p50": 100.0, "p95": 200.0, "p99": 300.0},
+        "turns_per_sec": 50.0,
+        "error_rate": 0.0,
+    }}
+    within = {"summary": {
+        "ttft_ms": {"p50": 105.0, "p95": 190.0, "p99": 320.0},
+        "turns_per_sec": 48.0,
+        "error_rate": 0.0,
+    }}
+    assert compare_results(baseline, within, tolerance=0.10) == []
+
+    worse = {"summary": {
+        "ttft_ms": {"p50": 100.0, "p95": 260.0, "p99": 300.0},
+        "turns_per_sec": 30.0,
+        "error_rate": 0.05,
+    }}
+    regressions = compare_results(baseline, worse, tolerance=0.10)
+    assert any(r.startswith("ttft_ms.p95") for r in regressions)
+    assert any(r.startswith("turns_per_sec") for r in regressions)
+    assert any(r.startswith("error_rate") for r in regressions)
+
+
+def test_parse_args_defaults():
+    args = parse_args(["--connections", "10", "--protocol", "msgpack"])
+    assert args.connections == 10
+    assert args.protocol == "msgpack"
+    assert args.model == "mock:fast"
+
+
+def test_compare_ignores_tiny_absolute_deltas():
+    baseline = {"summary": {"client_loop_lag_ms": {"p50": 0.5, "p95": 1.0, "p99": 1.5}}}
+    current = {"summary": {"client_loop_lag_ms": {"p50": 0.9, "p95": 2.0, "p99": 6.0}}}
+    assert compare_results(baseline, current, tolerance=0.10) == ["client_loop_lag_ms.p99: 1.5 -> 6.0 (+300.0%)"]
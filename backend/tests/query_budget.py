@@ -0,0 +1,31 @@
+"""エンドポイントごとのクエリ数の上限を検査する pytest プラグイン（conftest の pytest_plugins で有効化）
+
+    async def test_list(client, query_budget):
+        with query_budget(1, "list_messages"):
+            await client.get(f"/api/v1/conversations/{cid}/messages")
+
+上限を超えたら流れた SQL を並べて失敗にする。計測対象のエンジンには
+app.core.query_stats.install() を呼んでおくこと（アプリのエンジンは database.py で済んでいる）。
+"""
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import pytest
+
+from app.core import query_stats
+
+
+@pytest.fixture
+def query_budget():
+    @contextmanager
+    def budget(max_queries: int, label: Optional[str] = None) -> Iterator[query_stats.QueryStats]:
+        with query_stats.collect() as stats:
+            yield stats
+        if stats.queries > max_queries:
+            statements = "\n".join(f"  {n} x {s}" for s, n in stats.statements.items())
+            pytest.fail(
+                f"{label or 'block'}: {stats.queries} queries (budget {max_queries})\n{statements}",
+                pytrace=False,
+            )
+
+    return budget
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.embeddings import HashingEmbedder
+from app.services.routing import agent_index as agent_index_module
+from app.services.routing.agent_index import AgentIndex, parse_agent_file
+from app.services.routing.core.agent_selector import DEFAULT_AGENT, AgentSelector
+from app.services.routing.models.routing_models import AnalyzedTask
+
+
+def _write_agent(path, name, description, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        f"---\nname: {name}\ndescription: {description} Examples:\\n\\n<example>\n"
+        f'user: "unrelated chatter"\n</example>\ncolor: blue\ntools: Read\n---\n\nbody\n',
+        encoding="utf-8",
+    )
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_parse_front_matter_with_multiline_description(tmp_path):
+    path = tmp_path / "engineering" / "api-tester.md"
+    _write_agent(path, "api-tester", "Use this agent for API load testing.")
+    doc = parse_agent_file(path, tmp_path)
+    assert doc.name == "api-tester"
+    assert doc.category == "engineering"
+    assert doc.description.startswith("Use this agent for API load testing. Examples:")
+    assert "<example>" not in doc.description and 'user: "unrelated chatter"' in doc.description
+    (tmp_path / "plain.md").write_text("# no front matter\n", encoding="utf-8")
+    assert parse_agent_file(tmp_path / "plain.md", tmp_path) is None
+
+
+def test_embedder_is_normalized_and_deterministic():
+    emb = HashingEmbedder(dim=256)
+    a = emb.embed(["schedule a meeting", "会議を設定して", ""])
+    assert a.shape == (3, 256) and a.dtype == np.float32
+    assert np.allclose(np.linalg.norm(a[:2], axis=1), 1.0)
+    assert not a[2].any()
+    assert np.array_equal(a, HashingEmbedder(dim=256).embed(["schedule a meeting", "会議を設定して", ""]))
+
+
+def test_search_and_incremental_reload(tmp_path):
+    _write_agent(tmp_path / "design" / "ui-designer.md", "ui-designer", "Design user interfaces and screens.", 1000)
+    _write_agent(tmp_path / "engineering" / "devops.md", "devops-automator", "Automate CI/CD deployment pipelines.", 1000)
+    # 説明の無いファイルは索引に入らず、変更が無い限り再構築の理由にもならない
+    (tmp_path / "notes.md").write_text("no front matter\n", encoding="utf-8")
+    changes = []
+    index = AgentIndex(str(tmp_path), embedder=HashingEmbedder(dim=256), reload_interval=0, on_change=lambda: changes.append(1))
+    assert index.refresh(force=True)
+
+    (first, second), = index.search_many(["set up a deployment pipeline"], k=2)
+    assert first[0].name == "devops-automator" and first[1] > second[1]
+    assert [hits[0][0].name for hits in index.search_many(["design the settings screen", "automate our deployment"], k=1)] == [
+        "ui-designer",
+        "devops-automator",
+    ]
+
+    # 変更がなければ再構築しない
+    assert not index.refresh()
+    _write_agent(tmp_path / "testing" / "api-tester.md", "api-tester", "Load test and benchmark APIs.", 2000)
+    (tmp_path / "design" / "ui-designer.md").unlink()
+    assert index.refresh()
+    assert sorted(d.name for d in index.docs) == ["api-tester", "devops-automator"]
+    assert index.matrix.shape == (2, 256)
+    assert index.search("benchmark the api", k=1)[0][0].name == "api-tester"
+    assert len(changes) == 1
+
+
+@pytest.mark.asyncio
+async def test_selector_uses_studio_library_and_falls_back(monkeypatch, tmp_path):
+    library = AgentIndex(settings.STUDIO_AGENTS_DIR, embedder=HashingEmbedder(dim=1024))
+    library.refresh(force=True)
+    monkeypatch.setattr(agent_index_module, "_index", library)
+    selector = AgentSelector(db=None)
+    task = AnalyzedTask(keywords=[], intent="unknown", text="set up a CI/CD deployment pipeline")
+    agent = await selector.select_agent(task)
+    assert agent.name == "devops-automator"
+    assert agent.file_path == "tools/studio-agents/engineering/devops-automator.md"
+
+    monkeypatch.setattr(agent_index_module, "_index", AgentIndex(str(tmp_path / "missing")))
+    assert await selector.select_agent(task) is DEFAULT_AGENT
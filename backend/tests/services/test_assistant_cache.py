@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from app.services.assistants.cache import AssistantCache, etag_matches
+from tests.conftest import TestingSessionLocal
+
+
+def test_etag_matching():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches('"a"', '"b"') and not etag_matches(None, '"b"')
+
+
+@pytest.mark.asyncio
+async def test_read_through_etag_and_invalidation(client: AsyncClient, query_budget):
+    aid = (await client.post("/api/v1/assistants/", json={"name": "Cached"})).json()["id"]
+    url = f"/api/v1/assistants/{aid}"
+
+    first = await client.get(url)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json()["name"] == "Cached"
+    with query_budget(0, "cached read"):
+        again = await client.get(url)
+        not_modified = await client.get(url, headers={"If-None-Match": etag})
+    assert again.json() == first.json()
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    listed = await client.get("/api/v1/assistants/")
+    with query_budget(0, "cached list"):
+        assert (await client.get("/api/v1/assistants/", headers={"If-None-Match": listed.headers["etag"]})).status_code == 304
+
+    # 更新コミットでエントリが捨てられ、ETag も変わる
+    assert (await client.put(url, json={"description": "changed"})).status_code == 200
+    changed = await client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["description"] == "changed"
+    assert changed.headers["etag"] != etag
+    relisted = await client.get("/api/v1/assistants/", headers={"If-None-Match": listed.headers["etag"]})
+    assert relisted.status_code == 200 and relisted.json()[0]["description"] == "changed"
+
+    assert (await client.delete(url)).status_code == 204
+    assert (await client.get(url)).status_code == 404
+    assert (await client.get("/api/v1/assistants/")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_keeps_workers_coherent(client: AsyncClient, query_budget):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    a = AssistantCache(redis=fakeredis.FakeAsyncRedis(server=server))
+    b = AssistantCache(redis=fakeredis.FakeAsyncRedis(server=server))
+    await b.start()
+    try:
+        aid = uuid.UUID((await client.post("/api/v1/assistants/", json={"name": "Shared"})).json()["id"])
+        async with TestingSessionLocal() as s:
+            cached = await a.get(s, aid)
+            # b は Postgres を読まずに Redis から埋める
+            with query_budget(0, "redis fill"):
+                assert (await b.get(s, aid)) == cached
+            assert b.l2_hits == 1
+
+        # a のワーカーでの変更が b の手元のエントリにも届く
+        await a.publish({aid})
+        for _ in range(50):
+            if aid not in b._entries:
+                break
+            await asyncio.sleep(0.02)
+        assert aid not in b._entries
+        assert await a.redis.get(f"assistant:{aid}") is None
+    finally:
+        await b.stop()
@@ -0,0 +1,188 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.models.models import AIAssistant, User
+from app.models.phase2_models import Conversation, Message
+from app.services.chat.compaction import (
+    SUMMARY_HEADER,
+    CompactionWorker,
+    ExtractiveSummarizer,
+    LLMSummarizer,
+    compact_conversation,
+)
+from app.services.chat.context import SUMMARY_KIND, ContextBuilder
+from app.services.chat.message_writer import build_message_row
+from tests.conftest import TestingSessionLocal, engine
+
+TOPICS = ["flight to Osaka", "hotel booking", "budget report", "team meeting"]
+
+OPTIONS = dict(threshold_tokens=600, keep_recent_tokens=150, summary_tokens=120)
+
+
+async def _seed(n_messages):
+    async with TestingSessionLocal() as s:
+        user_id = (await s.execute(select(User.id))).scalar_one()
+        assistant = AIAssistant(user_id=user_id, name="LongBot")
+        s.add(assistant)
+        await s.flush()
+        conv_id = uuid.uuid4()
+        await s.execute(insert(Conversation).values(id=conv_id, user_id=user_id, assistant_id=assistant.id))
+        base = datetime.now(timezone.utc) - timedelta(hours=1)
+        await s.execute(
+            insert(Message),
+            [
+                {
+                    "conversation_id": conv_id,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": f"Turn {i} is about the {TOPICS[i % 4]}. Please check the {TOPICS[i % 4]} details.",
+                    "created_at": base + timedelta(seconds=i),
+                }
+                for i in range(n_messages)
+            ],
+        )
+        await s.commit()
+    return conv_id
+
+
+@pytest.mark.asyncio
+async def test_below_threshold_is_left_alone(db):
+    conv_id = await _seed(4)
+    assert await compact_conversation(TestingSessionLocal, conv_id, **OPTIONS) is None
+
+
+@pytest.mark.asyncio
+async def test_compaction_writes_linked_summary_with_metrics(db):
+    conv_id = await _seed(40)
+    result = await compact_conversation(TestingSessionLocal, conv_id, summarizer=ExtractiveSummarizer(), **OPTIONS)
+    assert result is not None
+    assert 0 < result.compaction_ratio < 1
+    assert result.duration_ms >= 0
+    assert result.summary_tokens <= OPTIONS["summary_tokens"]
+
+    async with TestingSessionLocal() as s:
+        summary = await s.get(Message, result.summary_id)
+        last = await s.get(Message, summary.parent_message_id)
+    assert summary.role == "system"
+    assert summary.content.startswith(SUMMARY_HEADER)
+    assert summary.meta["kind"] == SUMMARY_KIND
+    assert summary.meta["source_messages"] == result.source_messages < 40
+    assert summary.meta["compaction_ratio"] == result.compaction_ratio
+    assert summary.meta["summarized_until"]["id"] == str(last.id)
+    assert last.content.startswith(f"Turn {result.source_messages - 1} ")
+
+
+@pytest.mark.asyncio
+async def test_context_uses_summary_instead_of_summarized_turns(db):
+    conv_id = await _seed(40)
+    builder = ContextBuilder()
+    async with TestingSessionLocal() as s:
+        before = await builder.history(s, conv_id)
+        assert len(before) == 40
+        result = await compact_conversation(TestingSessionLocal, conv_id, **OPTIONS)
+
+        # 別プロセスで要約された場合も、次の読み足しで要約に切り替わる
+        user = build_message_row(conv_id, "user", "what did we decide?")
+        messages = await builder.build(s, conv_id, model="mock:fast", pending=[user])
+
+    assert messages[0]["role"] == "system" and messages[0]["content"].startswith(SUMMARY_HEADER)
+    history = [m["content"] for m in messages[1:]]
+    assert len(history) == 40 - result.source_messages + 1
+    assert history[0].startswith(f"Turn {result.source_messages} ")
+    assert builder.unsummarized_tokens(conv_id) < OPTIONS["threshold_tokens"]
+
+
+@pytest.mark.asyncio
+async def test_rolling_compaction_folds_previous_summary(db):
+    conv_id = await _seed(40)
+    async with TestingSessionLocal() as s:
+        first = await compact_conversation(TestingSessionLocal, conv_id, **OPTIONS)
+        last = (await s.execute(select(Message.created_at).order_by(Message.created_at.desc()).limit(1))).scalar()
+        await s.execute(
+            insert(Message),
+            [
+                {
+                    "conversation_id": conv_id,
+                    "role": "user",
+                    "content": f"New question {i} about the quarterly budget report numbers.",
+                    "created_at": last + timedelta(seconds=i + 1),
+                }
+                for i in range(30)
+            ],
+        )
+        await s.commit()
+        second = await compact_conversation(TestingSessionLocal, conv_id, **OPTIONS)
+        summary = await s.get(Message, second.summary_id)
+    assert summary.meta["previous_summary_id"] == str(first.summary_id)
+    assert second.source_tokens > second.summary_tokens
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_scheduled_conversations_once(db):
+    conv_id = await _seed(40)
+    compacted = []
+    worker = CompactionWorker(TestingSessionLocal, on_compacted=compacted.append, **OPTIONS)
+    worker.schedule(conv_id)
+    worker.schedule(conv_id)
+    try:
+        for _ in range(100):
+            if worker.stats["runs"]:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await worker.stop()
+    assert compacted == [conv_id]
+    assert worker.stats["runs"] == 1 and worker.stats["compactions"] == 1
+    assert worker.snapshot()["last"]["compaction_ratio"] > 0
+
+
+@pytest.mark.asyncio
+async def test_llm_summarizer_uses_provider(db):
+    conv_id = await _seed(40)
+    result = await compact_conversation(TestingSessionLocal, conv_id, summarizer=LLMSummarizer("mock:fast"), **OPTIONS)
+    async with TestingSessionLocal() as s:
+        summary = await s.get(Message, result.summary_id)
+    assert result.summarizer == "llm"
+    assert summary.content.startswith(SUMMARY_HEADER) and len(summary.content) > len(SUMMARY_HEADER)
+
+
+class _RacingSummarizer(ExtractiveSummarizer):
+    """要約中に別のワーカーが同じ会話を要約し終えた状況を作る"""
+
+    def __init__(self, conv_id):
+        self.conv_id = conv_id
+        self.checked_out = None
+        self.other = None
+
+    async def summarize(self, previous, items, max_tokens):
+        self.checked_out = engine.sync_engine.pool.checkedout()
+        self.other = await compact_conversation(
+            TestingSessionLocal, self.conv_id, summarizer=ExtractiveSummarizer(), **OPTIONS
+        )
+        return await super().summarize(previous, items, max_tokens)
+
+
+@pytest.mark.asyncio
+async def test_summarizes_without_holding_a_connection_and_rechecks_before_writing(db):
+    conv_id = await _seed(40)
+    racing = _RacingSummarizer(conv_id)
+    assert await compact_conversation(TestingSessionLocal, conv_id, summarizer=racing, **OPTIONS) is None
+    # 要約中は接続もロックも持っていないので、別のワーカーはそのまま書き込める
+    assert racing.checked_out == 0
+    assert racing.other is not None
+    async with TestingSessionLocal() as s:
+        summaries = (await s.execute(select(Message.id).where(Message.role == "system"))).scalars().all()
+    assert summaries == [racing.other.summary_id]
+
+
+@pytest.mark.asyncio
+async def test_summary_rows_are_not_listed(client, db):
+    conv_id = await _seed(40)
+    assert await compact_conversation(TestingSessionLocal, conv_id, **OPTIONS) is not None
+    res = await client.get(f"/api/v1/conversations/{conv_id}/messages", params={"limit": 100})
+    assert res.status_code == 200
+    assert len(res.json()) == 40
+    assert all(m["role"] != "system" for m in res.json())
@@ -0,0 +1,155 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core import query_stats
+from app.models.models import AIAssistant, PersonalityTemplate, User
+from app.models.phase2_models import Conversation, Message
+from app.services.chat.context import ContextBuilder
+from app.services.chat.message_writer import MessageWriter, build_message_row
+from app.services.chat.tokens import MESSAGE_OVERHEAD_TOKENS, approx_token_count, prompt_budget
+from tests.conftest import TestingSessionLocal
+
+
+async def _seed(n_messages=0, system_prompt=None, template_prompt=None):
+    async with TestingSessionLocal() as s:
+        user_id = (await s.execute(select(User.id))).scalar_one()
+        template_id = None
+        if template_prompt:
+            template = PersonalityTemplate(user_id=user_id, name="Polite", system_prompt=template_prompt)
+            s.add(template)
+            await s.flush()
+            template_id = template.id
+        assistant = AIAssistant(
+            user_id=user_id, name="CtxBot", custom_system_prompt=system_prompt, personality_template_id=template_id
+        )
+        s.add(assistant)
+        await s.flush()
+        assistant_id = assistant.id
+        conv_id = uuid.uuid4()
+        await s.execute(insert(Conversation).values(id=conv_id, user_id=user_id, assistant_id=assistant_id))
+        base = datetime.now(timezone.utc) - timedelta(minutes=10)
+        if n_messages:
+            await s.execute(
+                insert(Message),
+                [
+                    {
+                        "conversation_id": conv_id,
+                        "role": "user" if i % 2 == 0 else "assistant",
+                        "content": f"message number {i} " + "word " * 20,
+                        "created_at": base + timedelta(seconds=i),
+                    }
+                    for i in range(n_messages)
+                ],
+            )
+        await s.commit()
+    return assistant_id, conv_id
+
+
+@pytest.mark.asyncio
+async def test_system_prompt_combines_template_and_custom_prompt(db):
+    assistant_id, conv_id = await _seed(system_prompt="Answer in Japanese.", template_prompt="You are polite.")
+    builder = ContextBuilder()
+    user = build_message_row(conv_id, "user", "hello")
+    async with TestingSessionLocal() as s:
+        messages = await builder.build(s, conv_id, model="mock:fast", assistant_id=assistant_id, pending=[user])
+    assert messages == [
+        {"role": "system", "content": "You are polite.\n\nAnswer in Japanese."},
+        {"role": "user", "content": "hello"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_system_prompt_cache_invalidated_on_commit(db):
+    assistant_id, conv_id = await _seed(system_prompt="v1")
+    from app.services.chat.context import context_builder
+
+    async with TestingSessionLocal() as s:
+        assert (await context_builder.system_prompt(s, assistant_id))[0] == "v1"
+        assistant = await s.get(AIAssistant, assistant_id)
+        assistant.custom_system_prompt = "v2"
+        await s.commit()
+        assert (await context_builder.system_prompt(s, assistant_id))[0] == "v2"
+
+
+@pytest.mark.asyncio
+async def test_history_is_trimmed_to_budget_newest_first(db):
+    assistant_id, conv_id = await _seed(n_messages=40, system_prompt="sys")
+    builder = ContextBuilder()
+    per_message = approx_token_count("message number 10 " + "word " * 20) + MESSAGE_OVERHEAD_TOKENS
+    user = build_message_row(conv_id, "user", "latest question")
+    budget = 10 * per_message
+    async with TestingSessionLocal() as s:
+        messages = await builder.build(
+            s, conv_id, model="mock:fast", assistant_id=assistant_id, pending=[user], budget=budget
+        )
+    assert messages[0] == {"role": "system", "content": "sys"}
+    assert messages[-1]["content"] == "latest question"
+    history = messages[1:-1]
+    assert 0 < len(history) < 10
+    # 直近の履歴が連続して残る
+    assert history[-1]["content"].startswith("message number 39 ")
+    first = int(history[0]["content"].split()[2])
+    assert [m["content"].split()[2] for m in history] == [str(i) for i in range(first, 40)]
+
+    used = sum(approx_token_count(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    assert used <= budget
+
+
+@pytest.mark.asyncio
+async def test_later_turns_read_only_the_new_tail(db):
+    assistant_id, conv_id = await _seed(n_messages=30)
+    builder = ContextBuilder(max_messages=50)
+    with query_stats.collect() as stats:
+        async with TestingSessionLocal() as s:
+            first = await builder.history(s, conv_id)
+            assert len(first) == 30
+            # 他の経路（REST など）で書かれた行
+            async with TestingSessionLocal() as other:
+                await other.execute(insert(Message).values(conversation_id=conv_id, role="user", content="from rest"))
+                await other.commit()
+            # このプロセスで書いた行（コミット前）
+            own = build_message_row(conv_id, "assistant", "own reply")
+            builder.append(conv_id, [own])
+            second = await builder.history(s, conv_id)
+
+    # 初回: 要約の確認 + 直近の窓、2 回目: 末尾より新しい行だけ
+    statements = [q for q in stats.statements if "FROM messages" in q]
+    assert [stats.statements[q] for q in statements] == [1, 1, 1]
+    assert all("LIMIT" in q for q in statements[:2])
+    assert "LIMIT" not in statements[2] and "created_at >=" in statements[2]
+    assert [i.content for i in second[:30]] == [i.content for i in first]
+    assert {i.content for i in second[30:]} == {"from rest", "own reply"}
+    assert len({i.id for i in second}) == len(second)
+
+
+@pytest.mark.asyncio
+async def test_stored_token_count_is_used(db):
+    _, conv_id = await _seed()
+    async with TestingSessionLocal() as s:
+        await s.execute(
+            insert(Message).values(conversation_id=conv_id, role="user", content="short", token_count=500)
+        )
+        await s.commit()
+    builder = ContextBuilder()
+    async with TestingSessionLocal() as s:
+        items = await builder.history(s, conv_id)
+    assert [i.tokens for i in items] == [500]
+
+
+@pytest.mark.asyncio
+async def test_writer_persists_token_count(db):
+    _, conv_id = await _seed()
+    writer = MessageWriter(TestingSessionLocal, mode="sync")
+    text = "こんにちは、world of tokens"
+    await writer.persist([build_message_row(conv_id, "user", text)])
+    async with TestingSessionLocal() as s:
+        stored = (await s.execute(select(Message.token_count).where(Message.conversation_id == conv_id))).scalar_one()
+    assert stored == approx_token_count(text) > 0
+
+
+def test_prompt_budget_reserves_reply_tokens():
+    assert 0 < prompt_budget("mock:fast") < prompt_budget("gpt-4o")
+    assert prompt_budget("unknown-model") == prompt_budget("mock:fast")
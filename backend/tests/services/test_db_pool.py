@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import exc, text
+
+from app.core.database import InstrumentedPool, build_engine, pool_stats
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_waits_and_timeouts():
+    engine = build_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=0.2)
+    try:
+        assert isinstance(engine.sync_engine.pool, InstrumentedPool)
+        async with engine.connect() as first:
+            await first.execute(text("SELECT 1"))
+            stats = pool_stats(engine)
+            assert (stats["size"], stats["checked_out"], stats["overflow"]) == (1, 1, 0)
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+
+        async def hold():
+            async with engine.connect() as c:
+                await c.execute(text("SELECT pg_sleep(0.05)"))
+
+        await asyncio.gather(hold(), hold())
+        stats = pool_stats(engine)
+        assert stats["timeouts"] == 1
+        assert stats["waits"] >= 2 and stats["wait_ms_max"] >= 30
+        assert stats["checked_out"] == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_idle_connections_are_checked_and_replaced():
+    engine = build_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0, idle_ping_seconds=0)
+    admin = build_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0, idle_ping_seconds=-1)
+    try:
+        async with engine.connect() as c:
+            pid = (await c.execute(text("SELECT pg_backend_pid()"))).scalar_one()
+        async with admin.connect() as a:
+            await a.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": pid})
+        await asyncio.sleep(0.05)
+        # 切れた接続は検査で捨てられ、新しい接続で取り直す
+        async with engine.connect() as c:
+            assert (await c.execute(text("SELECT pg_backend_pid()"))).scalar_one() != pid
+        stats = pool_stats(engine)
+        assert stats["idle_pings"] == 1 and stats["invalidated_on_checkout"] == 1
+    finally:
+        await engine.dispose()
+        await admin.dispose()
+
+
+@pytest.mark.asyncio
+async def test_fresh_connections_skip_the_ping():
+    engine = build_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0, idle_ping_seconds=60)
+    try:
+        for _ in range(3):
+            async with engine.connect() as c:
+                await c.execute(text("SELECT 1"))
+        assert pool_stats(engine)["idle_pings"] == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_health_db_endpoint(client: AsyncClient):
+    resp = await client.get("/health/db")
+    assert resp.status_code == 200
+    assert {"checked_out", "overflow", "waits", "wait_ms_max", "timeouts"} <= set(resp.json()["pool"])
@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+
+from app.core import query_stats
+from app.models.models import User
+from app.services.users.default_user import DefaultUserResolver, get_default_user_resolver
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_assistant_creation_does_not_query_users(client: AsyncClient):
+    resolver = get_default_user_resolver()
+    await client.post("/api/v1/assistants/", json={"name": "first"})
+    with query_stats.collect() as stats:
+        for i in range(3):
+            resp = await client.post("/api/v1/assistants/", json={"name": f"A{i}"})
+            assert resp.status_code == 201
+    assert [s for s in stats.statements if "FROM users" in s] == []
+    assert (await client.get("/api/v1/users/default")).json()["id"] == str(resolver.cached)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_resolution_creates_one_user(db):
+    await db.execute(text("DELETE FROM users"))
+    await db.commit()
+
+    async def resolve():
+        # 別プロセスを模して、リゾルバもセッションも別々にする
+        async with TestingSessionLocal() as s:
+            return await DefaultUserResolver().resolve(s, create=True)
+
+    ids = await asyncio.gather(*(resolve() for _ in range(5)))
+    assert len(set(ids)) == 1
+    assert await db.scalar(select(func.count()).select_from(User)) == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_default_user_is_resolved_again_on_fk_violation(client: AsyncClient, db):
+    resolver = get_default_user_resolver()
+    old = (await client.get("/api/v1/users/default")).json()["id"]
+    # 生 SQL での入れ替えは無効化フックに届かない
+    new = uuid.uuid4()
+    await db.execute(text("DELETE FROM users"))
+    await db.execute(
+        text(
+            "INSERT INTO users (id, username, email, password_hash, is_active, is_verified)"
+            " VALUES (:id, 'other', 'other@example.com', '!', true, true)"
+        ),
+        {"id": new},
+    )
+    await db.commit()
+    assert str(resolver.cached) == old
+
+    resp = await client.post("/api/v1/assistants/", json={"name": "after swap"})
+    assert resp.status_code == 201
+    assert resp.json()["user_id"] == str(new)
+    assert resolver.cached == new
+
+
+@pytest.mark.asyncio
+async def test_orm_user_changes_invalidate(db):
+    resolver = get_default_user_resolver()
+    async with TestingSessionLocal() as s:
+        first = await resolver.resolve(s)
+        assert first is not None
+        await s.delete(await s.get(User, first))
+        await s.commit()
+        assert resolver.cached is None
+        assert await resolver.resolve(s) is None
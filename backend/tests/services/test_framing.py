@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+
+from app.services.chat.framing import (
+    FrameCodec,
+    JSON_SUBPROTOCOL,
+    MSGPACK_SUBPROTOCOL,
+    MsgpackFrameCodec,
+    coalesce_tokens,
+    negotiate_codec,
+)
+
+
+async def _tokens(items, delay: float = 0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def _collect(agen):
+    return [chunk async for chunk in agen]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_every_n_tokens():
+    chunks = await _collect(coalesce_tokens(_tokens(list("abcdefg")), max_tokens=3, max_delay=10))
+    assert chunks == ["abc", "def", "g"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_on_byte_limit():
+    # 「あ」は UTF-8 で 3 バイト
+    chunks = await _collect(coalesce_tokens(_tokens(["あ", "い", "う", "x"]), max_tokens=100, max_bytes=6, max_delay=10))
+    assert chunks == ["あい", "うx"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_on_deadline_when_upstream_stalls():
+    async def stalled():
+        yield "a"
+        yield "b"
+        await asyncio.sleep(0.2)
+        yield "c"
+
+    chunks = await _collect(coalesce_tokens(stalled(), max_tokens=100, max_delay=0.02))
+    assert chunks == ["ab", "c"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_single_token_is_passthrough():
+    items = ["You ", "said: ", "hi "]
+    assert await _collect(coalesce_tokens(_tokens(items), max_tokens=1)) == items
+
+
+@pytest.mark.asyncio
+async def test_coalesce_closes_upstream_when_consumer_stops():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0)
+                yield "t"
+        finally:
+            closed.set()
+
+    agen = coalesce_tokens(endless(), max_tokens=2, max_delay=10)
+    assert await agen.__anext__() == "tt"
+    await agen.aclose()
+    assert closed.is_set()
+
+
+class _FakeWebSocket:
+    def __init__(self, subprotocols):
+        self.scope = {"subprotocols": subprotocols}
+
+
+def test_negotiate_defaults_to_json_without_subprotocol():
+    codec, proto = negotiate_codec(_FakeWebSocket([]))
+    assert type(codec) is FrameCodec
+    assert proto is None
+
+
+def test_negotiate_picks_first_supported_offer():
+    pytest.importorskip("msgpack")
+    codec, proto = negotiate_codec(_FakeWebSocket(["unknown", MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL]))
+    assert isinstance(codec, MsgpackFrameCodec)
+    assert proto == MSGPACK_SUBPROTOCOL
+
+
+def test_msgpack_frames_are_smaller_than_json():
+    msgpack = pytest.importorskip("msgpack")
+    frame = {"type": "token", "text": "こんにちは、今日の予定です"}
+    packed = MsgpackFrameCodec().encode(frame)
+    assert msgpack.unpackb(packed, raw=False) == frame
+    assert len(packed) < len(FrameCodec().encode(frame).encode("utf-8"))
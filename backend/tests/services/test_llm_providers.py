@@ -0,0 +1,99 @@
+import asyncio
+import httpx
+import pytest
+
+from app.services.llm.base import LLMError
+from app.services.llm.fake_server import create_fake_llm_app
+from app.services.llm.http_provider import HTTPLLMProvider
+from app.services.llm.limits import TokenBucket
+from app.services.llm.mock_llm import MockLLMProvider
+from app.services.llm import registry
+
+MESSAGES = [{"role": "user", "content": "hello world"}]
+
+
+def _provider(fake_app, **kwargs) -> HTTPLLMProvider:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app), base_url="http://fake-llm")
+    return HTTPLLMProvider("http://fake-llm", client=client, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_http_provider_streams_and_completes():
+    provider = _provider(create_fake_llm_app())
+    tokens = [t async for t in provider.stream("fake-model", MESSAGES)]
+    assert "".join(tokens) == "echo: hello world "
+    assert await provider.complete("fake-model", MESSAGES) == "echo: hello world "
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_http_provider_limits_concurrency_per_model():
+    fake = create_fake_llm_app(token_delay=0.01)
+    provider = _provider(fake, max_concurrency_per_model=2)
+
+    await asyncio.gather(*(provider.complete("m1", MESSAGES) for _ in range(6)))
+    assert fake.state.requests == 6
+    assert fake.state.max_active <= 2
+    assert provider.admission.in_flight("m1") == 0
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_http_provider_raises_on_http_error():
+    fake = create_fake_llm_app()
+    fake.state.fail_next = 1
+    provider = _provider(fake)
+    with pytest.raises(LLMError):
+        async for _ in provider.stream("m1", MESSAGES):
+            pass
+    assert provider.admission.in_flight("m1") == 0
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_http_provider_wraps_transport_errors():
+    def fail(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("x-fail") == "timeout":
+            raise httpx.ReadTimeout("read timed out", request=request)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fail), base_url="http://fake-llm")
+    provider = HTTPLLMProvider("http://fake-llm", client=client)
+    with pytest.raises(LLMError, match="ConnectError"):
+        async for _ in provider.stream("m1", MESSAGES):
+            pass
+    client.headers["x-fail"] = "timeout"
+    with pytest.raises(LLMError, match="ReadTimeout"):
+        await provider.complete("m1", MESSAGES)
+    assert provider.admission.in_flight("m1") == 0
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_early_releases_slot():
+    provider = _provider(create_fake_llm_app(), max_concurrency_per_model=1)
+    agen = provider.stream("m1", MESSAGES)
+    assert await agen.__anext__() == "echo: "
+    assert provider.admission.in_flight("m1") == 1
+    await agen.aclose()
+    assert provider.admission.in_flight("m1") == 0
+    # 枠が解放されているので次の呼び出しが詰まらない
+    assert await asyncio.wait_for(provider.complete("m1", MESSAGES), 2)
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_throttles_after_burst():
+    bucket = TokenBucket(rate=50, capacity=2)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(4):
+        await bucket.acquire()
+    # バースト 2 件は即時、残り 2 件は 1/50 秒ずつ待つ
+    assert loop.time() - start >= 0.035
+
+
+def test_registry_falls_back_to_mock_without_base_url(monkeypatch):
+    monkeypatch.setattr(registry.settings, "LLM_API_BASE_URL", "")
+    assert isinstance(registry.get_provider("gemini-pro"), MockLLMProvider)
+    assert registry.get_provider("gemini-pro") is registry.get_provider(None)
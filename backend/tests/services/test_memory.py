@@ -0,0 +1,182 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, insert, select, text
+
+from app.core.config import settings
+from app.models.models import AIAssistant, User
+from app.models.phase2_models import Conversation, Message, MessageEmbedding
+from app.services.chat.message_writer import MessageWriter, build_message_row
+from app.services.memory.pipeline import EmbeddingPipeline
+from app.services.memory.store import search_memory
+from tests.conftest import TestingSessionLocal
+
+TEXTS = [
+    ("user", "Please book a flight to Osaka next Tuesday"),
+    ("assistant", "I booked the flight to Osaka for Tuesday morning"),
+    ("user", "What is a good recipe for curry rice?"),
+    ("assistant", "Here is a simple curry rice recipe with onions and carrots"),
+    ("system", "flight booking system prompt"),
+]
+
+
+async def _seed():
+    async with TestingSessionLocal() as s:
+        user_id = (await s.execute(select(User.id))).scalar_one()
+        assistant = AIAssistant(user_id=user_id, name="MemBot")
+        s.add(assistant)
+        await s.flush()
+        conv_ids = [uuid.uuid4(), uuid.uuid4()]
+        await s.execute(
+            insert(Conversation),
+            [{"id": c, "user_id": user_id, "assistant_id": assistant.id} for c in conv_ids],
+        )
+        await s.execute(
+            insert(Message),
+            [{"conversation_id": c, "role": role, "content": f"{content} ({i})"}
+             for i, c in enumerate(conv_ids) for role, content in TEXTS],
+        )
+        await s.commit()
+    return user_id, conv_ids
+
+
+@pytest.mark.asyncio
+async def test_pipeline_embeds_new_text_messages_once(db):
+    _, conv_ids = await _seed()
+    pipeline = EmbeddingPipeline(TestingSessionLocal, batch_size=3, sweep_interval=0)
+    total = 0
+    while (n := await pipeline.run_once()):
+        total += n
+    # system メッセージは対象外
+    assert total == 8
+    async with TestingSessionLocal() as s:
+        assert (await s.execute(select(func.count()).select_from(MessageEmbedding))).scalar() == 8
+        await s.execute(
+            insert(Message),
+            [{"conversation_id": conv_ids[0], "role": "user", "content": "another flight question"}],
+        )
+        await s.commit()
+    assert await pipeline.run_once() == 1
+    assert await pipeline.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_written_rows_are_embedded_regardless_of_created_at(db):
+    _, conv_ids = await _seed()
+    pipeline = EmbeddingPipeline(TestingSessionLocal, sweep_interval=3600)
+    assert await pipeline.run_once() == 8
+    assert await pipeline.run_once() == 0
+
+    # write-behind の滞留や再試行で、created_at がコミットよりずっと前の行
+    late = build_message_row(conv_ids[0], "user", "late flight question")
+    late["created_at"] -= timedelta(minutes=10)
+    writer = MessageWriter(
+        TestingSessionLocal, mode="sync", on_written=lambda rows: pipeline.notify(r["id"] for r in rows)
+    )
+    await writer.persist([late])
+    assert await pipeline.run_once() == 1
+
+    # 通知の届かない書き込み（REST など）は次の掃き出しで拾う
+    async with TestingSessionLocal() as s:
+        await s.execute(
+            insert(Message),
+            [{"conversation_id": conv_ids[1], "role": "user", "content": "rest question",
+              "created_at": datetime.now(timezone.utc) - timedelta(hours=1)}],
+        )
+        await s.commit()
+    assert await pipeline.run_once() == 0
+    pipeline.sweep_interval = 0
+    assert await pipeline.run_once() == 1
+    async with TestingSessionLocal() as s:
+        assert (await s.execute(select(func.count()).select_from(MessageEmbedding))).scalar() == 10
+
+
+@pytest.mark.asyncio
+async def test_vector_and_exact_search_agree(db):
+    user_id, conv_ids = await _seed()
+    pipeline = EmbeddingPipeline(TestingSessionLocal)
+    await pipeline.run_once()
+
+    async with TestingSessionLocal() as s:
+        for scope in ({"conversation_id": conv_ids[0]}, {"user_id": user_id}):
+            vec = await search_memory(s, "flight to Osaka", 3, use_vector=True, **scope)
+            exact = await search_memory(s, "flight to Osaka", 3, use_vector=False, **scope)
+            # 2 つの会話に同じ文面があるので順位の同点は許容し、スコア列で比較する
+            assert [h.score for h in vec] == pytest.approx([h.score for h in exact], abs=1e-5)
+            assert "Osaka" in vec[0].content
+        hits = await search_memory(s, "curry recipe", 2, conversation_id=conv_ids[1])
+        assert all(h.conversation_id == conv_ids[1] for h in hits)
+        assert "curry" in hits[0].content
+        assert await search_memory(s, "???", 3, conversation_id=conv_ids[0]) == []
+        with pytest.raises(ValueError):
+            await search_memory(s, "x", 3)
+
+
+@pytest.mark.asyncio
+async def test_vector_search_uses_ann_index(db):
+    _, conv_ids = await _seed()
+    await EmbeddingPipeline(TestingSessionLocal).run_once()
+    async with TestingSessionLocal() as s:
+        # マイグレーション 010 と同じ式インデックス
+        await s.execute(text(
+            "CREATE INDEX idx_message_embeddings_ann ON message_embeddings "
+            "USING hnsw ((embedding::vector(1024)) vector_cosine_ops)"
+        ))
+        await s.execute(text("SET LOCAL enable_seqscan = off"))
+        q = "[" + ",".join(["0"] * 1023 + ["1"]) + "]"
+        plan = (await s.execute(text(
+            "EXPLAIN SELECT e.message_id FROM message_embeddings e "
+            "ORDER BY (e.embedding::vector(1024)) <=> CAST(:q AS vector(1024)) LIMIT 3"
+        ), {"q": q})).scalars().all()
+        assert any("idx_message_embeddings_ann" in line for line in plan), plan
+        # 式インデックスがあっても検索は動く
+        hits = await search_memory(s, "flight", 2, conversation_id=conv_ids[0], use_vector=True)
+        assert len(hits) == 2
+
+
+@pytest.mark.asyncio
+async def test_conversation_search_is_not_starved_by_other_conversations(db, monkeypatch):
+    user_id, conv_ids = await _seed()
+    ef_search = 10
+    monkeypatch.setattr(settings, "MEMORY_HNSW_EF_SEARCH", ef_search)
+    async with TestingSessionLocal() as s:
+        # 検索語に近い行はほかの会話にだけ大量にあり、対象の会話は ef_search より多いが遠い行ばかり
+        await s.execute(
+            insert(Message),
+            [{"conversation_id": conv_ids[0], "role": "user", "content": f"flight to Osaka on day {i}"}
+             for i in range(ef_search * 6)]
+            + [{"conversation_id": conv_ids[1], "role": "user", "content": f"curry rice note {i}"}
+               for i in range(ef_search * 2)],
+        )
+        await s.commit()
+    pipeline = EmbeddingPipeline(TestingSessionLocal, sweep_interval=0)
+    while await pipeline.run_once():
+        pass
+    async with TestingSessionLocal() as s:
+        await s.execute(text(
+            "CREATE INDEX idx_message_embeddings_ann ON message_embeddings "
+            "USING hnsw ((embedding::vector(1024)) vector_cosine_ops)"
+        ))
+        # 大きなコーパスと同じく、プランナに近傍インデックスで並べる計画を選ばせる
+        await s.execute(text("SET LOCAL enable_seqscan = off"))
+        await s.execute(text("SET LOCAL enable_sort = off"))
+        vec = await search_memory(s, "flight to Osaka", 5, conversation_id=conv_ids[1], use_vector=True)
+        exact = await search_memory(s, "flight to Osaka", 5, conversation_id=conv_ids[1], use_vector=False)
+    assert len(vec) == 5
+    assert all(h.conversation_id == conv_ids[1] for h in vec)
+    assert [h.score for h in vec] == pytest.approx([h.score for h in exact], abs=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_memory_search_endpoint(client: AsyncClient):
+    _, conv_ids = await _seed()
+    await EmbeddingPipeline(TestingSessionLocal).run_once()
+    r = await client.post("/api/v1/memory/search", json={"query": "curry rice", "conversation_id": str(conv_ids[0]), "k": 2})
+    assert r.status_code == 200
+    hits = r.json()["hits"]
+    assert len(hits) == 2 and "curry" in hits[0]["content"]
+    assert hits[0]["score"] >= hits[1]["score"]
+    r = await client.post("/api/v1/memory/search", json={"query": "x"})
+    assert r.status_code == 422
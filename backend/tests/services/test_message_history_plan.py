@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, select, text
+
+from app.core.config import settings
+from app.models.models import AIAssistant, User
+from app.models.phase2_models import Conversation, Message
+from app.services.chat.history import Cursor, message_page_query
+from tests.conftest import TestingSessionLocal
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+async def _explain(session, query):
+    conn = await session.connection()
+    compiled = query.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+    return result.scalar()[0]["Plan"]
+
+
+@pytest.mark.asyncio
+async def test_history_queries_use_composite_index_without_sort(db):
+    async with TestingSessionLocal() as s:
+        user_id = (await s.execute(select(User.id))).scalar_one()
+        assistant = AIAssistant(user_id=user_id, name="PlanBot")
+        s.add(assistant)
+        await s.flush()
+        conv_ids = [uuid.uuid4() for _ in range(4)]
+        await s.execute(
+            insert(Conversation),
+            [{"id": cid, "user_id": user_id, "assistant_id": assistant.id} for cid in conv_ids],
+        )
+        base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        await s.execute(
+            insert(Message),
+            [
+                {
+                    "conversation_id": cid,
+                    "role": "user",
+                    "content": f"m{i}",
+                    "created_at": base + timedelta(seconds=i),
+                    "updated_at": base,
+                }
+                for cid in conv_ids
+                for i in range(1000)
+            ],
+        )
+        await s.commit()
+
+    async with TestingSessionLocal() as s:
+        await s.execute(text("ANALYZE messages"))
+        # テーブルが小さくても計画の形（ソートの有無）を見られるよう逐次走査・ビットマップ走査を抑止する
+        await s.execute(text("SET LOCAL enable_seqscan = off"))
+        await s.execute(text("SET LOCAL enable_bitmapscan = off"))
+        cursor = Cursor(datetime(2024, 1, 1, 0, 1, tzinfo=timezone.utc), uuid.uuid4())
+        queries = {
+            "first_page": message_page_query(conv_ids[0], limit=settings.MESSAGE_PAGE_DEFAULT_LIMIT),
+            "page_after": message_page_query(conv_ids[0], after=cursor, limit=50),
+            "page_before": message_page_query(conv_ids[0], before=cursor, limit=50),
+        }
+        for name, query in queries.items():
+            nodes = list(_plan_nodes(await _explain(s, query)))
+            node_types = [n["Node Type"] for n in nodes]
+            assert "Sort" not in node_types, (name, node_types)
+            assert "Incremental Sort" not in node_types, (name, node_types)
+            assert any(
+                n.get("Index Name") == "idx_messages_conversation_created_id" for n in nodes
+            ), (name, node_types)
@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import AIAssistant, User
+from app.models.phase2_models import Conversation, Message
+from app.services.chat.message_writer import MessageWriter, build_message_row
+from tests.conftest import TestingSessionLocal
+
+
+async def _create_conversation(db: AsyncSession):
+    user = (await db.execute(select(User).limit(1))).scalars().first()
+    assistant = AIAssistant(user_id=user.id, name="WriterBot")
+    db.add(assistant)
+    await db.flush()
+    conv = Conversation(user_id=user.id, assistant_id=assistant.id, title="writer")
+    db.add(conv)
+    await db.flush()
+    conv_id = conv.id
+    await db.commit()
+    return conv_id
+
+
+async def _count(db: AsyncSession, conversation_id) -> int:
+    return await db.scalar(
+        select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id)
+    )
+
+
+@pytest.mark.asyncio
+async def test_batched_mode_coalesces_turns_into_few_commits(db: AsyncSession):
+    conv_id = await _create_conversation(db)
+    writer = MessageWriter(TestingSessionLocal, mode="batched", batch_size=10, flush_interval=0.05)
+
+    acks = []
+    for i in range(20):
+        acks.append(await writer.persist([build_message_row(conv_id, "user", f"m{i}")]))
+    await writer.wait_durable(*acks)
+    await writer.stop()
+
+    assert await _count(db, conv_id) == 20
+    assert writer.stats["written_rows"] == 20
+    assert writer.stats["commits"] <= 4
+
+
+@pytest.mark.asyncio
+async def test_async_mode_does_not_wait_and_stop_drains(db: AsyncSession):
+    conv_id = await _create_conversation(db)
+    writer = MessageWriter(TestingSessionLocal, mode="async", batch_size=100, flush_interval=10)
+
+    ack = await writer.persist([
+        build_message_row(conv_id, "user", "hi"),
+        build_message_row(conv_id, "assistant", "hello"),
+    ])
+    assert ack is None
+    await writer.stop()
+
+    rows = (await db.execute(
+        select(Message.role).where(Message.conversation_id == conv_id).order_by(Message.created_at)
+    )).scalars().all()
+    assert rows == ["user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_sync_mode_commits_inline(db: AsyncSession):
+    conv_id = await _create_conversation(db)
+    writer = MessageWriter(TestingSessionLocal, mode="sync")
+
+    ack = await writer.persist([build_message_row(conv_id, "user", "now")])
+    assert ack.done()
+    assert await _count(db, conv_id) == 1
+    assert writer.stats["commits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batched_mode_surfaces_flush_errors(db: AsyncSession):
+    conv_id = await _create_conversation(db)
+    writer = MessageWriter(TestingSessionLocal, mode="batched", flush_interval=0)
+
+    # CHECK 制約違反の role
+    ack = await writer.persist([build_message_row(conv_id, "robot", "x")])
+    with pytest.raises(Exception):
+        await writer.wait_durable(ack)
+    assert writer.stats["failed_rows"] == 1
+    # 失敗後もライタは動き続ける
+    ok = await writer.persist([build_message_row(conv_id, "user", "after")])
+    await asyncio.wait_for(writer.wait_durable(ok), 5)
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_batched_mode_fails_only_the_turn_that_cannot_be_written(db: AsyncSession):
+    conv_id = await _create_conversation(db)
+    gone_id = await _create_conversation(db)
+    # チャット中に削除された会話（FK 違反になる）
+    await db.execute(delete(Conversation).where(Conversation.id == gone_id))
+    await db.commit()
+    writer = MessageWriter(TestingSessionLocal, mode="batched", batch_size=100, flush_interval=0.2)
+
+    # 3 ターンが同じバッチに入る
+    before = await writer.persist([
+        build_message_row(conv_id, "user", "a"),
+        build_message_row(conv_id, "assistant", "b"),
+    ])
+    bad = await writer.persist([
+        build_message_row(gone_id, "user", "x"),
+        build_message_row(gone_id, "assistant", "y"),
+    ])
+    after = await writer.persist([build_message_row(conv_id, "user", "c")])
+
+    await asyncio.wait_for(writer.wait_durable(before, after), 5)
+    with pytest.raises(IntegrityError):
+        await writer.wait_durable(bad)
+    await writer.stop()
+
+    assert await _count(db, conv_id) == 3
+    assert writer.stats["written_rows"] == 3
+    assert writer.stats["failed_rows"] == 2
+    # まとめた INSERT が失敗し、ターンごとに 2 回コミットし直した
+    assert writer.stats["commits"] == 2
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        MessageWriter(TestingSessionLocal, mode="eventually")
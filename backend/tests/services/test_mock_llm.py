@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+
+from app.services.llm.base import LLMError
+from app.services.llm.mock_llm import (
+    INTER_TOKEN_KINDS,
+    MockLLMError,
+    MockLLMProvider,
+    MockLLMTimeout,
+    PROFILES,
+    parse_mock_model,
+    plan_reply,
+    stream_mock_reply,
+)
+
+
+async def _collect(agen):
+    return [t async for t in agen]
+
+
+@pytest.mark.asyncio
+async def test_default_profile_keeps_echo_behaviour():
+    assert "".join(await _collect(stream_mock_reply("hi there"))) == "You said: hi there "
+
+
+def test_parse_profile_and_overrides():
+    assert parse_mock_model("mock:fast") is PROFILES["fast"]
+    profile = parse_mock_model("mock:slow-tail?seed=7&ttft_ms=5&reply_tokens=10")
+    assert profile.seed == 7
+    assert profile.ttft_ms == 5.0
+    assert profile.reply_tokens == 10
+    assert profile.inter_token == PROFILES["slow-tail"].inter_token
+    with pytest.raises(ValueError):
+        parse_mock_model("mock:nope")
+    with pytest.raises(ValueError):
+        parse_mock_model("mock:fast?colour=red")
+    # 分布名の打ち間違いを fixed として黙って計測しない
+    with pytest.raises(ValueError):
+        parse_mock_model("mock:fast?inter_token=lognorm")
+    assert all(profile.inter_token in INTER_TOKEN_KINDS for profile in PROFILES.values())
+
+
+def test_seeded_plans_are_deterministic():
+    profile = parse_mock_model("mock:slow-tail?seed=42")
+    a = plan_reply("schedule a meeting", profile)
+    b = plan_reply("schedule a meeting", profile)
+    assert a == b
+    assert len(a.tokens) == profile.reply_tokens
+    assert len(a.delays) == profile.reply_tokens - 1
+    assert a.ttft == pytest.approx(0.4)
+    # プロンプトが違えば待ち時間の系列も変わる
+    assert plan_reply("write an email", profile).delays != a.delays
+
+
+def test_slow_tail_has_heavier_tail_than_fast():
+    fast = plan_reply("x", parse_mock_model("mock:fast?seed=1&reply_tokens=2000"))
+    slow = plan_reply("x", parse_mock_model("mock:slow-tail?seed=1&reply_tokens=2000"))
+    p99 = lambda xs: sorted(xs)[int(len(xs) * 0.99)]
+    assert max(fast.delays) <= 0.012 + 1e-9
+    assert p99(slow.delays) > 3 * p99(fast.delays)
+
+
+@pytest.mark.asyncio
+async def test_timing_follows_profile():
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tokens = await _collect(stream_mock_reply("x", parse_mock_model("mock:fast?ttft_ms=30&inter_token=fixed&inter_token_ms=5&reply_tokens=5")))
+    assert len(tokens) == 5
+    assert loop.time() - start >= 0.03 + 4 * 0.005 - 0.005
+
+
+@pytest.mark.asyncio
+async def test_error_and_timeout_injection():
+    with pytest.raises(MockLLMError):
+        await _collect(stream_mock_reply("x", parse_mock_model("mock:instant?error_rate=1&seed=3")))
+    with pytest.raises(MockLLMTimeout):
+        await _collect(stream_mock_reply("x", parse_mock_model("mock:instant?timeout_rate=1&timeout_ms=10&seed=3")))
+
+
+@pytest.mark.asyncio
+async def test_provider_maps_bad_profile_to_llm_error():
+    provider = MockLLMProvider()
+    with pytest.raises(LLMError):
+        await provider.complete("mock:unknown", [{"role": "user", "content": "x"}])
+    assert await provider.complete("gemini-pro", [{"role": "user", "content": "x"}]) == "You said: x "
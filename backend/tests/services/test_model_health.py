@@ -0,0 +1,144 @@
+import pytest
+
+from app.services.llm.base import LLMError
+from app.services.llm.health import CLOSED, HALF_OPEN, OPEN, ModelHealth, ModelProfile, observe_stream
+from app.services.routing.core.llm_router import LLMRouter
+from app.services.routing.models.routing_models import AnalyzedTask
+
+CATALOG = (
+    ModelProfile("gemini-pro", 0.0005, frozenset({"general"})),
+    ModelProfile("cheap-fast", 0.0002, frozenset({"general", "summarize"})),
+    ModelProfile("coder", 0.003, frozenset({"code", "reasoning"})),
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _health(clock=None, **kwargs):
+    options = dict(consecutive_failures=3, min_requests=4, error_rate_threshold=0.5, cooldown_seconds=10)
+    options.update(kwargs)
+    return ModelHealth(CATALOG, clock=clock or Clock(), **options)
+
+
+async def _tokens(*tokens, fail=False):
+    for t in tokens:
+        yield t
+    if fail:
+        raise LLMError("boom")
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = Clock()
+    health = _health(clock)
+    changes = []
+    health.add_listener(lambda model, state: changes.append((model, state)))
+    for _ in range(3):
+        health.record("coder", ok=False)
+    assert health.state("coder") == OPEN and not health.available("coder")
+    assert not health.allow("coder")
+
+    clock.now += 10
+    assert health.state("coder") == HALF_OPEN
+    # 試行は 1 件だけ通す
+    assert health.allow("coder") and not health.allow("coder")
+    health.record("coder", ok=False)
+    assert health.state("coder") == OPEN
+
+    clock.now += 10
+    assert health.allow("coder")
+    health.record("coder", ok=True, ttft_ms=100)
+    assert health.state("coder") == CLOSED
+    assert changes == [("coder", OPEN), ("coder", HALF_OPEN), ("coder", OPEN), ("coder", HALF_OPEN), ("coder", CLOSED)]
+
+
+def test_error_rate_trips_and_window_expires():
+    clock = Clock()
+    health = _health(clock, consecutive_failures=100, window_seconds=60)
+    for ok in (True, False, True, False):
+        health.record("gemini-pro", ok=ok)
+    assert health.state("gemini-pro") == OPEN
+    snap = health.snapshot("gemini-pro")
+    assert (snap.requests, snap.errors, snap.error_rate) == (4, 2, 0.5)
+    clock.now += 61
+    assert health.snapshot("gemini-pro").requests == 0
+
+
+@pytest.mark.asyncio
+async def test_observe_stream_records_latency_and_cost():
+    health = _health()
+    out = [t async for t in observe_stream(health, "coder", _tokens("a", "b", "c"), prompt_tokens=997)]
+    assert out == ["a", "b", "c"]
+    snap = health.snapshot("coder")
+    assert snap.requests == 1 and snap.errors == 0
+    assert snap.ttft_p50_ms is not None and snap.ttft_p50_ms >= 0
+    assert snap.avg_cost == pytest.approx(0.003)
+
+    with pytest.raises(LLMError):
+        async for _ in observe_stream(health, "coder", _tokens("a", fail=True)):
+            pass
+    assert health.snapshot("coder").errors == 1
+
+
+@pytest.mark.asyncio
+async def test_closed_early_stream_is_not_recorded():
+    health = _health()
+    stream = observe_stream(health, "coder", _tokens("a", "b"))
+    assert await stream.__anext__() == "a"
+    await stream.aclose()
+    assert health.snapshot("coder").requests == 0
+
+
+@pytest.mark.asyncio
+async def test_router_prefers_matching_tags_within_slo(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ROUTING_DEFAULT_LLM", "gemini-pro")
+    monkeypatch.setattr(settings, "LLM_SLO_TTFT_MS", 1000.0)
+    monkeypatch.setattr(settings, "LLM_SLO_MAX_COST_PER_1K", 0.0)
+    health = _health()
+    router = LLMRouter(health=health)
+    code = AnalyzedTask(keywords=["python"], intent="code", confidence=0.9, text="fix python")
+    chat = AnalyzedTask(keywords=[], intent="greeting", confidence=0.9, text="hello")
+
+    assert await router.select_llm([], code) == "coder"
+    # 一致タグが無ければ既定モデル
+    assert await router.select_llm([], chat) == "gemini-pro"
+
+    # SLO を外れた既定モデルは避ける
+    for _ in range(5):
+        health.record("gemini-pro", ok=True, ttft_ms=5000)
+    assert await router.select_llm([], chat) == "cheap-fast"
+
+    # 単価上限
+    monkeypatch.setattr(settings, "LLM_SLO_MAX_COST_PER_1K", 0.001)
+    assert await router.select_llm([], code) != "coder"
+
+
+def test_fallback_when_breaker_opens():
+    health = _health()
+    router = LLMRouter(health=health)
+    assert router.fallback_for("gemini-pro") == "gemini-pro"
+    for _ in range(3):
+        health.record("gemini-pro", ok=False)
+    # 同じ "general" タグを持つモデルに切り替える
+    assert router.fallback_for("gemini-pro") == "cheap-fast"
+    for model in ("cheap-fast", "coder"):
+        for _ in range(3):
+            health.record(model, ok=False)
+    # 代わりが無ければ元のモデル
+    assert router.fallback_for("gemini-pro") == "gemini-pro"
+
+
+@pytest.mark.asyncio
+async def test_model_stats_endpoint(client):
+    resp = await client.get("/api/v1/routing/models/stats")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert "gemini-pro" in body
+    assert {"state", "requests", "error_rate", "ttft_p95_ms", "tokens_per_sec", "cost_per_1k"} <= set(body["gemini-pro"])
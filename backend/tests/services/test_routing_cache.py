@@ -0,0 +1,82 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+
+from app.models.models import AIAssistant
+from app.models.phase2_models import SkillDefinition
+from app.services.routing.cache import RoutingCache, normalize_prompt, routing_cache, routing_key
+from app.services.routing.models.routing_models import RoutingDecision
+from tests.conftest import TestingSessionLocal
+
+DECISION = RoutingDecision(llm_model="m", agent_path="a.md", skills=[])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_prompt_absorbs_near_repeats():
+    assert normalize_prompt("Schedule a meeting at 3pm!") == normalize_prompt("schedule  a meeting at 4PM")
+    assert normalize_prompt("ＡＢＣ　会議を１０時に。") == "abc 会議を0時に"
+    assert routing_key("a1", "Hi!") != routing_key("a2", "Hi!")
+
+
+def test_lru_ttl_and_generation_guard():
+    clock = FakeClock()
+    cache = RoutingCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put(("a", "x"), DECISION)
+    cache.put(("a", "y"), DECISION)
+    assert cache.get(("a", "x")) == DECISION  # x を最近使用にする
+    cache.put(("b", "z"), DECISION)  # y が追い出される
+    assert cache.get(("a", "y")) is None
+    clock.now = 11
+    assert cache.get(("a", "x")) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+
+    # 計算中に無効化が挟まった結果は格納しない
+    generation = cache.generation
+    cache.invalidate({"b"})
+    cache.put(("b", "z"), DECISION, generation)
+    assert cache.get(("b", "z")) is None
+
+
+@pytest.mark.asyncio
+async def test_route_is_cached_and_invalidated_on_commit(client: AsyncClient):
+    routing_cache.clear()
+    routing_cache.reset_stats()
+    a1 = (await client.post("/api/v1/assistants/", json={"name": "R1"})).json()["id"]
+    a2 = (await client.post("/api/v1/assistants/", json={"name": "R2"})).json()["id"]
+
+    for aid in (a1, a1, a2):
+        r = await client.post("/api/v1/routing/route", json={"prompt": "Schedule a meeting", "assistant_id": aid})
+        assert r.status_code == 200
+    stats = (await client.get("/api/v1/routing/cache/stats")).json()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 2)
+
+    # アシスタント更新は該当アシスタントのエントリだけ消す
+    assert (await client.put(f"/api/v1/assistants/{a1}", json={"description": "changed"})).status_code == 200
+    assert routing_cache.stats()["size"] == 1
+
+    # ロールバックされた変更では無効化しない
+    async with TestingSessionLocal() as s:
+        s.add(SkillDefinition(name="draft"))
+        await s.flush()
+        await s.rollback()
+    assert routing_cache.stats()["size"] == 1
+
+    # 一括 UPDATE は行を特定できないのでテーブル単位（全件）で無効化
+    async with TestingSessionLocal() as s:
+        await s.execute(update(AIAssistant).where(AIAssistant.name == "nobody").values(description="x"))
+        await s.commit()
+    assert routing_cache.stats()["size"] == 0
+
+    await client.post("/api/v1/routing/route", json={"prompt": "schedule a meeting", "assistant_id": a2})
+    async with TestingSessionLocal() as s:
+        s.add(SkillDefinition(name="calendar"))
+        await s.commit()
+    assert routing_cache.stats()["size"] == 0
@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app.core import query_stats
+from app.services.routing.core.agent_selector import DEFAULT_AGENT, AgentSelector
+from app.services.routing.orchestrator import RoutingOrchestrator
+from app.services.routing.cache import RoutingCache
+from app.services.routing.pipeline import Stage, StagePipeline
+from app.services.routing.skill_index import get_skill_index
+from tests.conftest import TestingSessionLocal
+
+
+def _sleep_stage(name, seconds, value=None, deps=(), **kw):
+    async def run(ctx):
+        await asyncio.sleep(seconds)
+        return value if value is not None else name
+
+    return Stage(name, run, fallback=lambda ctx: f"{name}-fallback", deps=deps, **kw)
+
+
+@pytest.mark.asyncio
+async def test_independent_stages_overlap():
+    pipeline = StagePipeline(
+        [
+            _sleep_stage("a", 0.0),
+            _sleep_stage("b", 0.1, deps=("a",)),
+            _sleep_stage("c", 0.1, deps=("a",)),
+            _sleep_stage("d", 0.0, deps=("b", "c")),
+        ]
+    )
+    started = time.perf_counter()
+    result = await pipeline.run()
+    assert time.perf_counter() - started < 0.18
+    assert result.values == {"a": "a", "b": "b", "c": "c", "d": "d"}
+    assert set(result.timings) == {"a", "b", "c", "d", "total"}
+    assert result.timings["b"] >= 100 and not result.fallbacks
+
+
+@pytest.mark.asyncio
+async def test_db_stages_are_serialized():
+    active, peak = 0, 0
+
+    async def uses_session(ctx):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return True
+
+    pipeline = StagePipeline(
+        [Stage(n, uses_session, fallback=lambda ctx: False, uses_db=True) for n in ("x", "y", "z")]
+    )
+    result = await pipeline.run()
+    assert peak == 1 and all(result.values.values())
+
+
+@pytest.mark.asyncio
+async def test_timeout_and_error_fall_back_and_dependents_continue():
+    async def boom(ctx):
+        raise RuntimeError("boom")
+
+    seen = {}
+
+    async def downstream(ctx):
+        seen.update(ctx)
+        return "ok"
+
+    pipeline = StagePipeline(
+        [
+            _sleep_stage("slow", 1.0, timeout=0.05),
+            Stage("broken", boom, fallback=lambda ctx: "broken-fallback"),
+            Stage("after", downstream, fallback=lambda ctx: None, deps=("slow", "broken")),
+        ]
+    )
+    result = await pipeline.run()
+    assert result.values["after"] == "ok"
+    assert seen["slow"] == "slow-fallback" and seen["broken"] == "broken-fallback"
+    assert result.fallbacks == {"slow": "timeout", "broken": "error"}
+    assert result.timings["slow"] < 500
+
+
+def test_stages_must_be_declared_after_their_dependencies():
+    with pytest.raises(ValueError):
+        StagePipeline([_sleep_stage("b", 0, deps=("a",)), _sleep_stage("a", 0)])
+
+
+@pytest.mark.asyncio
+async def test_session_stays_usable_after_db_stage_timeout(db):
+    async with TestingSessionLocal() as s:
+        async def slow_query(ctx):
+            return (await s.execute(text("SELECT pg_sleep(2)"))).scalar()
+
+        async def next_query(ctx):
+            return (await s.execute(text("SELECT 1"))).scalar()
+
+        pipeline = StagePipeline(
+            [
+                Stage("slow", slow_query, fallback=lambda ctx: None, timeout=0.05, uses_db=True),
+                Stage("next", next_query, fallback=lambda ctx: None, deps=("slow",), uses_db=True),
+            ],
+            db=s,
+        )
+        result = await pipeline.run()
+    assert result.fallbacks == {"slow": "timeout"}
+    assert result.values["next"] == 1
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_records_timings_and_skips_caching_fallbacks(db, monkeypatch):
+    cache = RoutingCache()
+    orchestrator = RoutingOrchestrator(db, cache=cache)
+    decision = await orchestrator.route("Design a landing page", "a1")
+    assert {"analyze", "skills", "llm", "agent", "total"} <= set(decision.timings)
+    assert cache.stats()["size"] == 1
+    hit = await orchestrator.route("design a landing page!", "a1")
+    assert set(hit.timings) == {"cache"}
+
+    async def stuck(self, tasks):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(AgentSelector, "select_agents", stuck)
+    monkeypatch.setattr("app.core.config.settings.ROUTING_AGENT_TIMEOUT_MS", 20)
+    decision = await orchestrator.route("Write release notes", "a1")
+    assert decision.agent_path == DEFAULT_AGENT.file_path
+    assert "agent (timeout)" in decision.reasoning
+    assert cache.stats()["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_route_dedupes_and_keeps_order(client):
+    a1 = (await client.post("/api/v1/assistants/", json={"name": "B1"})).json()["id"]
+    a2 = (await client.post("/api/v1/assistants/", json={"name": "B2"})).json()["id"]
+    prompts = [
+        ("Schedule a meeting at 3pm", a1),
+        ("Fix this python bug", a2),
+        ("schedule a meeting at 4PM!", a1),  # 正規化すると 1 件目と同じ
+        ("Schedule a meeting at 3pm", a2),
+    ]
+    get_skill_index().loaded_at = None
+    with query_stats.collect() as stats:
+        resp = await client.post(
+            "/api/v1/routing/route:batch",
+            json={"requests": [{"prompt": p, "assistant_id": a} for p, a in prompts]},
+        )
+    assert resp.status_code == 200
+    decisions = resp.json()
+    assert len(decisions) == 4
+    # 全アシスタントのスキルは 1 クエリで読む
+    assert sum(n for s, n in stats.statements.items() if "assistant_skills" in s) == 1
+
+    singles = [
+        (await client.post("/api/v1/routing/route", json={"prompt": p, "assistant_id": a})).json()
+        for p, a in prompts
+    ]
+    strip = lambda d: {k: v for k, v in d.items() if k not in ("timings", "reasoning")}
+    assert [strip(d) for d in decisions] == [strip(d) for d in singles]
+    assert decisions[0] == {**decisions[2], "timings": decisions[0]["timings"]}
+
+    too_many = [{"prompt": "x", "assistant_id": a1}] * 300
+    assert (await client.post("/api/v1/routing/route:batch", json={"requests": too_many})).status_code == 422
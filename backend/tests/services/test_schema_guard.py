@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from app.core import schema_guard
+from app.core.config import settings
+from app.core.schema_guard import ensure_runtime_schema
+from tests.conftest import engine
+
+INDEX = "idx_messages_conversation_created_id"
+
+
+async def _columns_and_indexes(table):
+    async with engine.connect() as conn:
+        cols = await conn.execute(
+            text("SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :t"),
+            {"t": table},
+        )
+        idx = await conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": table})
+        return set(cols.scalars()), set(idx.scalars())
+
+
+@pytest.mark.asyncio
+async def test_adds_columns_reports_indexes_then_skips_with_one_query(db, query_budget):
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE messages DROP COLUMN token_count"))
+        await conn.execute(text(f"DROP INDEX {INDEX}"))
+
+    # conversations.started_at / ended_at は ORM のテーブルには元から無い
+    first = await ensure_runtime_schema(engine)
+    assert not first.skipped and first.missing_tables == []
+    assert sorted(first.added_columns) == ["conversations.ended_at", "conversations.started_at", "messages.token_count"]
+    # インデックスは起動時には作らず、報告だけする（作るのはマイグレーション）
+    assert first.missing_indexes == [INDEX]
+    cols, idx = await _columns_and_indexes("messages")
+    assert "token_count" in cols and INDEX not in idx
+    assert (await ensure_runtime_schema(engine)).missing_indexes == [INDEX]
+
+    definition = next(d for t, n, d in schema_guard.GUARDED_INDEXES if n == INDEX)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE INDEX {INDEX} ON messages {definition}"))
+    third = await ensure_runtime_schema(engine)
+    assert third.complete and third.added_columns == []
+
+    # 定義が変わっていなければ指紋の照合だけ（カタログも ALTER も無し）
+    with query_budget(1, "schema guard (unchanged)"):
+        fourth = await ensure_runtime_schema(engine)
+    assert fourth.skipped and fourth.duration_ms >= 0
+
+
+@pytest.mark.asyncio
+async def test_changed_guard_definition_rechecks(db, monkeypatch):
+    assert not (await ensure_runtime_schema(engine)).skipped
+    assert (await ensure_runtime_schema(engine)).skipped
+
+    probe = (*schema_guard.GUARDED_COLUMNS["messages"], ("guard_probe", "TEXT NULL"))
+    monkeypatch.setitem(schema_guard.GUARDED_COLUMNS, "messages", probe)
+    monkeypatch.setitem(schema_guard.GUARDED_COLUMNS, "no_such_table", (("x", "TEXT NULL"),))
+    result = await ensure_runtime_schema(engine)
+    assert result.added_columns == ["messages.guard_probe"]
+    assert result.missing_tables == ["no_such_table"]
+    # 存在しないテーブルがある間は指紋を残さず、次回も調べる
+    assert not (await ensure_runtime_schema(engine)).skipped
+    cols, _ = await _columns_and_indexes("messages")
+    assert "guard_probe" in cols
+
+
+@pytest.mark.asyncio
+async def test_busy_table_is_skipped_instead_of_blocking_writes(db, monkeypatch):
+    assert (await ensure_runtime_schema(engine)).complete
+    probe = (*schema_guard.GUARDED_COLUMNS["messages"], ("guard_probe", "TEXT NULL"))
+    monkeypatch.setitem(schema_guard.GUARDED_COLUMNS, "messages", probe)
+    monkeypatch.setattr(settings, "SCHEMA_GUARD_LOCK_TIMEOUT_MS", 100)
+
+    # 長いトランザクションが messages を読んでいる間は ALTER のロックが取れない
+    async with engine.connect() as reader:
+        await reader.execute(text("SELECT 1 FROM messages LIMIT 1"))
+        result = await asyncio.wait_for(ensure_runtime_schema(engine), timeout=10)
+        await reader.rollback()
+    assert result.locked_tables == ["messages"] and result.added_columns == []
+    assert not result.complete
+
+    # ロックが空けば次の起動で追加する
+    retried = await ensure_runtime_schema(engine)
+    assert retried.added_columns == ["messages.guard_probe"] and retried.complete
@@ -0,0 +1,124 @@
+import uuid
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core import invalidation, query_stats
+from app.models.models import AIAssistant, User
+from app.models.phase2_models import AssistantSkill, SkillDefinition
+from app.services.routing.core.skill_matcher import SkillMatcher
+from app.services.routing.models.routing_models import AnalyzedTask
+from app.services.routing.skill_index import SkillIndex, get_skill_index
+from tests.conftest import TestingSessionLocal
+
+SKILLS = {
+    "schedule-management": "Manage calendar events and meeting schedules",
+    "email-drafting": "Draft and reply to email messages",
+    "travel-booking": "Book flights, hotels and travel itineraries",
+    "meeting-notes": "Summarize meeting notes and action items",
+}
+
+
+async def _seed():
+    async with TestingSessionLocal() as s:
+        user_id = (await s.execute(select(User.id))).scalar_one()
+        a1, a2 = uuid.uuid4(), uuid.uuid4()
+        await s.execute(
+            insert(AIAssistant), [{"id": a, "user_id": user_id, "name": n} for a, n in ((a1, "S1"), (a2, "S2"))]
+        )
+        ids = {}
+        for name, description in SKILLS.items():
+            ids[name] = uuid.uuid4()
+            s.add(SkillDefinition(id=ids[name], name=name, description=description))
+        await s.flush()
+        s.add_all(
+            [
+                AssistantSkill(assistant_id=a1, skill_id=ids["schedule-management"], priority=2),
+                AssistantSkill(assistant_id=a1, skill_id=ids["meeting-notes"], priority=1),
+                AssistantSkill(assistant_id=a1, skill_id=ids["email-drafting"], is_enabled=False),
+                AssistantSkill(assistant_id=a2, skill_id=ids["travel-booking"]),
+            ]
+        )
+        await s.commit()
+    return a1, a2, ids
+
+
+@pytest.mark.asyncio
+async def test_bulk_load_and_keyword_match(db):
+    a1, a2, _ = await _seed()
+    index = SkillIndex()
+    async with TestingSessionLocal() as s:
+        with query_stats.collect() as q:
+            await index.load(s)
+        assert q.queries == 1
+
+    # 一致語数が同じなら priority の小さい方が先
+    assert [m.name for m in index.match(a1, ["meeting"])] == ["meeting-notes", "schedule-management"]
+    assert [m.name for m in index.match(a1, ["meeting", "calendar"])][0] == "schedule-management"
+    # 無効なスキル・他アシスタントのスキルは出ない
+    assert index.match(a1, ["email"]) == []
+    assert [m.name for m in index.match(a2, ["Flights"])] == ["travel-booking"]
+    assert index.match(uuid.uuid4(), ["meeting"]) == []
+
+
+@pytest.mark.asyncio
+async def test_commits_update_only_affected_entries(db):
+    a1, a2, ids = await _seed()
+    index = SkillIndex()
+    invalidation.subscribe(
+        {"assistants": "id", "assistant_skills": "assistant_id", "skill_definitions": "id"}, index.mark_dirty
+    )
+    try:
+        async with TestingSessionLocal() as s:
+            await index.load(s)
+            with query_stats.collect() as q:
+                await index.refresh(s)
+            assert q.queries == 0
+
+            link = (
+                await s.execute(select(AssistantSkill).where(AssistantSkill.skill_id == ids["email-drafting"]))
+            ).scalar_one()
+            link.is_enabled = True
+            skill = await s.get(SkillDefinition, ids["travel-booking"])
+            skill.description = "Reserve train tickets"
+            await s.commit()
+
+            with query_stats.collect() as q:
+                await index.refresh(s)
+            # スキル定義 1 件 + アシスタント 1 件分
+            assert q.queries == 2
+        assert [m.name for m in index.match(a1, ["email"])] == ["email-drafting"]
+        assert index.match(a2, ["flights"]) == []
+        assert [m.name for m in index.match(a2, ["train"])] == ["travel-booking"]
+        assert index.loads == 1
+    finally:
+        invalidation.unsubscribe(index.mark_dirty)
+
+
+@pytest.mark.asyncio
+async def test_refresh_interval_forces_full_reload(db):
+    await _seed()
+    now = [0.0]
+    index = SkillIndex(refresh_interval=10, clock=lambda: now[0])
+    async with TestingSessionLocal() as s:
+        await index.refresh(s)
+        await index.refresh(s)
+        assert index.loads == 1
+        now[0] = 11
+        await index.refresh(s)
+    assert index.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_skill_matcher_uses_shared_index(db):
+    a1, _, _ = await _seed()
+    task = AnalyzedTask(keywords=["meeting", "notes"], intent="summarize", text="summarize the meeting notes")
+    async with TestingSessionLocal() as s:
+        matcher = SkillMatcher(db=s)
+        get_skill_index().loaded_at = None
+        skills = await matcher.find_required_skills(task, str(a1))
+        assert [m.name for m in skills][0] == "meeting-notes"
+        with query_stats.collect() as q:
+            await matcher.find_required_skills(task, str(a1))
+        assert q.queries == 0
+        assert await matcher.find_required_skills(task, "not-a-uuid") == []
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from app.services.routing.core.task_analyzer import INTENT_LABELS, TaskAnalyzer, keywords, normalize, tokenize
+
+CASES = [
+    ("Schedule a meeting with Tanaka tomorrow at 10am", "schedule"),
+    ("明日の15時から打ち合わせを入れて", "schedule"),
+    ("この資料を要約してください", "summarize"),
+    ("Can you summarize the meeting notes?", "summarize"),
+    ("Translate this paragraph into Japanese", "translate"),
+    ("この文章を英語に翻訳して", "translate"),
+    ("大阪行きの新幹線とホテルを予約して", "travel"),
+    ("fix the bug in my python script", "code"),
+    ("取引先にお詫びのメールを書いて", "email"),
+    ("光合成の仕組みを説明して", "question"),
+    ("こんにちは！", "greeting"),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prompt,intent", CASES)
+async def test_intent_classification(prompt, intent):
+    task = await TaskAnalyzer().analyze(prompt)
+    assert task.intent == intent
+    assert 0.3 <= task.confidence <= 1.0
+    assert task.text == prompt
+
+
+@pytest.mark.asyncio
+async def test_unrelated_or_empty_prompt_is_unknown():
+    for prompt in ("", "qwerty zxcv", "!!!"):
+        task = await TaskAnalyzer().analyze(prompt)
+        assert task.intent == "unknown" and task.confidence == 0.0
+
+
+def test_tokenizer_splits_scripts_and_extracts_content_words():
+    runs = tokenize(normalize("ＰＹＴＨＯＮでCSVを読むコードを書いて"))
+    assert runs == ["python", "で", "csv", "を", "読", "む", "コード", "を", "書", "いて"]
+    # ひらがな・1 文字の漢字・英語の機能語は落とす
+    assert keywords(runs) == ["python", "csv", "コード"]
+    assert keywords(tokenize(normalize("Please book the flight to Osaka"))) == ["book", "flight", "osaka"]
+
+
+@pytest.mark.asyncio
+async def test_analyze_many_matches_single_analysis_and_keeps_order():
+    prompts = [p for p, _ in CASES] + [CASES[0][0], ""]
+    analyzer = TaskAnalyzer()
+    batch = await analyzer.analyze_many(prompts)
+    assert [t.text for t in batch] == prompts
+    for prompt, task in zip(prompts, batch):
+        single = await analyzer.analyze(prompt)
+        assert (task.intent, task.keywords) == (single.intent, single.keywords)
+        assert task.confidence == pytest.approx(single.confidence, abs=1e-3)
+    # 重複したプロンプトも別インスタンス
+    assert batch[0] is not batch[len(CASES)]
+    assert await analyzer.analyze_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_analysis_stays_cheap():
+    analyzer = TaskAnalyzer()
+    prompts = [p for p, _ in CASES]
+    await analyzer.analyze_many(prompts)
+    n = 2000
+    started = time.perf_counter()
+    for i in range(n):
+        await analyzer.analyze(prompts[i % len(prompts)])
+    per_call = (time.perf_counter() - started) / n
+    # 目安は数十マイクロ秒。CI のばらつきを見込んで緩めにする
+    assert per_call < 500e-6
+    assert set(INTENT_LABELS) >= {c for _, c in CASES}
@@ -143,12 +143,22 @@ CREATE TABLE messages (
     role VARCHAR(20) NOT NULL CHECK (role IN ('user', 'assistant', 'system')),
     content TEXT NOT NULL,
     content_type VARCHAR(20) DEFAULT 'text' CHECK (content_type IN ('text', 'image', 'file', 'audio')),
+    token_count INTEGER,
     metadata JSONB,
     parent_message_id UUID REFERENCES messages(id),
     created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
 );
 
+-- メッセージ埋め込み（長期記憶の検索用。ベクトルは real[]、近傍検索は vector への式インデックス）
+CREATE TABLE message_embeddings (
+    message_id UUID PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,
+    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    model VARCHAR(50) NOT NULL,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
 -- ファイル管理系テーブル
 CREATE TABLE files (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -222,6 +232,10 @@ CREATE INDEX idx_messages_created_at ON messages(created_at);
 CREATE INDEX idx_messages_parent_id ON messages(parent_message_id);
 CREATE INDEX idx_messages_metadata ON messages USING GIN(metadata);
 
+CREATE INDEX ix_message_embeddings_conversation_id ON message_embeddings(conversation_id);
+CREATE INDEX idx_message_embeddings_ann ON message_embeddings
+    USING hnsw ((embedding::vector(1024)) vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
 CREATE INDEX idx_files_user_id ON files(user_id);
 CREATE INDEX idx_files_conversation_id ON files(conversation_id);
 CREATE INDEX idx_files_message_id ON files(message_id);
@@ -232,6 +246,9 @@ CREATE INDEX idx_files_metadata ON files USING GIN(metadata);
 -- 複合インデックス
 CREATE INDEX idx_conversations_user_status_created ON conversations(user_id, status, created_at DESC);
 CREATE INDEX idx_messages_conversation_role_created ON messages(conversation_id, role, created_at);
+-- 履歴取得・keyset ページング用（一覧の小さい列は INCLUDE で保持）
+CREATE INDEX idx_messages_conversation_created_id ON messages(conversation_id, created_at, id)
+    INCLUDE (role, content_type, parent_message_id);
 CREATE INDEX idx_files_user_type_created ON files(user_id, file_type, created_at DESC);
 
 -- 部分インデックス
@@ -9,6 +9,9 @@ const API_BASE_URL = trimmed.startsWith('http') ? `${trimmed}/api/v1` : `${trimm
 
 const apiClient = axios.create({
   baseURL: API_BASE_URL,
+  // バックエンドの read-your-writes クッキー（db_sticky_until）をクロスオリジンでも送受信する。
+  // 送らないと、書き込み直後の読み取りがレプリカに振られて自分の変更が見えないことがある
+  withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
   },
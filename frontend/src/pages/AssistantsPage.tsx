@@ -12,6 +12,12 @@ const RAW = (import.meta as any).env.VITE_API_URL || "http://localhost:8000";
 const _trim = String(RAW).replace(/\/$/, "");
 const BASE = _trim.startsWith("http") ? `${_trim}/api/v1` : `${_trim}/v1`;
 
+// バックエンドの read-your-writes クッキー（db_sticky_until）をクロスオリジンでも送受信する。
+// 送らないと、作成・更新の直後の一覧取得がレプリカの遅延で古い内容になることがある
+function apiFetch(path: string, init: RequestInit = {}) {
+  return fetch(`${BASE}${path}`, { credentials: "include", ...init });
+}
+
 export default function AssistantsPage() {
   const [list, setList] = useState<Assistant[]>([]);
   const [loading, setLoading] = useState(true);
@@ -37,7 +43,7 @@ export default function AssistantsPage() {
     try {
       setLoading(true);
       setError(null);
-      const res = await fetch(`${BASE}/assistants/`);
+      const res = await apiFetch(`/assistants/`);
       if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
       const data = await res.json();
       setList(data);
@@ -61,7 +67,7 @@ export default function AssistantsPage() {
     try {
       setPosting(true);
       setError(null);
-      const res = await fetch(`${BASE}/assistants/`, {
+      const res = await apiFetch(`/assistants/`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(form),
@@ -84,9 +90,9 @@ export default function AssistantsPage() {
     try {
       setDeletingId(id);
       setError(null);
-      let res = await fetch(`${BASE}/assistants/${id}`, { method: "DELETE" });
+      let res = await apiFetch(`/assistants/${id}`, { method: "DELETE" });
       if (!res.ok) {
-        res = await fetch(`${BASE}/assistants/${id}/`, { method: "DELETE" });
+        res = await apiFetch(`/assistants/${id}/`, { method: "DELETE" });
       }
       if (!res.ok) {
         const text = await res.text();
@@ -129,27 +135,27 @@ export default function AssistantsPage() {
       };
 
       // PUT → 末尾スラッシュ付き → PATCH の順でトライ
-      let res = await fetch(`${BASE}/assistants/${id}`, {
+      let res = await apiFetch(`/assistants/${id}`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(payload),
       });
       if (!res.ok) {
-        res = await fetch(`${BASE}/assistants/${id}/`, {
+        res = await apiFetch(`/assistants/${id}/`, {
           method: "PUT",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(payload),
         });
       }
       if (!res.ok) {
-        res = await fetch(`${BASE}/assistants/${id}`, {
+        res = await apiFetch(`/assistants/${id}`, {
           method: "PATCH",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(payload),
         });
       }
       if (!res.ok) {
-        res = await fetch(`${BASE}/assistants/${id}/`, {
+        res = await apiFetch(`/assistants/${id}/`, {
           method: "PATCH",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(payload),